@@ -10,21 +10,37 @@ sharing applications.
 Scripts:
  + :mod:`.__main__` - argparse entry point
 Modules:
+ + :mod:`.archive` - archival of old data into an archive database
+ + :mod:`.batch` - non-interactive batch mode for the shell
+ + :mod:`.benchmark` - benchmarks of the shell commands
  + :mod:`.book_member` -
  + :mod:`.cancel_booking` -
  + :mod:`.common` - common functionality used in mini-project-1
+ + :mod:`.connection` - pooled connections to a mini-project-1 database
  + :mod:`.delete_request` -
+ + :mod:`.generator` - deterministic synthetic datasets
+ + :mod:`.importer` - bulk CSV/JSONL import
  + :mod:`.list_bookings` -
  + :mod:`.list_requests` -
+ + :mod:`.locations` - in-memory index of the locations
  + :mod:`.loginsession` - login session object definition
  + :mod:`.logout` -
+ + :mod:`.metrics` - Prometheus metrics export
+ + :mod:`.migrations` - versioned schema migrations
  + :mod:`.offer_ride` -
+ + :mod:`.outbox` - batched delivery of inbox messages
+ + :mod:`.parsers` - registry of the shell command argparsers
  + :mod:`.post_request` -
+ + :mod:`.profiler` - per-command cProfile profiles
  + :mod:`.register` - mini-project-1 member registration
  + :mod:`.search_ride_requests` -
  + :mod:`.search_rides` -
+ + :mod:`.server` - multi-session network server for the shell
+ + :mod:`.sequences` - unique id allocation for rides, bookings, and requests
  + :mod:`.select_ride_request` -
  + :mod:`.shell` - command shell
+ + :mod:`.slow_query` - slow query log with query plans
+ + :mod:`.stats` - per-command latency and statement statistics
  + :mod:`.show_inbox` -
 """
 
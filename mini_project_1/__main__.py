@@ -4,14 +4,30 @@
 """argparse and entry point script for mini-project-1"""
 
 import argparse
+import json
 import os
-import sys
 import sqlite3
+import sys
 import logging
+from functools import partial
 from logging import getLogger, basicConfig, Formatter
-from logging.handlers import TimedRotatingFileHandler
+from typing import Callable, Optional
 
-from mini_project_1.shell import MiniProjectShell
+# only the defaults of the arguments are imported up front, the functions
+# running a command are imported once the command is run
+from mini_project_1.archive import DEFAULT_RETENTION_DAYS, \
+    DEFAULT_RIDE_RETENTION_DAYS, DEFAULT_BATCH_SIZE, DEFAULT_VACUUM_PAGES
+from mini_project_1.benchmark import DEFAULT_SCALES, WORKLOAD, \
+    STARTUP_BUDGET
+from mini_project_1.common import greater_than_zero_number, \
+    zero_or_greater_number
+from mini_project_1.connection import connect, PRAGMA_PROFILES, \
+    DEFAULT_PRAGMA_PROFILE, DEFAULT_BUSY_TIMEOUT
+from mini_project_1.generator import DEFAULT_START_DATE
+from mini_project_1.importer import FILE_FORMATS, IMPORT_TABLES, \
+    DEFAULT_CHUNK_SIZE
+from mini_project_1.migrations import migrate, MigrationException
+from mini_project_1.slow_query import DEFAULT_LARGE_TABLE_ROWS
 
 __log__ = getLogger(__name__)
 
@@ -35,16 +51,28 @@ DATABASE_TABLE_CREATE = os.path.join(DATABASE_DIR, "create_tables.sql")
 DATABASE_DATA_CREATE = os.path.join(DATABASE_DIR, "create_data.sql")
 
 
-def init_db(filename: str):
-    """Create a example database for mini-project-1"""
-    database = sqlite3.connect(filename)
+def init_db(filename: str, profile: str = DEFAULT_PRAGMA_PROFILE,
+            populate: Optional[Callable[[sqlite3.Connection], None]] = None):
+    """Create a example database for mini-project-1
+
+    :param populate: function inserting the data into the newly created
+    tables, by default the data of ``create_data.sql`` is inserted
+    """
+    # existing tables referencing each other are dropped and recreated
+    database = connect(filename, profile, foreign_keys=False)
     cursor = database.cursor()
     # Create the tables
     cursor.executescript(open(DATABASE_TABLE_CREATE, "r").read())
     # Insert data
-    cursor.executescript(open(DATABASE_DATA_CREATE, "r").read())
+    if populate is None:
+        cursor.executescript(open(DATABASE_DATA_CREATE, "r").read())
+    else:
+        populate(database)
     # Save (commit) the changes
     database.commit()
+    # Apply all migrations on top of the newly created tables
+    database.execute("PRAGMA user_version = 0")
+    migrate(database)
 
 
 def get_parser() -> argparse.ArgumentParser:
@@ -59,8 +87,8 @@ def get_parser() -> argparse.ArgumentParser:
                              "registration screen to register a new member "
                              "to the mini-project-1 database")
 
-    group = parser.add_argument_group(title="Database")
-    group = group.add_mutually_exclusive_group(required=True)
+    database_group = parser.add_argument_group(title="Database")
+    group = database_group.add_mutually_exclusive_group(required=True)
     group.add_argument("-d", "--database",
                        help="Path to an existing SQLITE database file "
                             "or mini-project-1 to connect to")
@@ -69,6 +97,39 @@ def get_parser() -> argparse.ArgumentParser:
                        help="Create a example SQLITE database file "
                             "for mini-project-1 at the path specified "
                             "and connect to it")
+    database_group.add_argument("--pragma-profile", dest="pragma_profile",
+                                choices=sorted(PRAGMA_PROFILES),
+                                default=DEFAULT_PRAGMA_PROFILE,
+                                help="Named profile of SQLITE pragmas "
+                                     "(journal mode, synchronous, cache "
+                                     "size, ...) to connect with")
+    database_group.add_argument("--busy-timeout", dest="busy_timeout",
+                                type=int, default=DEFAULT_BUSY_TIMEOUT,
+                                help="Time in milliseconds to wait on a "
+                                     "locked database before failing")
+
+    group = parser.add_argument_group(
+        title="Batch",
+        description="Run shell commands from a file without prompting")
+    group.add_argument("--batch", type=argparse.FileType("r"),
+                       help="Run the shell commands within the file "
+                            "specified (one command per line, use - for "
+                            "stdin) and write the result of each command as "
+                            "a JSON line")
+    group.add_argument("-u", "--user",
+                       help="Email of the member to run the batch as")
+    group.add_argument("-p", "--password", default="",
+                       help="Password of the member to run the batch as")
+    group.add_argument("--select", type=int, default=None,
+                       help="Index of the item to choose when a command "
+                            "asks to select from a list (by default nothing "
+                            "is selected)")
+    group.add_argument("-y", "--assume-yes", dest="assume_yes",
+                       action="store_true",
+                       help="Answer yes to all confirmation prompts")
+    group.add_argument("--group-size", dest="group_size",
+                       type=greater_than_zero_number, default=100,
+                       help="Number of commands to run per transaction")
 
     group = parser.add_argument_group(title="Logging")
     group.add_argument("--log-level", dest="log_level", default="INFO",
@@ -78,6 +139,176 @@ def get_parser() -> argparse.ArgumentParser:
                             "specified")
     group.add_argument("-v", "--verbose", action="store_true",
                        help="Enable verbose logging")
+    group.add_argument("--stats-interval", dest="stats_interval",
+                       type=float, default=60.0,
+                       help="Interval in seconds at which the command "
+                            "statistics are written to the --log-dir")
+    group.add_argument("--slow-query-ms", dest="slow_query_ms", type=float,
+                       help="Log the statements taking longer than this many "
+                            "milliseconds with their query plan (to "
+                            "slow_queries.log within the --log-dir)")
+    group.add_argument("--large-table-rows", dest="large_table_rows",
+                       type=int, default=DEFAULT_LARGE_TABLE_ROWS,
+                       help="Number of rows of a table for the slow query "
+                            "log to flag full scans of it")
+
+    group = parser.add_argument_group(
+        title="Metrics",
+        description="Export Prometheus metrics of the commands run")
+    group.add_argument("--metrics-port", dest="metrics_port", type=int,
+                       help="Serve the metrics over HTTP on this port")
+    group.add_argument("--metrics-host", dest="metrics_host",
+                       default="127.0.0.1",
+                       help="Address to serve the metrics on")
+    group.add_argument("--metrics-textfile", dest="metrics_textfile",
+                       help="Periodically rewrite the metrics to this file "
+                            "(e.g. for a node exporter's textfile collector)")
+    group.add_argument("--metrics-interval", dest="metrics_interval",
+                       type=float, default=15.0,
+                       help="Interval in seconds at which the metrics "
+                            "textfile is rewritten")
+
+    group = parser.add_argument_group(title="Profiling")
+    group.add_argument("--profile", dest="profile_dir", metavar="DIR",
+                       help="Profile each shell command with cProfile and "
+                            "save its pstats file within the directory "
+                            "specified")
+
+    subparsers = parser.add_subparsers(
+        dest="command", title="Commands",
+        description="Instead of starting the interactive shell run one of "
+                    "the following commands")
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve mini-project-1 shell sessions to TCP clients")
+    serve_parser.add_argument("--host", default="127.0.0.1",
+                              help="Address to listen for clients on")
+    serve_parser.add_argument("--port", type=int, default=7291,
+                              help="Port to listen for clients on")
+    serve_parser.add_argument("--max-sessions", dest="max_sessions",
+                              type=int, default=32,
+                              help="Maximum number of concurrently running "
+                                   "sessions, additional clients wait for a "
+                                   "free session")
+    serve_parser.add_argument("--idle-timeout", dest="idle_timeout",
+                              type=float, default=600.0,
+                              help="Seconds a session may wait for its "
+                                   "client's input (or for its client to "
+                                   "read its output) before it is ended")
+
+    import_parser = subparsers.add_parser(
+        "import", help="Bulk import CSV or JSONL files into the database")
+    import_parser.add_argument("files", nargs="+",
+                               help="CSV (with a header row) or JSONL files "
+                                    "to import")
+    import_parser.add_argument("--table", choices=sorted(IMPORT_TABLES),
+                               help="Table to import the files into (by "
+                                    "default the name of each file, e.g. "
+                                    "rides.csv)")
+    import_parser.add_argument("--format", dest="file_format",
+                               choices=FILE_FORMATS,
+                               help="Format of the files (by default guessed "
+                                    "from each file's extension)")
+    import_parser.add_argument("--chunk-size", dest="chunk_size", type=int,
+                               default=DEFAULT_CHUNK_SIZE,
+                               help="Number of rows to insert per "
+                                    "transaction")
+
+    gen_parser = subparsers.add_parser(
+        "gen", help="Replace the database's tables with a deterministic "
+                    "synthetic dataset of the size specified")
+    gen_parser.add_argument("--members", type=greater_than_zero_number,
+                            default=1000,
+                            help="Number of members")
+    gen_parser.add_argument("--rides", type=zero_or_greater_number,
+                            default=10000,
+                            help="Number of rides")
+    gen_parser.add_argument("--locations", type=greater_than_zero_number,
+                            default=500,
+                            help="Number of locations")
+    gen_parser.add_argument("--requests", type=zero_or_greater_number,
+                            default=None,
+                            help="Number of ride requests (by default a "
+                                 "tenth of the number of rides)")
+    gen_parser.add_argument("--inbox", type=zero_or_greater_number,
+                            default=20,
+                            help="Average number of inbox messages per "
+                                 "member")
+    gen_parser.add_argument("--max-enroute", dest="max_enroute",
+                            type=zero_or_greater_number, default=4,
+                            help="Maximum number of enroute stops per ride")
+    gen_parser.add_argument("--booking-rate", dest="booking_rate",
+                            type=float, default=0.8,
+                            help="Fraction of the rides that are booked")
+    gen_parser.add_argument("--city-skew", dest="city_skew", type=float,
+                            default=1.1,
+                            help="Skew of the Zipf distribution of locations "
+                                 "over cities")
+    gen_parser.add_argument("--start-date", dest="start_date",
+                            default=DEFAULT_START_DATE,
+                            help="Date of the first generated ride")
+    gen_parser.add_argument("--days", type=greater_than_zero_number,
+                            default=730,
+                            help="Number of days the rides are spread over")
+    gen_parser.add_argument("--seed", type=int, default=0,
+                            help="Seed of the generated dataset")
+    gen_parser.add_argument("--force", action="store_true",
+                            help="Replace the tables of an existing "
+                                 "--database")
+
+    archive_parser = subparsers.add_parser(
+        "archive", help="Move old data into an archive database and return "
+                        "the freed pages to the filesystem")
+    archive_parser.add_argument("--archive", dest="archive_path",
+                                help="Path of the archive database (by "
+                                     "default the database's path with a "
+                                     ".archive suffix)")
+    archive_parser.add_argument("--retention-days", dest="retention_days",
+                                type=int, default=DEFAULT_RETENTION_DAYS,
+                                help="Seen inbox messages older than this "
+                                     "many days are archived")
+    archive_parser.add_argument("--ride-retention-days",
+                                dest="ride_retention_days", type=int,
+                                default=DEFAULT_RIDE_RETENTION_DAYS,
+                                help="Rides dated more than this many days "
+                                     "ago are archived, with their bookings "
+                                     "and enroute locations")
+    archive_parser.add_argument("--batch-size", dest="batch_size", type=int,
+                                default=DEFAULT_BATCH_SIZE,
+                                help="Number of rows to move per "
+                                     "transaction")
+    archive_parser.add_argument("--vacuum-pages", dest="vacuum_pages",
+                                type=int, default=DEFAULT_VACUUM_PAGES,
+                                help="Number of pages to free per "
+                                     "incremental vacuum step")
+    archive_parser.add_argument("--convert", action="store_true",
+                                help="Convert a database not using "
+                                     "incremental auto vacuum by a full "
+                                     "VACUUM (the database is write locked "
+                                     "for its duration)")
+
+    bench_parser = subparsers.add_parser(
+        "bench", help="Benchmark the shell commands against the database "
+                      "regenerated at each of the scales specified")
+    bench_parser.add_argument("--rides", type=int, nargs="+",
+                              default=list(DEFAULT_SCALES),
+                              help="Numbers of rides to generate and "
+                                   "benchmark the database at")
+    bench_parser.add_argument("--iterations",
+                              type=greater_than_zero_number, default=50,
+                              help="Number of times to run each command")
+    bench_parser.add_argument("--commands", nargs="+", choices=list(WORKLOAD),
+                              help="Shell commands to benchmark (by default "
+                                   "all of them)")
+    bench_parser.add_argument("--seed", type=int, default=0,
+                              help="Seed of the generated databases and "
+                                   "benchmark commands")
+    bench_parser.add_argument("-o", "--output", type=argparse.FileType("w"),
+                              default="-",
+                              help="File to write the JSON results to")
+    bench_parser.add_argument("--force", action="store_true",
+                              help="Replace the tables of an existing "
+                                   "--database")
 
     return parser
 
@@ -86,11 +317,18 @@ def main(argv=sys.argv[1:]) -> int:
     """main entry point mini-project-1"""
     parser = get_parser()
     args = parser.parse_args(argv)
+    if args.batch and not args.user:
+        parser.error("--batch requires the --user to run the batch as")
+    if args.command in ("gen", "bench") and args.database and \
+            os.path.exists(args.database) and not args.force:
+        parser.error("{} replaces the tables of the existing database {}, "
+                     "use -i or --force".format(args.command, args.database))
 
     # configure logging
     handlers_ = []
     log_format = Formatter(fmt="[%(asctime)s] [%(levelname)s] - %(message)s")
     if args.log_dir:
+        from logging.handlers import TimedRotatingFileHandler
         os.makedirs(args.log_dir, exist_ok=True)
         file_handler = TimedRotatingFileHandler(
             os.path.join(args.log_dir, "mini_project_1.log"),
@@ -99,6 +337,16 @@ def main(argv=sys.argv[1:]) -> int:
         file_handler.setFormatter(log_format)
         file_handler.setLevel(args.log_level)
         handlers_.append(file_handler)
+        if args.slow_query_ms is not None:
+            slow_query_handler = TimedRotatingFileHandler(
+                os.path.join(args.log_dir, "slow_queries.log"),
+                when="d", interval=1, backupCount=7, encoding="UTF-8",
+            )
+            slow_query_handler.setFormatter(log_format)
+            slow_query_logger = getLogger("mini_project_1.slow_query")
+            slow_query_logger.addHandler(slow_query_handler)
+            slow_query_logger.setLevel(logging.INFO)
+            slow_query_logger.propagate = False
     if args.verbose:
         stream_handler = logging.StreamHandler(stream=sys.stderr)
         stream_handler.setFormatter(log_format)
@@ -110,19 +358,158 @@ def main(argv=sys.argv[1:]) -> int:
         level=args.log_level
     )
 
+    if args.command == "gen":
+        from mini_project_1.generator import generate
+        __log__.info("generating mini-project-1 database at: {}".format(
+            args.database or args.init_database))
+        init_db(args.database or args.init_database, args.pragma_profile,
+                partial(generate, members=args.members, rides=args.rides,
+                        locations=args.locations, seed=args.seed,
+                        city_skew=args.city_skew,
+                        max_enroute=args.max_enroute,
+                        booking_rate=args.booking_rate,
+                        requests=args.requests, inbox=args.inbox,
+                        start_date=args.start_date, days=args.days))
+        return 0
+
+    if args.command == "bench":
+        from mini_project_1.benchmark import benchmark_commands, \
+            measure_startup
+        from mini_project_1.generator import generate
+        results = {"startup": measure_startup(),
+                   "startup_budget": STARTUP_BUDGET, "scales": []}
+        if results["startup"] > STARTUP_BUDGET:
+            __log__.warning("startup took {:.3f}s, over the budget of "
+                            "{}s".format(results["startup"], STARTUP_BUDGET))
+        for rides in args.rides:
+            __log__.info("generating benchmark database with {} rides"
+                         "".format(rides))
+            init_db(args.database or args.init_database, args.pragma_profile,
+                    partial(generate, members=max(rides // 10, 40),
+                            rides=rides, locations=max(rides // 200, 50),
+                            seed=args.seed))
+            results["scales"].append({
+                "rides": rides,
+                "commands": benchmark_commands(
+                    args.database or args.init_database, args.iterations,
+                    args.commands, seed=args.seed,
+                    profile=args.pragma_profile,
+                    busy_timeout=args.busy_timeout),
+            })
+        json.dump(results, args.output, indent=2)
+        args.output.write("\n")
+        return 0
+
     # if specified initialize a example database
     if args.init_database:
         __log__.info("creating example mini-project-1 "
                      "database at: {}".format(args.init_database))
-        init_db(args.init_database)
+        init_db(args.init_database, args.pragma_profile)
 
     # establish a connection to the database
     __log__.info("connecting to mini-project-1 "
                  "database at: {}".format(args.database or args.init_database))
-    conn = sqlite3.connect(args.database or args.init_database)
+    conn = connect(args.database or args.init_database,
+                   args.pragma_profile, args.busy_timeout)
+
+    # upgrade the database schema in place to the latest migration
+    try:
+        migrate(conn)
+    except MigrationException:
+        __log__.exception("failed to upgrade mini-project-1 database")
+        return 1
+
+    metrics_server = None
+    if args.metrics_port is not None:
+        from mini_project_1.metrics import start_http_server
+        metrics_server = start_http_server(args.metrics_port, args.metrics_host)
+    metrics_textfile = None
+    if args.metrics_textfile:
+        from mini_project_1.metrics import TextfileWriter
+        metrics_textfile = TextfileWriter(args.metrics_textfile,
+                                          args.metrics_interval).start()
+    try:
+        return run(args, conn)
+    finally:
+        if metrics_textfile is not None:
+            metrics_textfile.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+
+
+def run(args: argparse.Namespace, conn: sqlite3.Connection) -> int:
+    """Run the mini-project-1 shell, server, or command specified by the
+    parsed arguments on the migrated database
+
+    The modules of the shell, server, and batch mode are only imported
+    once needed to keep the startup of the other commands fast.
+    """
+    slow_query_threshold = None
+    if args.slow_query_ms is not None:
+        slow_query_threshold = args.slow_query_ms / 1000
+
+    if args.command == "serve":
+        conn.close()
+        __log__.info("starting mini-project-1 shell server")
+        from mini_project_1.server import serve
+        return serve(args.database or args.init_database, args.host,
+                     args.port, args.max_sessions, args.pragma_profile,
+                     args.busy_timeout, slow_query_threshold,
+                     args.large_table_rows, args.idle_timeout)
+
+    if args.command == "import":
+        conn.close()
+        __log__.info("importing into mini-project-1 database")
+        from mini_project_1.importer import run_import
+        return run_import(args.database or args.init_database, args.files,
+                          args.table, args.file_format, args.chunk_size,
+                          args.pragma_profile, args.busy_timeout)
+
+    if args.command == "archive":
+        conn.close()
+        __log__.info("archiving mini-project-1 database")
+        from mini_project_1.archive import run_archive
+        return run_archive(args.database or args.init_database,
+                           archive_path=args.archive_path,
+                           retention_days=args.retention_days,
+                           ride_retention_days=args.ride_retention_days,
+                           batch_size=args.batch_size,
+                           vacuum_pages=args.vacuum_pages,
+                           convert=args.convert,
+                           profile=args.pragma_profile,
+                           busy_timeout=args.busy_timeout)
+
+    if args.batch:
+        conn.close()
+        __log__.info("running mini-project-1 batch: {}".format(
+            args.batch.name))
+        from mini_project_1.batch import run_batch
+        return run_batch(args.database or args.init_database, args.batch,
+                         args.user, args.password, selection=args.select,
+                         assume_yes=args.assume_yes,
+                         group_size=args.group_size,
+                         profile=args.pragma_profile,
+                         busy_timeout=args.busy_timeout,
+                         profile_dir=args.profile_dir)
 
     __log__.info("starting mini-project-1 shell")
-    MiniProjectShell(conn, register_start=args.register).cmdloop()
+    from mini_project_1.shell import MiniProjectShell
+    shell = MiniProjectShell(conn, register_start=args.register)
+    if args.log_dir:
+        shell.stats.stats_file = os.path.join(args.log_dir,
+                                              "mini_project_1_stats.json")
+        shell.stats.interval = args.stats_interval
+    if slow_query_threshold is not None:
+        from mini_project_1.slow_query import SlowQueryLog
+        shell.stats.statement_listeners.append(SlowQueryLog(
+            conn, slow_query_threshold, args.large_table_rows))
+    if args.profile_dir:
+        from mini_project_1.profiler import CommandProfiler
+        shell.enable_profiler(CommandProfiler(args.profile_dir))
+    shell.cmdloop()
+    if args.log_dir:
+        shell.stats.write()
 
     return 0
 
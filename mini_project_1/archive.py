@@ -0,0 +1,304 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Archival of old data into an attached archive database
+
+Seen inbox messages older than a retention window, and rides dated before
+a cutoff (with their bookings and enroute locations), are moved out of the
+live database into an archive database (attached as ``archive``) so that
+the live tables stay small. Rows are moved in bounded batches, each within
+its own short write transaction, thus the live database is never write
+locked for long. Rides still referenced by a message within the live inbox
+are kept live.
+
+Commands given ``--include-archive`` read from both databases (see
+:func:`with_archive`).
+
+Once moved, the pages freed within the live database are returned to the
+filesystem by incremental vacuum steps. Incremental vacuum requires the
+database to have been created with ``auto_vacuum = INCREMENTAL`` (as done
+by :func:`.connection.connect`), older databases can be converted once
+by a full ``VACUUM``.
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Optional
+
+from mini_project_1.common import immediate_transaction, \
+    MINI_PROJECT_DATE_FMT, MINI_PROJECT_TIMESTAMP_FMT
+from mini_project_1.connection import connect, DEFAULT_PRAGMA_PROFILE, \
+    DEFAULT_BUSY_TIMEOUT
+
+__log__ = getLogger(__name__)
+
+ARCHIVE_SCHEMA = "archive"
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_RIDE_RETENTION_DAYS = 365
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_VACUUM_PAGES = 1000
+
+#: ``auto_vacuum`` mode allowing ``PRAGMA incremental_vacuum``
+INCREMENTAL = 2
+
+#: tables of the archive database, without foreign keys as they cannot
+#: reference the live database
+ARCHIVE_TABLES = {
+    "inbox": """
+        create table if not exists {schema}.inbox (
+          email		char(15),
+          msgTimestamp	date,
+          sender	char(15),
+          content	text,
+          rno		int,
+          seen		char(1),
+          primary key (email, msgTimestamp)
+        )""",
+    "rides": """
+        create table if not exists {schema}.rides (
+          rno		int,
+          price		int,
+          rdate		date,
+          seats		int,
+          lugDesc	char(10),
+          src		char(5),
+          dst		char(5),
+          driver	char(15),
+          cno		int,
+          seats_booked	int not null default 0,
+          primary key (rno)
+        )""",
+    "bookings": """
+        create table if not exists {schema}.bookings (
+          bno		int,
+          email		char(15),
+          rno		int,
+          cost		int,
+          seats		int,
+          pickup	char(5),
+          dropoff	char(5),
+          primary key (bno)
+        )""",
+    "enroute": """
+        create table if not exists {schema}.enroute (
+          rno		int,
+          lcode		char(5),
+          primary key (rno,lcode)
+        )""",
+}
+
+#: archived tables holding the rows of a ride, children first
+RIDE_TABLES = ("bookings", "enroute", "rides")
+
+
+def get_archive_path(database_path: str) -> str:
+    """Get the default path of a database's archive database"""
+    return database_path + ".archive"
+
+
+def attach_archive(database: sqlite3.Connection, archive_path: str):
+    """Attach (creating if needed) an archive database as ``archive``"""
+    database.execute("ATTACH DATABASE ? AS {}".format(ARCHIVE_SCHEMA),
+                     (archive_path,))
+    for create_table in ARCHIVE_TABLES.values():
+        database.execute(create_table.format(schema=ARCHIVE_SCHEMA))
+    database.commit()
+
+
+def is_archive_attached(database: sqlite3.Connection) -> bool:
+    """Whether the archive database is attached to a connection"""
+    return any(row[1] == ARCHIVE_SCHEMA
+               for row in database.execute("PRAGMA database_list"))
+
+
+def attach_existing_archive(database: sqlite3.Connection) -> bool:
+    """Attach the archive database of a live database if it exists
+
+    :return: whether the archive database is attached
+    """
+    if is_archive_attached(database):
+        return True
+    main_path = next(row[2] for row in database.execute(
+        "PRAGMA database_list") if row[1] == "main")
+    archive_path = get_archive_path(main_path) if main_path else None
+    if not archive_path or not os.path.exists(archive_path):
+        return False
+    if database.in_transaction:
+        # ATTACH is not allowed within a transaction
+        __log__.warning("cannot attach the archive database within a "
+                        "transaction")
+        return False
+    attach_archive(database, archive_path)
+    return True
+
+
+def with_archive(table: str) -> str:
+    """Get a subquery selecting the rows of a table within both the live
+    and the attached archive database"""
+    return "(SELECT * FROM main.{table} " \
+           "UNION ALL SELECT * FROM {schema}.{table})".format(
+               table=table, schema=ARCHIVE_SCHEMA)
+
+
+def archive_inbox(database: sqlite3.Connection, before: str,
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Move the seen inbox messages older than a timestamp into the
+    attached archive database
+
+    :param before: timestamp the archived messages are older than
+    :param batch_size: number of messages to move per transaction
+    :return: the number of messages archived
+    """
+    archived = 0
+    after = 0
+    while True:
+        with immediate_transaction(database):
+            rowids = [row[0] for row in database.execute(
+                "SELECT rowid FROM main.inbox "
+                "WHERE seen = 'y' AND msgTimestamp < ? AND rowid > ? "
+                "ORDER BY rowid LIMIT ?",
+                (before, after, batch_size))]
+            if not rowids:
+                break
+            placeholders = ", ".join("?" * len(rowids))
+            # replace any copy left by an interrupted archival
+            database.execute(
+                "INSERT OR REPLACE INTO {}.inbox "
+                "SELECT * FROM main.inbox WHERE rowid IN ({})".format(
+                    ARCHIVE_SCHEMA, placeholders), rowids)
+            database.execute(
+                "DELETE FROM main.inbox WHERE rowid IN ({})".format(
+                    placeholders), rowids)
+        archived += len(rowids)
+        after = rowids[-1]
+        __log__.debug("archived {} inbox messages".format(archived))
+    return archived
+
+
+def archive_rides(database: sqlite3.Connection, before: str,
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Move the rides dated before a date, with their bookings and enroute
+    locations, into the attached archive database
+
+    Rides referenced by a message within the live inbox are not archived.
+
+    :param before: date the archived rides are dated before
+    :param batch_size: number of rides to move per transaction
+    :return: the number of rides archived
+    """
+    archived = 0
+    after = 0
+    while True:
+        with immediate_transaction(database):
+            rnos = [row[0] for row in database.execute(
+                "SELECT rno FROM main.rides "
+                "WHERE rdate < ? AND rno > ? "
+                "AND NOT EXISTS ("
+                "SELECT 1 FROM main.inbox WHERE inbox.rno = rides.rno) "
+                "ORDER BY rno LIMIT ?",
+                (before, after, batch_size))]
+            if not rnos:
+                break
+            placeholders = ", ".join("?" * len(rnos))
+            # copy the rides before their bookings are deleted, as deleting
+            # the bookings updates the rides' seats_booked
+            for table in reversed(RIDE_TABLES):
+                database.execute(
+                    "INSERT OR REPLACE INTO {schema}.{table} "
+                    "SELECT * FROM main.{table} WHERE rno IN ({rnos})".format(
+                        schema=ARCHIVE_SCHEMA, table=table,
+                        rnos=placeholders), rnos)
+            for table in RIDE_TABLES:
+                database.execute(
+                    "DELETE FROM main.{table} WHERE rno IN ({rnos})".format(
+                        table=table, rnos=placeholders), rnos)
+        archived += len(rnos)
+        after = rnos[-1]
+        __log__.debug("archived {} rides".format(archived))
+    return archived
+
+
+def incremental_vacuum(database: sqlite3.Connection,
+                       pages: int = DEFAULT_VACUUM_PAGES) -> int:
+    """Return the free pages of the live database to the filesystem a
+    few pages at a time
+
+    :param pages: number of pages to free per step
+    :return: the number of pages freed
+    """
+    if database.execute("PRAGMA main.auto_vacuum").fetchone()[0] != \
+            INCREMENTAL:
+        __log__.warning("database does not use incremental auto vacuum, "
+                        "free pages are reused but not returned to the "
+                        "filesystem (see archive --convert)")
+        return 0
+    start_pages = free_pages = database.execute(
+        "PRAGMA main.freelist_count").fetchone()[0]
+    while free_pages:
+        # each step is a short write transaction of its own
+        database.execute("PRAGMA main.incremental_vacuum({:d})".format(
+            pages)).fetchall()
+        free_pages = database.execute(
+            "PRAGMA main.freelist_count").fetchone()[0]
+    return start_pages
+
+
+def full_vacuum(database: sqlite3.Connection):
+    """Convert the live database to incremental auto vacuum by a full
+    ``VACUUM``, the database is write locked for the duration"""
+    database.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+    database.execute("VACUUM main")
+
+
+def run_archive(database_path: str, archive_path: Optional[str] = None,
+                retention_days: int = DEFAULT_RETENTION_DAYS,
+                ride_retention_days: int = DEFAULT_RIDE_RETENTION_DAYS,
+                batch_size: int = DEFAULT_BATCH_SIZE,
+                vacuum_pages: int = DEFAULT_VACUUM_PAGES,
+                convert: bool = False,
+                profile: str = DEFAULT_PRAGMA_PROFILE,
+                busy_timeout: int = DEFAULT_BUSY_TIMEOUT) -> int:
+    """Archive the old data of a mini-project-1 database and compact it
+
+    :param archive_path: path of the archive database, by default the
+    database's path with a ``.archive`` suffix
+    :param retention_days: seen inbox messages older than this many days
+    are archived
+    :param ride_retention_days: rides dated more than this many days ago
+    are archived
+    :param convert: convert the database to incremental auto vacuum by a
+    full ``VACUUM`` if needed
+    :return: exit code
+    """
+    archive_path = archive_path or get_archive_path(database_path)
+    before = (datetime.now() - timedelta(days=retention_days)).strftime(
+        MINI_PROJECT_TIMESTAMP_FMT)
+    rides_before = (datetime.now() - timedelta(
+        days=ride_retention_days)).strftime(MINI_PROJECT_DATE_FMT)
+    database = connect(database_path, profile, busy_timeout)
+    try:
+        attach_archive(database, archive_path)
+        start = time.perf_counter()
+        messages = archive_inbox(database, before, batch_size)
+        print("archived {} inbox messages older than {} into {} in "
+              "{:.2f}s".format(messages, before, archive_path,
+                               time.perf_counter() - start))
+        # messages are archived first, the rides they referenced can then
+        # be archived too
+        start = time.perf_counter()
+        rides = archive_rides(database, rides_before, batch_size)
+        print("archived {} rides dated before {} into {} in {:.2f}s".format(
+            rides, rides_before, archive_path, time.perf_counter() - start))
+        if convert and database.execute(
+                "PRAGMA main.auto_vacuum").fetchone()[0] != INCREMENTAL:
+            __log__.info("converting database to incremental auto vacuum")
+            full_vacuum(database)
+        pages = incremental_vacuum(database, vacuum_pages)
+        print("freed {} pages".format(pages))
+    finally:
+        database.close()
+    return 0
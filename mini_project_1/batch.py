@@ -0,0 +1,258 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Non-interactive batch mode for the mini-project-1 shell
+
+Runs the shell commands within a file (one command per line, blank lines
+and lines starting with ``#`` are ignored) as a given member. Prompts are
+answered from the batch's options instead of the user, paging is disabled,
+and commands are run within grouped transactions.
+
+For each command a JSON object is written as a line of output::
+
+    {"line": 3, "command": "list_requests", "status": "ok",
+     "output": ["(15, 'bob@123.ca', ...)"], "errors": [], "elapsed": 0.0002}
+
+Followed by a final summary line::
+
+    {"summary": {"commands": 1, "errors": 0, "elapsed": 0.0002,
+                 "commands_per_second": 5000.0}}
+"""
+
+import io
+import json
+import logging
+import sqlite3
+import sys
+import time
+from contextlib import redirect_stdout
+from logging import getLogger
+from typing import Iterable, Iterator, Optional, TextIO, Tuple
+
+from mini_project_1.common import ShellArgumentException
+from mini_project_1.connection import connect, DEFAULT_PRAGMA_PROFILE, \
+    DEFAULT_BUSY_TIMEOUT
+from mini_project_1.shell import MiniProjectShell
+
+__log__ = getLogger(__name__)
+
+COMMAND_SAVEPOINT = "batch_command"
+
+
+class BatchConnection(sqlite3.Connection):
+    """:class:`sqlite3.Connection` whose commits can be deferred to the end
+    of a group of batch commands
+
+    While ``grouping`` is set :meth:`commit` is a no-op and :meth:`rollback`
+    only rolls back to the savepoint of the current batch command (see
+    :meth:`begin_command`). The metrics of committed changes (see
+    :func:`.metrics.inc_committed`) are deferred along with the commit.
+    """
+    grouping = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        #: ``(counter, amount, label_values)`` increments not committed yet
+        self.increments = []
+        self._command_increments = 0
+
+    def defer_increment(self, counter, amount, label_values):
+        if self.grouping:
+            self.increments.append((counter, amount, label_values))
+        else:
+            counter.inc(amount, *label_values)
+
+    def begin_command(self):
+        """Start the savepoint of a batch command"""
+        self.execute("SAVEPOINT {}".format(COMMAND_SAVEPOINT))
+        self._command_increments = len(self.increments)
+
+    def commit(self):
+        if not self.grouping:
+            super().commit()
+
+    def rollback(self):
+        if self.grouping:
+            self.execute("ROLLBACK TO {}".format(COMMAND_SAVEPOINT))
+            del self.increments[self._command_increments:]
+        else:
+            super().rollback()
+            del self.increments[:]
+
+    def commit_group(self):
+        """Commit the current group of batch commands"""
+        super().commit()
+        for counter, amount, label_values in self.increments:
+            counter.inc(amount, *label_values)
+        del self.increments[:]
+        self._command_increments = 0
+
+
+class CommandLogHandler(logging.Handler):
+    """Logging handler collecting the messages logged by a batch command"""
+
+    def __init__(self, level=logging.WARNING):
+        super().__init__(level)
+        self.messages = []
+        self.failed = False
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+        if record.levelno >= logging.ERROR:
+            self.failed = True
+
+    def reset(self):
+        self.messages = []
+        self.failed = False
+
+
+class BatchShell(MiniProjectShell):
+    """:class:`.shell.MiniProjectShell` that answers prompts from the
+    batch's options"""
+
+    def __init__(self, database: sqlite3.Connection,
+                 selection: Optional[int] = None, assume_yes: bool = False):
+        """Initialize a batch mini-project-1 shell
+
+        :param selection: index of the item to choose when asked to select
+        from a list of items, if :obj:`None` no item is selected
+        :param assume_yes: answer yes to all confirmation prompts
+        """
+        super().__init__(database)
+        self.selection = selection
+        self.assume_yes = assume_yes
+
+    @staticmethod
+    def read_password(prompt: str) -> str:
+        raise ShellArgumentException(
+            "cannot prompt for a password in batch mode")
+
+    @staticmethod
+    def ask(prompt: str) -> str:
+        raise ShellArgumentException(
+            "cannot prompt for: {} in batch mode".format(prompt.strip()))
+
+    def confirm(self, prompt: str) -> bool:
+        return self.assume_yes
+
+    def select(self, items: Iterable,
+               prompt: str = "Enter selection number: "):
+        items = list(items)
+        for index, item in enumerate(items):
+            print("%i: %s" % (index, item))
+        if self.selection is not None and self.selection < len(items):
+            return items[self.selection]
+        return None
+
+    @staticmethod
+    def page(rows: Iterable):
+        for row in rows:
+            print(row)
+
+    def do_register(self, arg):
+        """Registration is not available in batch mode"""
+        self.command_error("cannot register a member in batch mode")
+
+    def do_exit(self, arg):
+        """Stop running the batch"""
+        return True
+
+
+def read_commands(batch_file: TextIO) -> Iterator[Tuple[int, str]]:
+    """Get the ``(line number, command)`` of every command within a batch
+    file"""
+    for number, line in enumerate(batch_file, start=1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield number, line
+
+
+def run_batch(database_path: str, batch_file: TextIO, email: str,
+              password: str, output: Optional[TextIO] = None,
+              selection: Optional[int] = None, assume_yes: bool = False,
+              group_size: int = 100, profile: str = DEFAULT_PRAGMA_PROFILE,
+              busy_timeout: int = DEFAULT_BUSY_TIMEOUT,
+              profile_dir: Optional[str] = None) -> int:
+    """Run the shell commands within a batch file as the given member
+
+    Commands are run in groups of ``group_size`` commands per transaction.
+    Each command runs within its own savepoint, thus a failing command only
+    rolls back its own changes.
+
+    :param output: stream to write the JSON results to, by default
+    :data:`sys.stdout`
+    :param profile_dir: if set, profile each command and save its pstats
+    file within this directory
+    :return: exit code, 0 if all commands succeeded
+    """
+    output = output or sys.stdout
+    database = connect(database_path, profile, busy_timeout,
+                       factory=BatchConnection)
+    shell = BatchShell(database, selection, assume_yes)
+    if profile_dir:
+        from mini_project_1.profiler import CommandProfiler
+        shell.enable_profiler(CommandProfiler(profile_dir))
+    log_handler = CommandLogHandler()
+    getLogger().addHandler(log_handler)
+    try:
+        shell.login(email, password)
+        if not shell.login_session:
+            output.write(json.dumps({"error": "invalid login"}) + "\n")
+            return 1
+
+        errors = 0
+        count = 0
+        start = time.perf_counter()
+        database.grouping = True
+        for number, command in read_commands(batch_file):
+            if count % group_size == 0:
+                if database.in_transaction:
+                    database.commit_group()
+                database.execute("BEGIN")
+            count += 1
+            database.begin_command()
+            log_handler.reset()
+            command_output = io.StringIO()
+            command_start = time.perf_counter()
+            stop = False
+            try:
+                with redirect_stdout(command_output):
+                    stop = shell.onecmd(command)
+            except Exception as e:  # pylint: disable=broad-except
+                shell.command_failed = True
+                shell.command_errors.append(repr(e))
+            elapsed = time.perf_counter() - command_start
+            # failures reported by the shell do not depend on the log level
+            failed = shell.command_failed or log_handler.failed
+            if failed:
+                errors += 1
+                database.rollback()
+            database.execute("RELEASE {}".format(COMMAND_SAVEPOINT))
+            output.write(json.dumps({
+                "line": number,
+                "command": command,
+                "status": "error" if failed else "ok",
+                "output": command_output.getvalue().splitlines(),
+                "errors": shell.command_errors + [
+                    message for message in log_handler.messages
+                    if message not in shell.command_errors],
+                "elapsed": elapsed,
+            }) + "\n")
+            if stop:
+                break
+        if database.in_transaction:
+            database.commit_group()
+        elapsed = time.perf_counter() - start
+        output.write(json.dumps({"summary": {
+            "commands": count,
+            "errors": errors,
+            "elapsed": elapsed,
+            "commands_per_second": count / elapsed if elapsed else None,
+        }}) + "\n")
+        return 1 if errors else 0
+    finally:
+        getLogger().removeHandler(log_handler)
+        database.grouping = False
+        if database.in_transaction:
+            database.rollback()
+        database.close()
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of the mini-project-1 shell commands
+
+Drives every :class:`.shell.MiniProjectShell` ``do_*`` command
+non-interactively (through a :class:`.batch.BatchShell`) against databases
+generated by :func:`.generator.generate` at several scales. For each command
+the p50/p99 latency and the number of SQL statements executed (as measured
+by the shell's :class:`.stats.ShellStats`) are recorded and can be saved as
+JSON to compare between releases::
+
+    {"startup": 0.094, "startup_budget": 0.3,
+     "scales": [{"rides": 10000, "commands": {
+        "search_rides": {"iterations": 50, "p50": 0.0012, "p99": 0.0031,
+        "mean": 0.0013, "mean_database": 0.0011, "queries": 2.0}, ...}}]}
+
+Each iteration runs within a savepoint that is rolled back afterwards, thus
+every iteration runs against the same data and the cost of committing to
+disk is not included.
+
+The startup time is the time to import the ``mini-project-1`` entry point
+as measured by ``python -X importtime``, it should stay within
+:data:`STARTUP_BUDGET` (a warning is logged otherwise).
+"""
+
+import io
+import random
+import sys
+from contextlib import redirect_stdout
+from logging import getLogger
+from typing import Callable, Dict, List, Optional
+
+from mini_project_1.connection import connect, DEFAULT_PRAGMA_PROFILE, \
+    DEFAULT_BUSY_TIMEOUT
+
+__log__ = getLogger(__name__)
+
+DEFAULT_SCALES = (10000, 100000, 1000000)
+
+#: seconds importing the entry point may take on a cold start
+STARTUP_BUDGET = 0.3
+
+#: the generated member the benchmarks are run as, it drives rides
+BENCHMARK_EMAIL = "member0@gen.ca"
+BENCHMARK_PASSWORD = "pwd0"
+
+
+class BenchmarkContext:
+    """Sample of a database's rows to build benchmark commands from"""
+
+    def __init__(self, database, email: str, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.email = email
+        self.lcodes = [row[0] for row in database.execute(
+            "SELECT lcode FROM locations ORDER BY lcode LIMIT 1000")]
+        self.cities = sorted({row[0].split()[0] for row in database.execute(
+            "SELECT city FROM locations ORDER BY lcode LIMIT 1000")})
+        self.emails = [row[0] for row in database.execute(
+            "SELECT email FROM members ORDER BY email LIMIT 1000")]
+        self.rides = [row[0] for row in database.execute(
+            "SELECT rno FROM rides WHERE driver = ? ORDER BY rno", (email,))]
+        self.bookings = [row[0] for row in database.execute(
+            "SELECT bno FROM bookings JOIN rides USING (rno) "
+            "WHERE driver = ? ORDER BY bno", (email,))]
+        self.requests = [row[0] for row in database.execute(
+            "SELECT rid FROM requests ORDER BY rid LIMIT 1000")]
+        self.own_requests = [row[0] for row in database.execute(
+            "SELECT rid FROM requests WHERE email = ? ORDER BY rid",
+            (email,))] or self.requests
+
+    def choice(self, rows: list):
+        return self.rng.choice(rows) if rows else 0
+
+
+#: benchmarked shell commands and a function building their arguments
+WORKLOAD: Dict[str, Callable[[BenchmarkContext], str]] = {
+    "show_inbox": lambda ctx: "",
+    "offer_ride": lambda ctx: "2099-01-01 4 20 bag {} {}".format(
+        ctx.choice(ctx.lcodes), ctx.choice(ctx.lcodes)),
+    "search_rides": lambda ctx: " ".join(
+        ctx.rng.sample(ctx.cities, min(2, len(ctx.cities)))),
+    "list_bookings": lambda ctx: "",
+    "book_member": lambda ctx: "{} 1 10 {} {} --rno {} --overbook".format(
+        ctx.choice(ctx.emails), ctx.choice(ctx.lcodes),
+        ctx.choice(ctx.lcodes), ctx.choice(ctx.rides)),
+    "cancel_booking": lambda ctx: str(ctx.choice(ctx.bookings)),
+    "post_request": lambda ctx: "2099-01-01 {} {} 50".format(
+        ctx.choice(ctx.lcodes), ctx.choice(ctx.lcodes)),
+    "list_requests": lambda ctx: "",
+    "search_requests_lcode": lambda ctx: ctx.choice(ctx.lcodes),
+    "search_requests_city": lambda ctx: ctx.choice(ctx.cities),
+    "delete_request": lambda ctx: str(ctx.choice(ctx.own_requests)),
+    "select_request": lambda ctx: "{} --message benchmark".format(
+        ctx.choice(ctx.requests)),
+}
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = max(0, int(round(percent / 100 * len(ordered))) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def measure_startup(module: str = "mini_project_1.__main__") -> float:
+    """Measure the seconds taken to import a module in a new interpreter
+
+    The time is the module's cumulative import time reported by
+    ``python -X importtime``, thus the interpreter's own startup is not
+    included.
+    """
+    import subprocess
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    for line in reversed(output.splitlines()):
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1e6
+    raise ValueError("no import time reported for: {}".format(module))
+
+
+def benchmark_commands(database_path: str, iterations: int = 50,
+                       commands: Optional[List[str]] = None,
+                       email: str = BENCHMARK_EMAIL,
+                       password: str = BENCHMARK_PASSWORD, seed: int = 0,
+                       profile: str = DEFAULT_PRAGMA_PROFILE,
+                       busy_timeout: int = DEFAULT_BUSY_TIMEOUT) -> dict:
+    """Benchmark the shell commands against a database
+
+    :param commands: names of the :data:`WORKLOAD` commands to benchmark,
+    by default all of them
+    :return: the latency and query count statistics of every command
+    """
+    from mini_project_1.batch import BatchConnection, BatchShell, \
+        COMMAND_SAVEPOINT
+
+    database = connect(database_path, profile, busy_timeout,
+                       factory=BatchConnection)
+    shell = BatchShell(database)
+    results = {}
+    try:
+        shell.login(email, password)
+        if not shell.login_session:
+            raise ValueError("cannot login as: {}".format(email))
+        context = BenchmarkContext(database, email, seed)
+        database.grouping = True
+        database.execute("BEGIN")
+        for name in commands or WORKLOAD:
+            latencies = []
+            database_times = []
+            query_counts = []
+            for _ in range(iterations):
+                line = "{} {}".format(name, WORKLOAD[name](context))
+                database.begin_command()
+                with redirect_stdout(io.StringIO()):
+                    shell.onecmd(line)
+                wall, database_time, _, statements = shell.stats.last
+                latencies.append(wall)
+                database_times.append(database_time)
+                query_counts.append(statements)
+                database.rollback()
+                database.execute("RELEASE {}".format(COMMAND_SAVEPOINT))
+            results[name] = {
+                "iterations": iterations,
+                "p50": percentile(latencies, 50),
+                "p99": percentile(latencies, 99),
+                "mean": sum(latencies) / iterations,
+                "mean_database": sum(database_times) / iterations,
+                "queries": sum(query_counts) / iterations,
+            }
+            __log__.info("benchmarked {}: p50 {:.6f}s p99 {:.6f}s".format(
+                name, results[name]["p50"], results[name]["p99"]))
+    finally:
+        database.grouping = False
+        if database.in_transaction:
+            database.rollback()
+        database.close()
+    return results
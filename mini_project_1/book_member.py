@@ -22,7 +22,9 @@ member that s/he is booked on the ride.
 import sqlite3
 
 from mini_project_1.common import ShellArgumentParser, \
-    greater_than_zero_number, price
+    greater_than_zero_number, price, immediate_transaction
+from mini_project_1.metrics import BOOKINGS_CREATED, inc_committed
+from mini_project_1.sequences import next_id, BOOKINGS
 
 
 def get_book_member_parser() -> ShellArgumentParser:
@@ -43,22 +45,55 @@ def get_book_member_parser() -> ShellArgumentParser:
                         help="Keyword for the pickup location of the ride")
     parser.add_argument("dropoff",
                         help="Keyword for the dropoff location of the ride")
+    parser.add_argument("--rno", type=int, default=None,
+                        help="Number of the ride to book the member on, "
+                             "if not given select from the rides you offer")
+    parser.add_argument("--overbook", action="store_true",
+                        help="Allow overbooking the ride without "
+                             "confirmation")
     return parser
 
 
+class OverbookingException(Exception):
+    """Exception noting that a booking would overbook a ride"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(self, *args, **kwargs)
+
+
 def book_member(database: sqlite3.Connection, rno: int, email: str, seats: int,
-                seat_price: int, src: str, dst: str) -> bool:
-    """Books a member on a ride and generates its booking number"""
-    dbcursor = database.cursor()
-    dbcursor.execute("Select MAX(bno) from bookings")
-    bno = int(dbcursor.fetchone()[0]) + 1
+                seat_price: int, src: str, dst: str,
+                overbook: bool = True) -> bool:
+    """Books a member on a ride and generates its booking number
+
+    The seat availability check and the insertion of the booking are done
+    within a single ``BEGIN IMMEDIATE`` transaction against the ride's
+    maintained ``seats_booked`` counter, thus concurrent bookings cannot
+    both pass the check.
+
+    :param overbook: if :obj:`False` raise a :class:`OverbookingException`
+    instead of booking more seats than the ride has available
+    :return: if the booking has been added (True/False)
+    """
     try:
-        dbcursor.execute(
-            "INSERT into Bookings values(?,?,?,?,?,?,?)",
-            (bno, email, rno, seat_price, seats, src, dst)
-        )
-        database.commit()
+        with immediate_transaction(database):
+            bno = next_id(database, BOOKINGS)
+            inserted = database.execute(
+                "INSERT INTO bookings "
+                "SELECT ?, ?, rno, ?, ?, ?, ? "
+                "FROM rides "
+                "WHERE rno = ? AND (? OR seats - seats_booked >= ?)",
+                (bno, email, seat_price, seats, src, dst,
+                 rno, overbook, seats)
+            ).rowcount
+            if not inserted:
+                if database.execute("SELECT rno FROM rides WHERE rno = ?",
+                                    (rno,)).fetchone():
+                    raise OverbookingException(
+                        "ride {} does not have {} seats available".format(
+                            rno, seats))
+                raise ValueError("no ride where rno={}".format(rno))
+        inc_committed(database, BOOKINGS_CREATED)
         print("Booking added")
-    except sqlite3.InterfaceError:
+    except (sqlite3.InterfaceError, sqlite3.IntegrityError, ValueError):
         return False
     return True
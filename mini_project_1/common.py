@@ -4,12 +4,29 @@
 """common utilities utilized by mini-project-1"""
 
 import argparse
+import itertools
 import sqlite3
 import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterable, TYPE_CHECKING
 
-import pendulum
+from mini_project_1.metrics import MESSAGES_SENT, inc_committed
+
+if TYPE_CHECKING:
+    import pendulum
+    from mini_project_1.outbox import MessageOutbox
 
 MINI_PROJECT_DATE_FMT = "%Y-%m-%d"
+MINI_PROJECT_TIMESTAMP_FMT = "%Y-%m-%d %H:%M:%S.%f"
+
+#: attempts at inserting a message with a later timestamp once its
+#: timestamp collides with another message to the same recipient
+MAX_TIMESTAMP_RETRIES = 1000
+
+_last_timestamp = datetime.min
+_timestamp_lock = threading.Lock()
 
 
 class ShellArgumentException(Exception):
@@ -50,100 +67,288 @@ def greater_than_zero_number(value: str) -> int:
     return value
 
 
-def date(date_str: str) -> pendulum.DateTime:
+def zero_or_greater_number(value: str) -> int:
+    value = int(value)
+    if value < 0:
+        raise argparse.ArgumentTypeError("%s must be a zero or greater number" % value)
+    return value
+
+
+def date(date_str: str) -> "pendulum.DateTime":
+    # pendulum is slow to import, only import it once a date is parsed
+    import pendulum
     return pendulum.parse(date_str)
 
 
+def timestamp() -> str:
+    """Get the current local time as an inbox message timestamp
+
+    Timestamps have a microsecond resolution and are strictly increasing
+    within a process, even if the clock goes backwards, thus messages sent
+    by a process never collide on the inbox's ``(email, msgTimestamp)``
+    primary key.
+    """
+    global _last_timestamp
+    with _timestamp_lock:
+        now = max(datetime.now(), _last_timestamp + timedelta(microseconds=1))
+        _last_timestamp = now
+    return now.strftime(MINI_PROJECT_TIMESTAMP_FMT)
+
+
+def later_timestamp(msg_timestamp: str) -> str:
+    """Get the timestamp a microsecond after an inbox message timestamp"""
+    return (datetime.strptime(msg_timestamp, MINI_PROJECT_TIMESTAMP_FMT) +
+            timedelta(microseconds=1)).strftime(MINI_PROJECT_TIMESTAMP_FMT)
+
+
 class ValueNotFoundException(Exception):
     """Exception for queries with no results"""
     def __init__(self, *args, **kwargs):
         super().__init__(self, *args, **kwargs)
 
 
-def get_selection(items: list, prompt: str= "Enter selection number: "):
+class Paginator:
+    """Pages of rows pulled lazily from a cursor (or any iterable of rows)
+
+    Rows are only fetched from the cursor once a page needs them, thus the
+    time to show the first page does not depend on the number of rows.
+    Fetched rows are kept to go back to earlier pages.
+    """
+
+    def __init__(self, rows: Iterable, page_size: int = 5):
+        self.page_size = page_size
+        self.rows = []
+        self._cursor = rows
+        self._iterator = iter(rows)
+        self._exhausted = False
+
+    def _fill(self, count: int):
+        """Fetch rows until ``count`` rows are fetched or no rows remain"""
+        while not self._exhausted and len(self.rows) < count:
+            if hasattr(self._cursor, "fetchmany"):
+                rows = self._cursor.fetchmany(
+                    max(self.page_size, count - len(self.rows)))
+            else:
+                rows = list(itertools.islice(
+                    self._iterator, count - len(self.rows)))
+            if not rows:
+                self._exhausted = True
+            self.rows.extend(rows)
+
+    def page(self, number: int) -> list:
+        """Get the rows of a page (numbered from 0)"""
+        start = number * self.page_size
+        self._fill(start + self.page_size)
+        return self.rows[start:start + self.page_size]
+
+    def is_last_page(self, number: int) -> bool:
+        """Check if no rows follow the page"""
+        self._fill((number + 1) * self.page_size + 1)
+        return len(self.rows) <= (number + 1) * self.page_size
+
+    def __getitem__(self, index: int):
+        self._fill(index + 1)
+        return self.rows[index]
+
+    def __iter__(self):
+        index = 0
+        while True:
+            self._fill(index + 1)
+            if index >= len(self.rows):
+                return
+            yield self.rows[index]
+            index += 1
+
+    def __bool__(self):
+        self._fill(1)
+        return bool(self.rows)
+
+
+def get_selection(items: Iterable, prompt: str= "Enter selection number: "):
     """Gets the user to select a item from a list, displaying up to 5 items
     at a time.
 
-    :param items: list of items
+    Items are pulled from the list (or cursor) lazily a page at a time, the
+    user can enter ``back`` to return to the previous page.
+
+    :param items: list, cursor, or :class:`Paginator` of items
     :param prompt: a prompt for user input, default is "Enter selection number: "
     :return: selected item from items
     """
-    index = 0
+    pages = items if isinstance(items, Paginator) else Paginator(items)
+    number = 0
     while True:
-        print("%i: %s" % (index, items[index]))
-
-        if index % 5 == 4:
-            print("Press Enter to see more\n")
-            selection = str(input(prompt))
-
-            if selection.isnumeric():
-                selection = int(selection)
-                if -1 < selection < len(items):
-                    return items[selection]
-            elif selection == "exit":
-                return None
-        elif index + 1 == len(items):
+        page = pages.page(number)
+        if not page:
+            return None
+        for index, item in enumerate(page, start=number * pages.page_size):
+            print("%i: %s" % (index, item))
+
+        last = pages.is_last_page(number)
+        if last:
             print("Press Enter to return to the start of the list\n")
-            selection = str(input(prompt))
-
-            if selection.isnumeric():
-                selection = int(selection)
-                if -1 < selection < len(items):
-                    return items[selection]
-            elif selection == "exit":
-                return None
-            index = -1
+        else:
+            print("Press Enter to see more\n")
+        selection = str(input(prompt))
+
+        if selection.isnumeric():
+            selection = int(selection)
+            if -1 < selection < len(pages.rows):
+                return pages.rows[selection]
+        elif selection == "exit":
+            return None
+        elif selection == "back":
+            number = max(number - 1, 0)
+            continue
+        if last:
+            number = 0
             print("An entry must be selected")
-        index += 1
-
+        else:
+            number += 1
 
-def get_location_id(dbcursor: sqlite3.Cursor, keyword: str, prompt: str = None):
-    """Gets a location lcode from the user."""
 
-    # get exact match locde
-    dbcursor.execute(
-        "SELECT * "
-        "FROM locations WHERE lcode LIKE ?",
-        (keyword,)
-    )
-    location = dbcursor.fetchall()
-    if location:
-        return location[0][0]
+def get_location_id(dbcursor: sqlite3.Cursor, keyword: str, prompt: str = None,
+                    select=get_selection, location_index=None):
+    """Gets a location lcode from the user.
 
-    # get matching locations, since it's not a lcode
-    kw = '%' + keyword + '%'
-    dbcursor.execute(
-        "SELECT * "
-        "FROM locations "
-        "WHERE city LIKE ? OR prov LIKE ? OR address LIKE ?",
-        (kw, kw, kw)
-    )
-    locations = dbcursor.fetchall()
+    :param select: function used to have the user select one of the
+    locations matching the keyword, by default :func:`get_selection`
+    :param location_index: :class:`.locations.LocationIndex` to resolve the
+    keyword with, by default the locations table is queried
+    """
+    if location_index is not None:
+        location = location_index.get(keyword)
+        if location:
+            return location[0]
+        locations = location_index.search(keyword)
+    else:
+        # get exact match locde
+        dbcursor.execute(
+            "SELECT * "
+            "FROM locations WHERE lcode LIKE ?",
+            (keyword,)
+        )
+        location = dbcursor.fetchall()
+        if location:
+            return location[0][0]
+
+        # get matching locations, since it's not a lcode
+        kw = '%' + keyword + '%'
+        dbcursor.execute(
+            "SELECT * "
+            "FROM locations "
+            "WHERE city LIKE ? OR prov LIKE ? OR address LIKE ?",
+            (kw, kw, kw)
+        )
+        locations = dbcursor.fetchall()
 
     # display and get user selection if more than one
     if len(locations) > 1:
         if prompt:
             print(prompt)
-        return get_selection(locations)[0]
+        location = select(locations)
+        if not location:
+            raise ValueNotFoundException("No location selected for " + keyword)
+        return location[0]
     elif locations:
         return locations[0][0]
     else:
         raise ValueNotFoundException("No location for " + keyword)
 
 
-def send_message(database: sqlite3.Connection, recipient: str, sender: str, content: str, rno: int):
-    """"""
-    cur = database.cursor()
-    cur.execute(
-        "INSERT INTO inbox VALUES (?, ?, ?, ?, ?, ?);",
-        (recipient, pendulum.now().to_datetime_string(),
-         sender, content, rno, "n")
-    )
+def is_timestamp_collision(error: sqlite3.IntegrityError) -> bool:
+    """Check if an error notes a collision on the inbox's primary key"""
+    return "UNIQUE" in str(error) and "msgTimestamp" in str(error)
+
+
+def insert_message(database: sqlite3.Connection, message: tuple) -> tuple:
+    """Insert a ``(email, msgTimestamp, sender, content, rno)`` inbox message
+
+    If another message to the same recipient (e.g. sent by another process)
+    has the same timestamp the message is inserted with the next free
+    timestamp.
+
+    :return: the message inserted
+    """
+    for _ in range(MAX_TIMESTAMP_RETRIES):
+        try:
+            database.execute(
+                "INSERT INTO inbox VALUES (?, ?, ?, ?, ?, 'n');", message)
+            return message
+        except sqlite3.IntegrityError as e:
+            if not is_timestamp_collision(e):
+                raise
+            message = (message[0], later_timestamp(message[1])) + message[2:]
+    raise sqlite3.IntegrityError(
+        "no free timestamp for message: {}".format(message))
+
+
+def send_message(database: sqlite3.Connection, recipient: str, sender: str,
+                 content: str, rno: int, outbox: "MessageOutbox" = None,
+                 wait: bool = True):
+    """Send a message to a member's inbox
+
+    :param outbox: outbox to queue the message within, by default the
+    message is inserted and committed right away
+    :param wait: wait for the message to be committed, otherwise return as
+    soon as it is queued within the outbox
+    """
+    if outbox is not None:
+        outbox.queue(recipient, timestamp(), sender, content, rno, wait)
+        return
+    insert_message(database, (recipient, timestamp(), sender, content, rno))
+    database.commit()
+    inc_committed(database, MESSAGES_SENT)
+
+
+#: write changing nothing, which takes the database's write lock
+TAKE_WRITE_LOCK = "UPDATE id_sequences SET last_id = last_id WHERE 0"
+
+
+@contextmanager
+def immediate_transaction(database: sqlite3.Connection):
+    """Context manager running a block within a ``BEGIN IMMEDIATE``
+    transaction
+
+    The database's write lock is taken at the start of the transaction,
+    thus reads done within the block cannot be invalidated by other
+    writers before the block's writes. The transaction is committed when
+    the block exits and rolled back if the block raises.
+
+    If the database already has an open transaction the block joins it
+    within a savepoint, rolled back if the block raises. The write lock is
+    then taken by a write changing nothing, failing (as ``BEGIN
+    IMMEDIATE`` would) if another connection holds it.
+    """
+    if database.in_transaction:
+        database.execute("SAVEPOINT immediate_transaction")
+        try:
+            database.execute(TAKE_WRITE_LOCK)
+            yield database
+        except BaseException:
+            database.execute("ROLLBACK TO immediate_transaction")
+            database.execute("RELEASE immediate_transaction")
+            raise
+        database.execute("RELEASE immediate_transaction")
+        return
+    database.execute("BEGIN IMMEDIATE")
+    try:
+        yield database
+    except BaseException:
+        database.rollback()
+        raise
     database.commit()
 
 
-def check_valid_lcode(database: sqlite3.Connection, lcode: str) -> bool:
-    """Checks whether a lcode is in the database"""
+def check_valid_lcode(database: sqlite3.Connection, lcode: str,
+                      location_index=None) -> bool:
+    """Checks whether a lcode is in the database
+
+    :param location_index: :class:`.locations.LocationIndex` to check the
+    lcode with, by default the locations table is queried
+    """
+    if location_index is not None:
+        return location_index.get(lcode) is not None
     dbcursor = database.cursor()
     dbcursor.execute(
         "SELECT * "
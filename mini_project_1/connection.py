@@ -0,0 +1,228 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Connections to a mini-project-1 database
+
+All connections are opened through :func:`connect` which configures the
+connection with a named profile of pragmas (see :data:`PRAGMA_PROFILES`),
+a busy timeout, and enforced foreign keys.
+
+Connections are pooled per thread, each thread of a (bounded) thread pool
+reuses a single connection for all the work it does. All the connections of
+a :class:`ConnectionPool` share a writer lock so that only one of them at a
+time can have a write transaction open. Thus, concurrent writers within a
+process queue up on the lock instead of failing with
+``database is locked``.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from logging import getLogger
+from typing import List
+
+from mini_project_1.metrics import WRITER_LOCK_WAITS
+
+__log__ = getLogger(__name__)
+
+#: Named profiles of the pragmas set on every newly opened connection
+PRAGMA_PROFILES = {
+    # WAL lets readers and the writer run concurrently, with WAL a
+    # ``NORMAL`` synchronous is still durable against application crashes
+    "default": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16384,
+        "mmap_size": 67108864,
+        "temp_store": "MEMORY",
+    },
+    # fsync on every commit, durable against power loss
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16384,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+    # large page cache and memory map for big databases and bulk loads
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -262144,
+        "mmap_size": 1073741824,
+        "temp_store": "MEMORY",
+    },
+    # rollback journal for filesystems that do not support WAL's shared
+    # memory (e.g. network filesystems)
+    "compat": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+}
+
+DEFAULT_PRAGMA_PROFILE = "default"
+
+#: Default time in milliseconds to wait on a locked database before failing
+DEFAULT_BUSY_TIMEOUT = 5000
+
+
+def connect(database_path: str, profile: str = DEFAULT_PRAGMA_PROFILE,
+            busy_timeout: int = DEFAULT_BUSY_TIMEOUT,
+            foreign_keys: bool = True, **kwargs) -> sqlite3.Connection:
+    """Open a connection to a mini-project-1 database
+
+    :param profile: name of the :data:`PRAGMA_PROFILES` to configure the
+    connection with
+    :param busy_timeout: time in milliseconds to wait on a locked database
+    before failing with ``database is locked``
+    :param foreign_keys: enforce foreign keys, only turned off to (re)create
+    tables that reference each other
+    :param kwargs: additional keyword arguments for :func:`sqlite3.connect`
+    """
+    pragmas = PRAGMA_PROFILES[profile]
+    connection = sqlite3.connect(
+        database_path, timeout=busy_timeout / 1000, **kwargs)
+    connection.execute("PRAGMA busy_timeout = {:d}".format(busy_timeout))
+    # only takes effect on a new database, lets the archive command return
+    # free pages to the filesystem (see :mod:`.archive`)
+    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    for pragma, value in pragmas.items():
+        connection.execute("PRAGMA {} = {}".format(pragma, value))
+    connection.execute("PRAGMA foreign_keys = {}".format(
+        "ON" if foreign_keys else "OFF"))
+    return connection
+
+READ_STATEMENTS = ("SELECT", "PRAGMA", "EXPLAIN", "WITH", "VALUES")
+
+
+def is_write_statement(sql: str) -> bool:
+    """Check if a SQL statement (possibly) writes to the database"""
+    words = sql.lstrip().split(None, 1)
+    return bool(words) and words[0].upper() not in READ_STATEMENTS
+
+
+class SerializedWriterCursor(sqlite3.Cursor):
+    """Cursor of a :class:`SerializedWriterConnection`"""
+
+    def execute(self, sql, parameters=()):
+        with self.connection.write_guard(sql):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with self.connection.write_guard(sql):
+            return super().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        with self.connection.write_guard(sql_script):
+            return super().executescript(sql_script)
+
+
+class SerializedWriterConnection(sqlite3.Connection):
+    """:class:`sqlite3.Connection` that holds a writer lock for the
+    duration of its write transactions
+
+    The writer lock is acquired before the first write statement of a
+    transaction and released once the transaction is committed or rolled
+    back.
+    """
+    writer_lock = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._holds_writer_lock = False
+
+    @contextmanager
+    def write_guard(self, sql: str):
+        """Context manager acquiring the writer lock if the given SQL
+        statement starts a write transaction"""
+        if self.writer_lock is not None and not self._holds_writer_lock \
+                and is_write_statement(sql):
+            if not self.writer_lock.acquire(blocking=False):
+                WRITER_LOCK_WAITS.inc()
+                self.writer_lock.acquire()
+            self._holds_writer_lock = True
+        try:
+            yield
+        finally:
+            if not self.in_transaction:
+                self._release_writer_lock()
+
+    def _release_writer_lock(self):
+        if self._holds_writer_lock:
+            self._holds_writer_lock = False
+            self.writer_lock.release()
+
+    def cursor(self, factory=SerializedWriterCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            if not self.in_transaction:
+                self._release_writer_lock()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            if not self.in_transaction:
+                self._release_writer_lock()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._release_writer_lock()
+
+
+class ConnectionPool:
+    """Pool of per-thread connections to a mini-project-1 database"""
+
+    def __init__(self, database_path: str,
+                 profile: str = DEFAULT_PRAGMA_PROFILE,
+                 busy_timeout: int = DEFAULT_BUSY_TIMEOUT):
+        self.database_path = database_path
+        self.profile = profile
+        self.busy_timeout = busy_timeout
+        self.writer_lock = threading.Lock()
+        self._local = threading.local()
+        self._connections: List[SerializedWriterConnection] = []
+        self._connections_lock = threading.Lock()
+
+    def connection(self) -> SerializedWriterConnection:
+        """Get the pooled connection of the current thread, opening it if
+        needed"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # connections are only ever used by their thread, but are
+            # closed by the thread closing the pool
+            connection = connect(
+                self.database_path, self.profile, self.busy_timeout,
+                check_same_thread=False, factory=SerializedWriterConnection)
+            connection.writer_lock = self.writer_lock
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+            __log__.debug("opened pooled connection {} to: {}".format(
+                len(self._connections), self.database_path))
+        return connection
+
+    def close(self):
+        """Close all the pooled connections"""
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
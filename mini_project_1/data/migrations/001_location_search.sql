@@ -0,0 +1,40 @@
+-- Trigram full-text index over locations used to resolve search keywords
+-- into location codes. Kept in sync with locations by triggers.
+
+drop trigger if exists locations_search_insert;
+drop trigger if exists locations_search_delete;
+drop trigger if exists locations_search_update;
+drop table if exists location_search;
+
+create virtual table location_search using fts5(
+  lcode unindexed,
+  city,
+  prov,
+  address,
+  content='locations',
+  tokenize='trigram'
+);
+
+create trigger locations_search_insert after insert on locations begin
+  insert into location_search (rowid, lcode, city, prov, address)
+  values (new.rowid, new.lcode, new.city, new.prov, new.address);
+end;
+
+create trigger locations_search_delete after delete on locations begin
+  insert into location_search (location_search, rowid, lcode, city, prov, address)
+  values ('delete', old.rowid, old.lcode, old.city, old.prov, old.address);
+end;
+
+create trigger locations_search_update after update on locations begin
+  insert into location_search (location_search, rowid, lcode, city, prov, address)
+  values ('delete', old.rowid, old.lcode, old.city, old.prov, old.address);
+  insert into location_search (rowid, lcode, city, prov, address)
+  values (new.rowid, new.lcode, new.city, new.prov, new.address);
+end;
+
+insert into location_search (location_search) values ('rebuild');
+
+-- indexed lookups from matched location codes to rides
+create index if not exists rides_src_idx on rides (src);
+create index if not exists rides_dst_idx on rides (dst);
+create index if not exists enroute_lcode_idx on enroute (lcode);
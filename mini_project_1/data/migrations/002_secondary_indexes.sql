@@ -0,0 +1,16 @@
+-- Secondary indexes for the lookups done by the shell commands
+
+-- list_bookings, book_member: rides offered by a driver and their bookings
+create index if not exists rides_driver_idx on rides (driver);
+create index if not exists bookings_rno_idx on bookings (rno);
+
+-- list_requests, search_requests_city: requests by member and pickup
+create index if not exists requests_email_idx on requests (email);
+create index if not exists requests_pickup_idx on requests (pickup);
+
+-- search_requests_lcode: case insensitive ``pickup LIKE ?`` lookups
+create index if not exists requests_pickup_nocase_idx
+  on requests (pickup collate nocase);
+
+-- show_inbox: unseen messages of a member
+create index if not exists inbox_email_seen_idx on inbox (email, seen);
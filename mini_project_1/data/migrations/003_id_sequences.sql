@@ -0,0 +1,32 @@
+-- Sequences used to allocate the rno, bno, and rid of new rides, bookings,
+-- and requests. Each sequence stores the last allocated id of its table.
+
+create table if not exists id_sequences (
+  name		char(16),
+  last_id	int not null,
+  primary key (name)
+);
+
+insert or replace into id_sequences values
+  ('rides', (select coalesce(max(rno), 0) from rides)),
+  ('bookings', (select coalesce(max(bno), 0) from bookings)),
+  ('requests', (select coalesce(max(rid), 0) from requests));
+
+-- keep the sequences ahead of rows inserted with explicit ids
+drop trigger if exists rides_id_sequence;
+create trigger rides_id_sequence after insert on rides
+when new.rno > (select last_id from id_sequences where name = 'rides') begin
+  update id_sequences set last_id = new.rno where name = 'rides';
+end;
+
+drop trigger if exists bookings_id_sequence;
+create trigger bookings_id_sequence after insert on bookings
+when new.bno > (select last_id from id_sequences where name = 'bookings') begin
+  update id_sequences set last_id = new.bno where name = 'bookings';
+end;
+
+drop trigger if exists requests_id_sequence;
+create trigger requests_id_sequence after insert on requests
+when new.rid > (select last_id from id_sequences where name = 'requests') begin
+  update id_sequences set last_id = new.rid where name = 'requests';
+end;
@@ -0,0 +1,26 @@
+-- Number of seats booked on each ride, kept exact by triggers on bookings
+
+alter table rides add column seats_booked int not null default 0;
+
+update rides set seats_booked = coalesce(
+  (select sum(seats) from bookings where bookings.rno = rides.rno), 0);
+
+drop trigger if exists bookings_seats_insert;
+create trigger bookings_seats_insert after insert on bookings begin
+  update rides set seats_booked = seats_booked + coalesce(new.seats, 0)
+  where rno = new.rno;
+end;
+
+drop trigger if exists bookings_seats_delete;
+create trigger bookings_seats_delete after delete on bookings begin
+  update rides set seats_booked = seats_booked - coalesce(old.seats, 0)
+  where rno = old.rno;
+end;
+
+drop trigger if exists bookings_seats_update;
+create trigger bookings_seats_update after update of rno, seats on bookings begin
+  update rides set seats_booked = seats_booked - coalesce(old.seats, 0)
+  where rno = old.rno;
+  update rides set seats_booked = seats_booked + coalesce(new.seats, 0)
+  where rno = new.rno;
+end;
@@ -0,0 +1,3 @@
+-- search_rides: rides in (rdate, price, rno) order, seeked by keyset
+-- pagination rather than sorted on every page
+create index if not exists rides_rdate_price_idx on rides (rdate, price, rno);
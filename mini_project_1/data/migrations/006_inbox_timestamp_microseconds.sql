@@ -0,0 +1,6 @@
+-- Inbox messages are timestamped with a microsecond resolution, existing
+-- timestamps of a second resolution are extended so that all the timestamps
+-- keep sorting chronologically
+update inbox set msgTimestamp = msgTimestamp || '.000000'
+where msgTimestamp glob
+  '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]';
@@ -0,0 +1,8 @@
+-- show_inbox: unseen messages of a member in timestamp order, only the
+-- unseen messages are indexed thus marking a message as seen drops it from
+-- the index rather than rewriting an index entry of every message
+create index if not exists inbox_unseen_idx on inbox (email, msgTimestamp)
+  where seen = 'n';
+
+-- superseded by inbox_unseen_idx
+drop index if exists inbox_email_seen_idx;
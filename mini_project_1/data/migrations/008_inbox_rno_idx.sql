@@ -0,0 +1,3 @@
+-- archive: rides referenced by inbox messages, also checked by the inbox's
+-- foreign key on every deleted ride
+create index if not exists inbox_rno_idx on inbox (rno);
@@ -0,0 +1,4 @@
+-- search_rides sorts the rides matching its keywords (found through the
+-- src, dst, and enroute indexes) rather than walking the rides in date
+-- order, thus the index of migration 005 is never used
+drop index if exists rides_rdate_price_idx;
@@ -0,0 +1,27 @@
+-- Version of the locations table, changed by triggers on every change to
+-- it, thus the in-memory location index (see locations.py) is only reloaded
+-- once the locations changed. The version is set to a random value rather
+-- than incremented, thus a rolled back change is never mistaken for a later
+-- one.
+
+create table if not exists locations_version (
+  version	int not null
+);
+
+insert into locations_version (version)
+select random() where not exists (select * from locations_version);
+
+drop trigger if exists locations_version_insert;
+create trigger locations_version_insert after insert on locations begin
+  update locations_version set version = random();
+end;
+
+drop trigger if exists locations_version_delete;
+create trigger locations_version_delete after delete on locations begin
+  update locations_version set version = random();
+end;
+
+drop trigger if exists locations_version_update;
+create trigger locations_version_update after update on locations begin
+  update locations_version set version = random();
+end;
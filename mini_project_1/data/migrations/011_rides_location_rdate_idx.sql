@@ -0,0 +1,10 @@
+-- search_rides: rides from or to a location within a date range, replacing
+-- the single column indexes of migration 002 (a prefix of these)
+create index if not exists rides_src_rdate_idx on rides (src, rdate);
+create index if not exists rides_dst_rdate_idx on rides (dst, rdate);
+drop index if exists rides_src_idx;
+drop index if exists rides_dst_idx;
+
+-- search_rides: rides within a date range, whose enroute locations are
+-- looked up by the enroute primary key
+create index if not exists rides_rdate_idx on rides (rdate);
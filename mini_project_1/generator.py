@@ -0,0 +1,212 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Deterministic synthetic data for a mini-project-1 database
+
+Generates a dataset of any size from a seed, the same seed and options
+always generate the same rows. The generated data is shaped like production
+data:
+
+ + Locations are spread over cities following a Zipf distribution, a few
+   large cities hold most locations and most rides start or end in them.
+ + Rides have up to ``max_enroute`` enroute stops.
+ + Most rides are densely booked, some are full.
+ + Members have a backlog of unread inbox messages.
+
+All rows are bulk inserted with ``executemany`` within a transaction per
+table.
+"""
+
+import itertools
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Iterator
+
+__log__ = getLogger(__name__)
+
+#: ``(city, province)`` ordered from the most to least popular
+CITIES = [
+    ("Toronto", "Ontario"), ("Montreal", "Quebec"),
+    ("Vancouver", "British Columbia"), ("Calgary", "Alberta"),
+    ("Edmonton", "Alberta"), ("Ottawa", "Ontario"),
+    ("Winnipeg", "Manitoba"), ("Quebec City", "Quebec"),
+    ("Hamilton", "Ontario"), ("Kitchener", "Ontario"),
+    ("London", "Ontario"), ("Victoria", "British Columbia"),
+    ("Halifax", "Nova Scotia"), ("Oshawa", "Ontario"),
+    ("Windsor", "Ontario"), ("Saskatoon", "Saskatchewan"),
+    ("Regina", "Saskatchewan"), ("Sherbrooke", "Quebec"),
+    ("St. John's", "Newfoundland"), ("Kelowna", "British Columbia"),
+    ("Barrie", "Ontario"), ("Abbotsford", "British Columbia"),
+    ("Sudbury", "Ontario"), ("Kingston", "Ontario"),
+    ("Saguenay", "Quebec"), ("Moncton", "New Brunswick"),
+    ("Red Deer", "Alberta"), ("Lethbridge", "Alberta"),
+    ("Kamloops", "British Columbia"), ("Nanaimo", "British Columbia"),
+    ("Fredericton", "New Brunswick"), ("Charlottetown", "PEI"),
+    ("Whitehorse", "Yukon"), ("Yellowknife", "NWT"),
+    ("Jasper", "Alberta"), ("Canmore", "Alberta"),
+]
+
+STREETS = ["Main St", "Jasper Ave", "Whyte Ave", "King St", "Queen St",
+           "Yonge St", "Portage Ave", "Robson St", "1 Ave", "Macleod Tr",
+           "Airport Rd", "University Dr", "Centre St", "Bay St"]
+
+FIRST_NAMES = ["Ada", "Bob", "Carol", "Dave", "Erin", "Frank", "Grace",
+               "Heidi", "Ivan", "Judy", "Mallory", "Niaj", "Olivia", "Peggy",
+               "Rupert", "Sybil", "Trent", "Victor", "Walter", "Zoe"]
+
+LAST_NAMES = ["Smith", "Tremblay", "Martin", "Roy", "Wilson", "Gagnon",
+              "MacDonald", "Lee", "Brown", "Taylor", "Campbell", "Anderson",
+              "Leblanc", "Wong", "Singh", "Chen", "Côté", "Bouchard"]
+
+CAR_MODELS = [("Honda", "Civic"), ("Toyota", "Corolla"), ("Ford", "F-150"),
+              ("Dodge", "Caravan"), ("Subaru", "Outback"), ("Kia", "Soul"),
+              ("Tesla", "Model 3"), ("Chevrolet", "Tahoe")]
+
+LUGGAGE = ["small bag", "large bag", "suitcase", "backpack", "none", "skis"]
+
+DEFAULT_START_DATE = "2019-01-01"
+
+
+def zipf_cum_weights(count: int, skew: float) -> list:
+    """Cumulative weights of a Zipf distribution over ``count`` items"""
+    return list(itertools.accumulate(
+        1 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+def insert_rows(database: sqlite3.Connection, table: str, width: int,
+                rows: Iterator[tuple]) -> int:
+    """Bulk insert rows into a table within a single transaction
+
+    :return: the number of rows inserted
+    """
+    start = time.perf_counter()
+    with database:
+        count = database.executemany(
+            "INSERT INTO {} VALUES ({})".format(
+                table, ", ".join("?" for _ in range(width))),
+            rows).rowcount
+    elapsed = time.perf_counter() - start
+    __log__.info("generated {} rows into {} in {:.2f}s ({:.0f} rows/s)".format(
+        count, table, elapsed, count / elapsed if elapsed else 0.0))
+    return count
+
+
+def generate(database: sqlite3.Connection, members: int = 1000,
+             rides: int = 10000, locations: int = 500, seed: int = 0,
+             city_skew: float = 1.1, max_enroute: int = 4,
+             booking_rate: float = 0.8, requests: int = None,
+             inbox: int = 20, start_date: str = DEFAULT_START_DATE,
+             days: int = 730):
+    """Generate and insert a synthetic dataset into the empty tables of a
+    mini-project-1 database
+
+    :param members: number of members, a quarter of them drive
+    :param rides: number of rides
+    :param locations: number of locations
+    :param seed: seed of the pseudo random generator
+    :param city_skew: exponent of the Zipf distribution of the locations
+    over :data:`CITIES`, higher values concentrate locations in fewer cities
+    :param max_enroute: maximum number of enroute stops per ride
+    :param booking_rate: fraction of the rides that are booked
+    :param requests: number of ride requests, by default a tenth of the
+    number of rides
+    :param inbox: average number of inbox messages per member, 90% of them
+    unread
+    :param start_date: date of the first ride
+    :param days: number of days the rides are spread over
+    """
+    rng = random.Random(seed)
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    if requests is None:
+        requests = rides // 10
+
+    city_weights = zipf_cum_weights(len(CITIES), city_skew)
+    location_cities = rng.choices(CITIES, cum_weights=city_weights,
+                                  k=locations)
+    lcodes = ["g{}".format(index) for index in range(locations)]
+    # most of the traffic goes to a few popular locations
+    location_weights = zipf_cum_weights(locations, 1.0)
+    emails = ["member{}@gen.ca".format(index) for index in range(members)]
+    drivers = emails[::4]
+
+    def random_date() -> str:
+        return (start + timedelta(days=rng.randrange(days))).strftime(
+            "%Y-%m-%d")
+
+    def random_lcodes(count: int) -> list:
+        return rng.choices(lcodes, cum_weights=location_weights, k=count)
+
+    insert_rows(database, "members", 4, (
+        (email, "{} {}".format(rng.choice(FIRST_NAMES),
+                               rng.choice(LAST_NAMES)),
+         "780-{:03d}-{:04d}".format(rng.randrange(1000),
+                                    rng.randrange(10000)),
+         "pwd{}".format(index))
+        for index, email in enumerate(emails)))
+
+    car_seats = [rng.randint(2, 7) for _ in drivers]
+    insert_rows(database, "cars", 6, (
+        (cno + 1,) + rng.choice(CAR_MODELS) +
+        (rng.randint(2000, 2019), car_seats[cno], driver)
+        for cno, driver in enumerate(drivers)))
+
+    insert_rows(database, "locations", 4, (
+        (lcode, city, prov, "{} {}".format(rng.randint(1, 9999),
+                                           rng.choice(STREETS)))
+        for lcode, (city, prov) in zip(lcodes, location_cities)))
+
+    ride_seats = []
+
+    def ride_rows():
+        for rno in range(1, rides + 1):
+            cno = rng.randrange(len(drivers))
+            src, dst = random_lcodes(2)
+            ride_seats.append((src, dst, car_seats[cno]))
+            yield (rno, rng.randint(5, 150), random_date(),
+                   car_seats[cno], rng.choice(LUGGAGE), src, dst,
+                   drivers[cno], cno + 1)
+
+    insert_rows(database, "rides", 9, ride_rows())
+
+    def enroute_rows():
+        for rno, (src, dst, _) in enumerate(ride_seats, start=1):
+            stops = set(random_lcodes(rng.randint(0, max_enroute)))
+            for lcode in sorted(stops - {src, dst}):
+                yield rno, lcode
+
+    insert_rows(database, "enroute", 2, enroute_rows())
+
+    def booking_rows():
+        bno = itertools.count(1)
+        for rno, (src, dst, seats) in enumerate(ride_seats, start=1):
+            if rng.random() >= booking_rate:
+                continue
+            free = rng.randint(1, seats)
+            while free > 0:
+                booked = rng.randint(1, free)
+                free -= booked
+                yield (next(bno), rng.choice(emails), rno,
+                       rng.randint(5, 150), booked, src, dst)
+
+    insert_rows(database, "bookings", 7, booking_rows())
+
+    insert_rows(database, "requests", 6, (
+        (rid, rng.choice(emails), random_date()) + tuple(random_lcodes(2)) +
+        (rng.randint(5, 150),)
+        for rid in range(1, requests + 1)))
+
+    def inbox_rows():
+        for email in emails:
+            # timestamps are unique per member as they are its primary key
+            timestamp = start + timedelta(seconds=rng.randrange(86400))
+            for _ in range(rng.randint(0, 2 * inbox)):
+                timestamp += timedelta(seconds=rng.randint(1, 3600))
+                yield (email, timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                       rng.choice(emails), "generated message",
+                       rng.randint(1, rides) if rides else None,
+                       "n" if rng.random() < 0.9 else "y")
+
+    insert_rows(database, "inbox", 6, inbox_rows())
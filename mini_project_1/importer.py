@@ -0,0 +1,385 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Bulk import of CSV or JSONL files into a mini-project-1 database
+
+Rows are streamed from the file, validated with the same rules used by the
+shell (e.g. :func:`.register.valid_phone` or :func:`.common.price`), and
+inserted with ``executemany`` in large transactions of ``chunk_size`` rows.
+Foreign key enforcement is turned off during the import and all the
+imported tables are checked for foreign key violations at the end, the
+rows violating a foreign key are then removed again. As bookings may be
+imported before their rides, the ``seats_booked`` of the imported rides and
+of the rides of imported bookings is recounted last.
+
+CSV files must start with a header row naming the columns of each value.
+JSONL files must contain one JSON object per line keyed by column name.
+Missing or empty values of nullable columns are imported as ``NULL``.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from collections import Counter, namedtuple
+from logging import getLogger
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from mini_project_1.common import greater_than_zero_number, price, date, \
+    MINI_PROJECT_DATE_FMT
+from mini_project_1.connection import connect, DEFAULT_PRAGMA_PROFILE, \
+    DEFAULT_BUSY_TIMEOUT
+from mini_project_1.register import valid_email_address, valid_name, \
+    valid_phone, valid_password
+
+__log__ = getLogger(__name__)
+
+FILE_FORMATS = ("csv", "jsonl")
+
+DEFAULT_CHUNK_SIZE = 50000
+
+#: number of rejected rows reported in detail
+MAX_REPORTED_REJECTS = 20
+
+#: logger of the :mod:`.register` validators, which log every invalid value
+REGISTER_LOGGER = "mini_project_1.register"
+
+Column = namedtuple("Column", ["name", "nullable", "validator"])
+
+
+def checked(validator: Callable, message: str) -> Callable:
+    """Wrap a ``valid_*`` validator from :mod:`.register` (which returns
+    :obj:`False` for invalid values) into a validator raising a
+    :class:`ValueError` for invalid values"""
+    def check(value):
+        result = validator(str(value))
+        if result is False:
+            raise ValueError(message)
+        if result is True:
+            return value
+        return result
+    return check
+
+
+def ride_date(value) -> str:
+    """Validate that the value is a date parsable by :func:`.common.date`
+    returning it as ``YYYY-MM-DD``, thus ride dates sort chronologically"""
+    return date(str(value)).strftime(MINI_PROJECT_DATE_FMT)
+
+
+IMPORT_TABLES = {
+    "members": (
+        Column("email", False,
+               checked(valid_email_address, "invalid email")),
+        Column("name", False, checked(valid_name, "invalid name")),
+        Column("phone", False, checked(valid_phone, "invalid phone")),
+        Column("pwd", False, checked(valid_password, "invalid password")),
+    ),
+    "cars": (
+        Column("cno", False, greater_than_zero_number),
+        Column("make", True, str),
+        Column("model", True, str),
+        Column("year", True, int),
+        Column("seats", True, greater_than_zero_number),
+        Column("owner", True, str),
+    ),
+    "locations": (
+        Column("lcode", False, str),
+        Column("city", True, str),
+        Column("prov", True, str),
+        Column("address", True, str),
+    ),
+    "rides": (
+        Column("rno", False, greater_than_zero_number),
+        Column("price", True, price),
+        Column("rdate", True, ride_date),
+        Column("seats", True, greater_than_zero_number),
+        Column("lugDesc", True, str),
+        Column("src", True, str),
+        Column("dst", True, str),
+        Column("driver", True, str),
+        Column("cno", True, greater_than_zero_number),
+    ),
+    "enroute": (
+        Column("rno", False, greater_than_zero_number),
+        Column("lcode", False, str),
+    ),
+    "bookings": (
+        Column("bno", False, greater_than_zero_number),
+        Column("email", True, str),
+        Column("rno", True, greater_than_zero_number),
+        Column("cost", True, price),
+        Column("seats", True, greater_than_zero_number),
+        Column("pickup", True, str),
+        Column("dropoff", True, str),
+    ),
+}
+
+
+class ImportResult:
+    """Statistics of the import of rows into a table"""
+
+    def __init__(self, table: str):
+        self.table = table
+        self.read = 0
+        self.imported = 0
+        self.rejected = 0
+        self.rejects = []
+        #: number of rejected rows by error
+        self.reject_errors = Counter()
+        self.elapsed = 0.0
+
+    def reject(self, row_number: int, error):
+        self.rejected += 1
+        self.reject_errors[str(error)] += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append((row_number, str(error)))
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return "imported {} of {} rows into {} in {:.2f}s ({:.0f} rows/s), " \
+               "rejected {} rows".format(self.imported, self.read, self.table,
+                                         self.elapsed, self.rows_per_second,
+                                         self.rejected)
+
+
+def get_file_format(path: str) -> str:
+    """Guess the format of a file to import from its extension"""
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension == "json":
+        return "jsonl"
+    if extension not in FILE_FORMATS:
+        raise ValueError("unknown import file format: {}".format(path))
+    return extension
+
+
+def read_rows(path: str, file_format: str) -> Iterator[dict]:
+    """Stream the rows of a CSV or JSONL file as dictionaries"""
+    with open(path, "r", newline="", encoding="utf-8") as import_file:
+        if file_format == "csv":
+            yield from csv.DictReader(import_file)
+        else:
+            for line in import_file:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def validate_row(columns, row: dict) -> tuple:
+    """Validate a row to import returning its column values
+
+    :raises ValueError: if the row is missing or has an invalid value
+    :raises argparse.ArgumentTypeError: if the row has an invalid number,
+    price, or date
+    """
+    values = []
+    for column in columns:
+        value = row.get(column.name)
+        if value is None or value == "":
+            if not column.nullable:
+                raise ValueError("missing {}".format(column.name))
+            values.append(None)
+        else:
+            values.append(column.validator(value))
+    return tuple(values)
+
+
+def insert_chunk(database: sqlite3.Connection, sql: str, chunk: list,
+                 result: ImportResult):
+    """Insert a chunk of validated rows within a single transaction
+
+    If the chunk violates a constraint, it is inserted row by row to reject
+    only the offending rows.
+    """
+    try:
+        with database:
+            database.executemany(sql, [values for _, values in chunk])
+        result.imported += len(chunk)
+    except sqlite3.IntegrityError:
+        with database:
+            for row_number, values in chunk:
+                try:
+                    database.execute(sql, values)
+                    result.imported += 1
+                except sqlite3.IntegrityError as e:
+                    result.reject(row_number, e)
+
+
+def drop_record(record) -> bool:
+    """Logging filter dropping every record"""
+    return False
+
+
+def import_rows(database: sqlite3.Connection, table: str,
+                rows: Iterable[dict],
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> ImportResult:
+    """Validate and insert rows into a table in chunks of ``chunk_size``
+
+    Foreign keys are not checked by this, see :func:`run_import`. The
+    rejected rows are reported by the returned result rather than logged
+    by the :mod:`.register` validators.
+    """
+    columns = IMPORT_TABLES[table]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        table, ", ".join(column.name for column in columns),
+        ", ".join("?" for _ in columns))
+    result = ImportResult(table)
+    start = time.perf_counter()
+    chunk = []
+    register_logger = getLogger(REGISTER_LOGGER)
+    register_logger.addFilter(drop_record)
+    try:
+        for row_number, row in enumerate(rows, start=1):
+            result.read += 1
+            try:
+                chunk.append((row_number, validate_row(columns, row)))
+            except (ValueError, TypeError, argparse.ArgumentTypeError) as e:
+                result.reject(row_number, e)
+                continue
+            if len(chunk) >= chunk_size:
+                insert_chunk(database, sql, chunk, result)
+                chunk = []
+        if chunk:
+            insert_chunk(database, sql, chunk, result)
+    finally:
+        register_logger.removeFilter(drop_record)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def import_file(database: sqlite3.Connection, path: str,
+                table: Optional[str] = None,
+                file_format: Optional[str] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> ImportResult:
+    """Import a CSV or JSONL file into a table
+
+    :param table: table to import into, by default the name of the file
+    (e.g. ``rides.csv`` is imported into ``rides``)
+    :param file_format: ``csv`` or ``jsonl``, by default guessed from the
+    file's extension
+    """
+    table = table or os.path.splitext(os.path.basename(path))[0]
+    if table not in IMPORT_TABLES:
+        raise ValueError("cannot import into table: {}".format(table))
+    file_format = file_format or get_file_format(path)
+    return import_rows(database, table, read_rows(path, file_format),
+                       chunk_size)
+
+
+def check_foreign_keys(database: sqlite3.Connection,
+                       tables: Iterable[str]) -> List[tuple]:
+    """Get the foreign key violations of the given tables"""
+    violations = []
+    for table in tables:
+        violations.extend(database.execute(
+            "PRAGMA foreign_key_check({})".format(table)).fetchall())
+    return violations
+
+
+def remove_foreign_key_violations(database: sqlite3.Connection,
+                                  tables: Iterable[str]) -> List[tuple]:
+    """Delete the rows of the given tables violating a foreign key
+
+    Foreign keys must be turned off. Deleting a row may leave rows
+    referencing it violating a foreign key in turn, thus the tables are
+    checked again until no violations are left.
+
+    :return: the foreign key violations of the deleted rows
+    """
+    removed = []
+    violations = check_foreign_keys(database, tables)
+    while violations:
+        with database:
+            for table in {violation[0] for violation in violations}:
+                database.executemany(
+                    "DELETE FROM {} WHERE rowid = ?".format(table),
+                    [(violation[1],) for violation in violations
+                     if violation[0] == table])
+        removed.extend(violations)
+        violations = check_foreign_keys(database, tables)
+    return removed
+
+
+def max_rowid(database: sqlite3.Connection, table: str) -> int:
+    return database.execute(
+        "SELECT MAX(rowid) FROM {}".format(table)).fetchone()[0] or 0
+
+
+def recount_seats_booked(database: sqlite3.Connection, rides_rowid: int,
+                         bookings_rowid: int) -> int:
+    """Recount the ``seats_booked`` of the rides imported after
+    ``rides_rowid`` and of the rides of the bookings imported after
+    ``bookings_rowid``, as migration 004 counts them
+
+    The bookings triggers only count a booking if its ride already exists.
+
+    :return: the number of rides recounted
+    """
+    with database:
+        return database.execute(
+            "UPDATE rides SET seats_booked = coalesce("
+            "(SELECT sum(seats) FROM bookings "
+            "WHERE bookings.rno = rides.rno), 0) "
+            "WHERE rowid > ? OR rno IN ("
+            "SELECT rno FROM bookings WHERE rowid > ?)",
+            (rides_rowid, bookings_rowid)).rowcount
+
+
+def run_import(database_path: str, paths: List[str],
+               table: Optional[str] = None,
+               file_format: Optional[str] = None,
+               chunk_size: int = DEFAULT_CHUNK_SIZE,
+               profile: str = DEFAULT_PRAGMA_PROFILE,
+               busy_timeout: int = DEFAULT_BUSY_TIMEOUT) -> int:
+    """Import files into a mini-project-1 database reporting the rows per
+    second imported
+
+    Foreign keys are checked once all the files have been imported, the
+    rows violating them are removed (see
+    :func:`remove_foreign_key_violations`).
+
+    :return: exit code, 0 if all rows were imported without foreign key
+    violations
+    """
+    database = connect(database_path, profile, busy_timeout)
+    database.execute("PRAGMA foreign_keys = OFF")
+    results = []
+    rides_rowid = max_rowid(database, "rides")
+    bookings_rowid = max_rowid(database, "bookings")
+    try:
+        for path in paths:
+            __log__.info("importing: {}".format(path))
+            result = import_file(database, path, table, file_format,
+                                 chunk_size)
+            results.append(result)
+            print(result)
+            for row_number, error in result.rejects:
+                print("  rejected row {}: {}".format(row_number, error))
+            for error, count in result.reject_errors.most_common():
+                print("  rejected {} rows: {}".format(count, error))
+        violations = remove_foreign_key_violations(
+            database, {result.table for result in results})
+        recount_seats_booked(database, rides_rowid, bookings_rowid)
+        database.execute("PRAGMA foreign_keys = ON")
+    finally:
+        database.close()
+
+    for violation in violations[:MAX_REPORTED_REJECTS]:
+        print("foreign key violation: table {} rowid {} references {}".format(
+            violation[0], violation[1], violation[2]))
+    removed = len({violation[:2] for violation in violations})
+    if violations:
+        print("{} foreign key violations, removed {} rows".format(
+            len(violations), removed))
+    imported = sum(result.imported for result in results) - removed
+    elapsed = sum(result.elapsed for result in results)
+    print("imported {} rows in {:.2f}s ({:.0f} rows/s)".format(
+        imported, elapsed, imported / elapsed if elapsed else 0.0))
+    if violations or any(result.rejected for result in results):
+        return 1
+    return 0
@@ -15,6 +15,8 @@ def get_list_bookings_parser() -> ShellArgumentParser:
     parser = ShellArgumentParser(
         prog="list_bookings",
         description="List all the bookings that you offer")
+    parser.add_argument("--include-archive", action="store_true",
+                        help="Also list the bookings on archived past rides")
 
     return parser
 
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""In-memory index of the locations table
+
+The locations table is small and rarely changes, thus it is loaded once
+into memory: a dictionary of the locations by location code and trigram
+maps over their city, province, and address. Resolving a location keyword
+then is an in-process lookup rather than a scan of the table.
+
+The index is reloaded once the table changed, that is once the version
+kept by triggers within the ``locations_version`` table changed (by a
+commit of another connection or a change of the connection itself).
+Changes to the other tables do not reload the index.
+"""
+
+import sqlite3
+from collections import defaultdict
+from logging import getLogger
+from typing import Dict, List, Optional, Set
+
+__log__ = getLogger(__name__)
+
+TRIGRAM_LENGTH = 3
+
+#: location columns searched by keyword
+SEARCH_COLUMNS = (1, 2, 3)  # city, prov, address
+
+#: characters of a ``LIKE`` pattern that are not matched literally
+LIKE_WILDCARDS = ("%", "_")
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[index:index + TRIGRAM_LENGTH]
+            for index in range(len(text) - TRIGRAM_LENGTH + 1)}
+
+
+class LocationIndex:
+    """In-memory index of a database's locations"""
+
+    def __init__(self, database: sqlite3.Connection):
+        self.database = database
+        self._version = None
+        self.rows: List[tuple] = []
+        self.lcodes: Dict[str, tuple] = {}
+        self.trigrams: Dict[str, Set[int]] = {}
+
+    def _current_version(self) -> int:
+        return self.database.execute(
+            "SELECT version FROM locations_version").fetchone()[0]
+
+    def refresh(self):
+        """Reload the locations if they may have changed"""
+        version = self._current_version()
+        if version == self._version:
+            return
+        self.rows = self.database.execute(
+            "SELECT * FROM locations ORDER BY rowid").fetchall()
+        self.lcodes = {row[0].lower(): row for row in self.rows}
+        index = defaultdict(set)
+        for position, row in enumerate(self.rows):
+            for column in SEARCH_COLUMNS:
+                for trigram in trigrams((row[column] or "").lower()):
+                    index[trigram].add(position)
+        self.trigrams = dict(index)
+        self._version = version
+        __log__.debug("loaded {} locations into the location index".format(
+            len(self.rows)))
+
+    def get(self, lcode: str) -> Optional[tuple]:
+        """Get the location with the location code (case insensitive, as
+        ``lcode LIKE ?``)"""
+        if any(wildcard in lcode for wildcard in LIKE_WILDCARDS):
+            return self.database.execute(
+                "SELECT * FROM locations WHERE lcode LIKE ?",
+                (lcode,)).fetchone()
+        self.refresh()
+        return self.lcodes.get(lcode.lower())
+
+    def search(self, keyword: str) -> List[tuple]:
+        """Get the locations whose city, province, or address contains the
+        keyword (case insensitive, as ``LIKE '%keyword%'``)"""
+        if any(wildcard in keyword for wildcard in LIKE_WILDCARDS):
+            kw = "%" + keyword + "%"
+            return self.database.execute(
+                "SELECT * FROM locations "
+                "WHERE city LIKE ? OR prov LIKE ? OR address LIKE ?",
+                (kw, kw, kw)).fetchall()
+        self.refresh()
+        keyword = keyword.lower()
+        if len(keyword) < TRIGRAM_LENGTH:
+            candidates = range(len(self.rows))
+        else:
+            candidate_sets = sorted(
+                (self.trigrams.get(trigram, set())
+                 for trigram in trigrams(keyword)), key=len)
+            candidates = sorted(set.intersection(*candidate_sets))
+        return [self.rows[position] for position in candidates
+                if any(keyword in (self.rows[position][column] or "").lower()
+                       for column in SEARCH_COLUMNS)]
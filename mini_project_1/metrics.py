@@ -0,0 +1,293 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Prometheus metrics of a mini-project-1 process
+
+A minimal metrics registry of counters and histograms rendered in the
+Prometheus text exposition format. The metrics can be exported from a
+local HTTP endpoint (see :func:`start_http_server`) or as a textfile
+periodically rewritten for a node exporter's textfile collector (see
+:class:`TextfileWriter`).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from logging import getLogger
+from typing import Dict, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from http.server import HTTPServer
+
+__log__ = getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace("\"", "\\\"")
+
+
+def format_labels(names: Sequence[str], values: Sequence, **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join("{}=\"{}\"".format(name, escape_label_value(value))
+                          for name, value in pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing counter, optionally labeled"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values):
+        with self._lock:
+            self._values[label_values] = \
+                self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name + format_labels(self.labels, label_values), value
+
+
+class Histogram:
+    """Histogram of observed values, optionally labeled"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            counts = self._values.setdefault(
+                label_values, [0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def count(self, *label_values) -> int:
+        return self._values.get(label_values, [0])[-1]
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts))
+                            for key, counts in self._values.items())
+        for label_values, counts in values:
+            for bound, count in zip(self.buckets, counts):
+                yield self.name + "_bucket" + format_labels(
+                    self.labels, label_values, le=format_value(bound)), count
+            yield self.name + "_sum" + format_labels(
+                self.labels, label_values), counts[-2]
+            yield self.name + "_count" + format_labels(
+                self.labels, label_values), counts[-1]
+
+
+class Registry:
+    """Registry of the metrics of a process"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render all the metrics in the Prometheus text format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append("# HELP {} {}".format(metric.name,
+                                               metric.documentation))
+            lines.append("# TYPE {} {}".format(metric.name, metric.type))
+            lines.extend("{} {}".format(name, format_value(value))
+                         for name, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+#: the metrics of this process
+REGISTRY = Registry()
+
+COMMANDS = REGISTRY.counter(
+    "mini_project_1_commands_total",
+    "Shell commands run", ("command",))
+COMMAND_ERRORS = REGISTRY.counter(
+    "mini_project_1_command_errors_total",
+    "Shell commands that failed with an unhandled error", ("command",))
+COMMAND_DURATION = REGISTRY.histogram(
+    "mini_project_1_command_duration_seconds",
+    "Wall time of the shell commands", ("command",))
+DATABASE_BUSY = REGISTRY.counter(
+    "mini_project_1_database_busy_total",
+    "Statements that failed as the database was busy or locked")
+WRITER_LOCK_WAITS = REGISTRY.counter(
+    "mini_project_1_writer_lock_waits_total",
+    "Write transactions that had to wait on another pooled connection's "
+    "write transaction")
+ROWS = REGISTRY.counter(
+    "mini_project_1_rows_total",
+    "Rows returned by the statements of the shell commands")
+MESSAGES_SENT = REGISTRY.counter(
+    "mini_project_1_messages_sent_total",
+    "Inbox messages sent")
+BOOKINGS_CREATED = REGISTRY.counter(
+    "mini_project_1_bookings_created_total",
+    "Bookings created")
+
+
+def is_busy_error(error: Exception) -> bool:
+    """Check if an error notes that the database was busy or locked"""
+    return isinstance(error, sqlite3.OperationalError) and \
+        ("locked" in str(error) or "busy" in str(error))
+
+
+@contextmanager
+def command_metrics(name: str):
+    """Shell command hook recording the metrics of a command"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        COMMAND_ERRORS.inc(1, name)
+        if is_busy_error(e):
+            DATABASE_BUSY.inc()
+        raise
+    finally:
+        COMMANDS.inc(1, name)
+        COMMAND_DURATION.observe(time.perf_counter() - start, name)
+
+
+def count_rows(statement: str, parameters, elapsed: float, rows: int):
+    """Statement listener counting the rows returned"""
+    ROWS.inc(rows)
+
+
+def inc_committed(database: sqlite3.Connection, counter: Counter,
+                  amount: float = 1, *label_values):
+    """Increment a counter of changes the database committed
+
+    Call once the changes are committed. A connection deferring its commits
+    (see :class:`.batch.BatchConnection`) only increments the counter once
+    the changes are actually committed, not if they are rolled back.
+    """
+    defer_increment = getattr(database, "defer_increment", None)
+    if defer_increment is None:
+        counter.inc(amount, *label_values)
+    else:
+        defer_increment(counter, amount, label_values)
+
+
+def start_http_server(port: int, host: str = "127.0.0.1",
+                      registry: Registry = REGISTRY) -> "HTTPServer":
+    """Serve the metrics over HTTP from a background thread
+
+    :return: the started :class:`http.server.HTTPServer`
+    """
+    # http.server is slow to import, only import it once metrics are served
+    import socketserver
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    # http.server.ThreadingHTTPServer requires python 3.7
+    class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """HTTP handler serving the metrics of the registry"""
+
+        def do_GET(self):
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            __log__.debug("metrics request: " + format % args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True,
+                              name="metrics-http")
+    thread.start()
+    __log__.info("serving metrics on: http://{}:{}/metrics".format(
+        *server.server_address))
+    return server
+
+
+class TextfileWriter:
+    """Periodically rewrite the metrics to a textfile from a background
+    thread"""
+
+    def __init__(self, path: str, interval: float = 15.0,
+                 registry: Registry = REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="metrics-textfile")
+
+    def write(self):
+        """Atomically rewrite the textfile with the current metrics"""
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as textfile:
+            textfile.write(self.registry.render())
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                __log__.exception("failed to write metrics to: {}".format(
+                    self.path))
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop rewriting the textfile and write the final metrics"""
+        self._stopped.set()
+        self._thread.join()
+        self.write()
@@ -0,0 +1,109 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Versioned schema migrations for a mini-project-1 database
+
+Migrations are numbered SQL scripts stored within ``data/migrations``
+(e.g. ``001_location_search.sql``) that are applied on top of the schema
+defined within ``data/create_tables.sql``. The number of the last applied
+migration is tracked by the database's ``PRAGMA user_version``.
+
+The location search index of ``001_location_search.sql`` requires SQLite
+3.34 or newer built with FTS5, for its trigram tokenizer.
+"""
+
+import os
+import re
+import sqlite3
+from logging import getLogger
+from typing import List, Tuple
+
+__log__ = getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "data", "migrations")
+
+MIGRATION_FILE_RE = re.compile(r"^(\d+)_\w+\.sql$")
+
+# first SQLite version with the FTS5 trigram tokenizer
+MIN_SQLITE_VERSION = (3, 34, 0)
+
+
+class MigrationException(Exception):
+    """Exception noting that a database could not be migrated"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(self, *args, **kwargs)
+
+
+def get_migrations() -> List[Tuple[int, str]]:
+    """Get the ``(number, path)`` of every migration script sorted by
+    migration number"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        m = MIGRATION_FILE_RE.match(filename)
+        if m:
+            migrations.append(
+                (int(m.group(1)), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(migrations)
+
+
+def trigram_supported() -> bool:
+    """Whether the SQLite library supports the FTS5 trigram tokenizer"""
+    database = sqlite3.connect(":memory:")
+    try:
+        database.execute(
+            "CREATE VIRTUAL TABLE trigram_check USING fts5(a, "
+            "tokenize='trigram')")
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        database.close()
+    return True
+
+
+def get_schema_version(database: sqlite3.Connection) -> int:
+    """Get the number of the last migration applied to the database"""
+    return database.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(database: sqlite3.Connection):
+    """Apply all the migrations that have not yet been applied to the
+    database
+
+    Each migration is applied within its own transaction along with the
+    update of the database's ``PRAGMA user_version``. Thus, an existing
+    database can be upgraded in place and a failed migration leaves the
+    database at the last successfully applied migration.
+    """
+    version = get_schema_version(database)
+    migrations = get_migrations()
+    latest = migrations[-1][0] if migrations else 0
+    if version > latest:
+        raise MigrationException(
+            "database schema version {} is newer than the latest known "
+            "migration {}".format(version, latest))
+    if version < latest and not trigram_supported():
+        raise MigrationException(
+            "SQLite {} does not support the FTS5 trigram tokenizer, SQLite "
+            "{} or newer built with FTS5 is required".format(
+                sqlite3.sqlite_version,
+                ".".join(str(part) for part in MIN_SQLITE_VERSION)))
+    for number, path in migrations:
+        if number <= version:
+            continue
+        __log__.info("applying migration: {}".format(os.path.basename(path)))
+        with open(path, "r") as migration_file:
+            script = migration_file.read()
+        try:
+            database.executescript(
+                "BEGIN;\n{}\nPRAGMA user_version = {};\nCOMMIT;".format(
+                    script, number)
+            )
+        except sqlite3.Error as e:
+            database.rollback()
+            raise MigrationException(
+                "failed to apply migration {}: {}".format(
+                    os.path.basename(path), e)) from e
+    if version < latest:
+        __log__.info("migrated database schema from version {} to {}".format(
+            version, latest))
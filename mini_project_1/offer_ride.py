@@ -10,12 +10,15 @@ car number and any set of enroute locations.
 """
 
 import sqlite3
-
-import pendulum
+from typing import TYPE_CHECKING
 
 from mini_project_1.common import ShellArgumentParser, date, \
     greater_than_zero_number, price
 from mini_project_1.loginsession import LoginSession
+from mini_project_1.sequences import next_id, RIDES
+
+if TYPE_CHECKING:
+    import pendulum
 
 
 def get_offer_ride_parser() -> ShellArgumentParser:
@@ -40,13 +43,13 @@ def get_offer_ride_parser() -> ShellArgumentParser:
                         help="Keyword for the end location of the ride")
     parser.add_argument("--cno", nargs='?', default=None,
                         help="Your car number to use")
-    parser.add_argument("--enroute", nargs='+', default=set(),
+    parser.add_argument("--enroute", nargs='+', default=(),
                         help="Enroute locations to go to")
     return parser
 
 
 def offer_ride(database: sqlite3.Connection, member: LoginSession,
-               date: pendulum.DateTime, seats: int, price: int, luggage: str,
+               date: "pendulum.DateTime", seats: int, price: int, luggage: str,
                source: str, destination: str, cno: str = None,
                enroute: set = set()) -> bool:
     """Try to add a ride to the database for the member
@@ -54,13 +57,8 @@ def offer_ride(database: sqlite3.Connection, member: LoginSession,
     :return: if a ride has been added (True/False)
     """
     dbcursor = database.cursor()
-    dbcursor.execute(
-        "SELECT MAX(rno) "
-        "FROM rides"
-    )
-    rno = str(int(dbcursor.fetchone()[0]) + 1)
-
     try:
+        rno = next_id(database, RIDES)
         dbcursor.execute(
             "INSERT INTO rides (rno, price, rdate, seats, lugDesc, src, dst, driver) VALUES " +
             "(?, ?, ?, ?, ?, ?, ?, ?)",
@@ -82,9 +80,11 @@ def offer_ride(database: sqlite3.Connection, member: LoginSession,
             )
     except sqlite3.OperationalError as e:
         print(e)
+        database.rollback()
         return False
     except sqlite3.IntegrityError as e:
         print(e)
+        database.rollback()
         return False
 
     database.commit()
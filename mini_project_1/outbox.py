@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Outbox of inbox messages waiting to be delivered
+
+Rather than inserting and committing every message on its own, messages
+are queued within an outbox and delivered together with a single
+``executemany`` and commit. The outbox is flushed once it holds
+``max_messages`` messages, once its oldest message waited ``max_delay``
+seconds, and at the end of every shell command.
+
+Senders choose whether to wait for their message to be committed (the
+default of :func:`.common.send_message`) or to return as soon as the
+message is queued. The shell reports the messages that could not be
+delivered once its command is done.
+"""
+
+import sqlite3
+import time
+from logging import getLogger
+from typing import List, Optional
+
+from mini_project_1.common import insert_message
+from mini_project_1.metrics import MESSAGES_SENT, inc_committed
+
+__log__ = getLogger(__name__)
+
+DEFAULT_MAX_MESSAGES = 50
+DEFAULT_MAX_DELAY = 1.0
+
+INSERT_MESSAGE = "INSERT INTO inbox VALUES (?, ?, ?, ?, ?, 'n');"
+
+
+class MessageOutbox:
+    """Queue of inbox messages delivered in batches"""
+
+    def __init__(self, database: sqlite3.Connection,
+                 max_messages: int = DEFAULT_MAX_MESSAGES,
+                 max_delay: float = DEFAULT_MAX_DELAY):
+        """Initialize a message outbox
+
+        :param database: connection to deliver the messages with
+        :param max_messages: number of queued messages that triggers a flush
+        :param max_delay: seconds the oldest queued message may wait before
+        it triggers a flush
+        """
+        self.database = database
+        self.max_messages = max_messages
+        self.max_delay = max_delay
+        #: queued ``(email, msgTimestamp, sender, content, rno)`` messages
+        self.messages: List[tuple] = []
+        self._oldest: Optional[float] = None
+
+    def __len__(self):
+        return len(self.messages)
+
+    def queue(self, recipient: str, msg_timestamp: str, sender: str,
+              content: str, rno: Optional[int], wait: bool = False):
+        """Queue a message, flushing the outbox if a threshold is reached
+
+        :param wait: flush the outbox before returning, thus the message
+        is committed once this returns
+        """
+        if not self.messages:
+            self._oldest = time.monotonic()
+        self.messages.append((recipient, msg_timestamp, sender, content, rno))
+        if wait or len(self.messages) >= self.max_messages or \
+                time.monotonic() - self._oldest >= self.max_delay:
+            self.flush()
+
+    def flush(self) -> List[tuple]:
+        """Deliver all the queued messages within a single transaction
+
+        A message whose timestamp collides with another message to the same
+        recipient is delivered with the next free timestamp. A message that
+        violates another constraint is not delivered, the other messages
+        still are.
+
+        If the delivery fails otherwise (e.g. the database is locked) the
+        transaction is rolled back and the messages stay queued.
+
+        :return: the messages that could not be delivered
+        """
+        if not self.messages:
+            return []
+        queued, self.messages = self.messages, []
+        messages = queued
+        failed = []
+        try:
+            while messages:
+                consumed = []
+
+                def pending():
+                    # executemany stops at the first message violating a
+                    # constraint, the messages consumed before it are
+                    # inserted
+                    for message in messages:
+                        consumed.append(message)
+                        yield message
+
+                try:
+                    self.database.executemany(INSERT_MESSAGE, pending())
+                    messages = []
+                except sqlite3.IntegrityError:
+                    try:
+                        insert_message(self.database, consumed[-1])
+                    except sqlite3.IntegrityError as e:
+                        __log__.error(
+                            "failed to deliver message: {} ({})".format(
+                                consumed[-1], e))
+                        failed.append(consumed[-1])
+                    messages = messages[len(consumed):]
+            self.database.commit()
+        except sqlite3.Error:
+            # e.g. the database is locked, none of the messages are
+            # delivered, they stay queued for the next flush
+            self.database.rollback()
+            self.messages = queued + self.messages
+            raise
+        inc_committed(self.database, MESSAGES_SENT,
+                      len(queued) - len(failed))
+        return failed
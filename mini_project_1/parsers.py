@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Registry of the argparsers of the shell commands
+
+Each shell command's argparser is declared by the ``module:function`` path
+of its factory, the module is only imported and the argparser only built
+the first time the command (or its help) is used. Built argparsers are
+reused for the rest of the process, as parsing arguments does not change
+an argparser.
+"""
+
+import importlib
+from logging import getLogger
+from threading import Lock
+from typing import Dict
+
+from mini_project_1.common import ShellArgumentParser
+
+__log__ = getLogger(__name__)
+
+#: shell command name -> ``module:function`` path of its argparser factory
+PARSERS: Dict[str, str] = {
+    "logout": "mini_project_1.logout:get_logout_parser",
+    "show_inbox": "mini_project_1.show_inbox:get_show_inbox_parser",
+    "offer_ride": "mini_project_1.offer_ride:get_offer_ride_parser",
+    "search_rides": "mini_project_1.search_rides:get_search_for_ride_parser",
+    "list_bookings": "mini_project_1.list_bookings:get_list_bookings_parser",
+    "book_member": "mini_project_1.book_member:get_book_member_parser",
+    "cancel_booking":
+        "mini_project_1.cancel_booking:get_cancel_booking_parser",
+    "post_request": "mini_project_1.post_request:get_post_request_parser",
+    "list_requests":
+        "mini_project_1.list_requests:get_list_ride_requests_parser",
+    "search_requests_lcode":
+        "mini_project_1.search_requests:get_search_requests_lcode_parser",
+    "search_requests_city":
+        "mini_project_1.search_requests:get_search_requests_city_parser",
+    "delete_request":
+        "mini_project_1.delete_request:get_delete_request_parser",
+    "select_request":
+        "mini_project_1.select_request:get_select_request_parser",
+    "stats": "mini_project_1.stats:get_stats_parser",
+    "profile": "mini_project_1.profiler:get_profile_parser",
+}
+
+_parsers: Dict[str, ShellArgumentParser] = {}
+_lock = Lock()
+
+
+def register_parser(command: str, factory: str):
+    """Declare the argparser of a shell command
+
+    :param command: name of the shell command
+    :param factory: ``module:function`` path of a function returning the
+    command's argparser
+    """
+    with _lock:
+        PARSERS[command] = factory
+        _parsers.pop(command, None)
+
+
+def get_parser(command: str) -> ShellArgumentParser:
+    """Get the argparser of a shell command, building it on first use"""
+    parser = _parsers.get(command)
+    if parser is None:
+        with _lock:
+            parser = _parsers.get(command)
+            if parser is None:
+                module_name, function_name = PARSERS[command].split(":")
+                factory = getattr(importlib.import_module(module_name),
+                                  function_name)
+                parser = _parsers[command] = factory()
+                __log__.debug("built argparser of command: {}".format(
+                    command))
+    return parser
@@ -13,11 +13,13 @@ the member.
 import argparse
 import sqlite3
 from logging import getLogger
-
-import pendulum
+from typing import TYPE_CHECKING
 
 from mini_project_1.common import ShellArgumentParser, MINI_PROJECT_DATE_FMT
 
+if TYPE_CHECKING:
+    import pendulum
+
 
 __log__ = getLogger(__name__)
 
@@ -35,9 +37,10 @@ def price(price_string: str) -> int:
     return price
 
 
-def date(date_str: str) -> pendulum.DateTime:
+def date(date_str: str) -> "pendulum.DateTime":
     """Argparser type validation function for validating a date for use
     in ``post_ride_request`` command"""
+    import pendulum
     parsed_date = pendulum.parse(date_str)
     if parsed_date >= pendulum.today().subtract(days=1):
         return parsed_date
@@ -71,17 +74,27 @@ def get_post_request_parser() -> ShellArgumentParser:
 
 
 def valid_location_code(database: sqlite3.Connection,
-                        location_code_str: str) -> bool:
+                        location_code_str: str,
+                        location_index=None) -> bool:
     """Validate that a location ode for use in ``post_ride_request``
-    command actually exists in locations"""
-
-    locations = database.execute(
-        "SELECT lcode "
-        "FROM locations "
-        "WHERE locations.lcode = ?",
-        (location_code_str,)
-    ).fetchone()
-    if not locations:
+    command actually exists in locations
+
+    :param location_index: :class:`.locations.LocationIndex` to validate the
+    location code with, by default the locations table is queried
+    """
+    if location_index is not None:
+        location = location_index.get(location_code_str)
+        # location codes are matched exactly (case sensitive)
+        if location and location[0] != location_code_str:
+            location = None
+    else:
+        location = database.execute(
+            "SELECT lcode "
+            "FROM locations "
+            "WHERE locations.lcode = ?",
+            (location_code_str,)
+        ).fetchone()
+    if not location:
         __log__.error("invalid location code: {}".format(location_code_str))
         return False
     else:
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Command profiler
+
+Profiles each command run within the shell individually with
+:mod:`cProfile`. The profile of every command is saved as a pstats file
+(e.g. ``00003_search_rides.pstats``) within a directory, to be inspected
+with :mod:`pstats` or tools such as snakeviz.
+
+The ``profile`` command shows the top hotspots of all the commands
+profiled within the current session.
+"""
+
+import cProfile
+import os
+import pstats
+from contextlib import contextmanager
+from logging import getLogger
+from typing import Optional
+
+from mini_project_1.common import ShellArgumentParser
+
+__log__ = getLogger(__name__)
+
+SORT_KEYS = ("cumulative", "tottime", "calls")
+
+
+def get_profile_parser() -> ShellArgumentParser:
+    """Argparser for the :class:`.shell.MiniProjectShell`
+    ``profile`` command"""
+    parser = ShellArgumentParser(
+        prog="profile",
+        description="Show the top hotspots of the commands profiled within "
+                    "this session")
+    parser.add_argument("command", nargs="?",
+                        help="Only show the hotspots of this command")
+    parser.add_argument("--limit", type=int, default=20,
+                        help="Number of functions to show")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="cumulative",
+                        help="Order to show the functions in")
+    return parser
+
+
+class CommandProfiler:
+    """Profiler of the commands run within a shell"""
+
+    def __init__(self, directory: str):
+        """Initialize a command profiler
+
+        :param directory: directory to save the pstats file of each command
+        profiled to
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.count = 0
+        #: pstats files saved per command
+        self.files = {}
+
+    @contextmanager
+    def command(self, name: str):
+        """Context manager profiling a command"""
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.count += 1
+            path = os.path.join(self.directory, "{:05d}_{}.pstats".format(
+                self.count, name))
+            profile.dump_stats(path)
+            self.files.setdefault(name, []).append(path)
+            __log__.debug("saved profile of {} to: {}".format(name, path))
+
+    def print_hotspots(self, command: Optional[str] = None, limit: int = 20,
+                       sort: str = "cumulative"):
+        """Print the top functions of the profiled commands"""
+        if command is not None:
+            files = self.files.get(command, [])
+        else:
+            files = [path for paths in self.files.values() for path in paths]
+        if not files:
+            print("No profiled commands")
+            return
+        stats = pstats.Stats(*files)
+        stats.sort_stats(sort).print_stats(limit)
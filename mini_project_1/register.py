@@ -5,7 +5,6 @@
 
 import re
 import sqlite3
-from email.utils import parseaddr
 from logging import getLogger
 from typing import Union
 
@@ -46,9 +45,9 @@ def valid_phone(phone_str: str) -> Union[bool, str]:
         return False
 
 
-def valid_email(database: sqlite3.Connection, email_str: str) ->\
-        Union[bool, str]:
-    """Validator for a member's email"""
+def valid_email_address(email_str: str) -> Union[bool, str]:
+    """Validator for the format of a member's email"""
+    from email.utils import parseaddr
     full_name, email_addr = parseaddr(email_str)
     if not email_addr or "@" not in email_str[1:-3]:
         __log__.error("invalid email: please use format: name@addr")
@@ -57,6 +56,16 @@ def valid_email(database: sqlite3.Connection, email_str: str) ->\
         __log__.error(
             "invalid email length: choose between 3 to 15 characters")
         return False
+    else:
+        return email_addr
+
+
+def valid_email(database: sqlite3.Connection, email_str: str) ->\
+        Union[bool, str]:
+    """Validator for a member's email"""
+    email_addr = valid_email_address(email_str)
+    if not email_addr:
+        return False
     elif not unique_email(database, email_addr):
         __log__.error(
             "invalid email: email {} is already taken".format(email_addr))
@@ -11,7 +11,7 @@ at a time. The member should be able to select a request and message the
 posting member, for example asking the member to check out a ride.
 """
 
-from mini_project_1.common import ShellArgumentParser
+from mini_project_1.common import ShellArgumentParser, Paginator
 
 
 def get_search_requests_lcode_parser() -> ShellArgumentParser:
@@ -40,24 +40,37 @@ def get_search_requests_city_parser() -> ShellArgumentParser:
 
 def print_5_and_prompt(rows):
     """Print out 5 rows and if more rows exist prompt the user
-    if they want more. If the user enters ``all`` print the remaining rows."""
-    if len(rows) > 5:
-        index = 0
-        while index < len(rows)-1:
-            end_index = min(index + 5, len(rows))
-            print("Rows {}-{}:".format(index+1, end_index))
-            for row in rows[index:end_index]:
-                print(row)
-            if end_index == len(rows):
-                break
-            see_more = input(
-                "Enter 'more' to see 5 more results or enter "
-                "anything else to finish.\n").lower()
-            if see_more != "more":
-                break
-            else:
-                index = index + 5
-    else:
+    if they want more. If the user enters ``back`` the previous 5 rows are
+    printed again.
+
+    Rows are pulled from the list (or cursor) lazily, only the rows printed
+    (and the first row of the next page) are fetched."""
+    pages = rows if isinstance(rows, Paginator) else Paginator(rows)
+    if pages.is_last_page(0):
         print("All rows:")
-        for row in rows:
+        for row in pages.page(0):
+            print(row)
+        return
+    number = 0
+    while True:
+        page = pages.page(number)
+        start = number * pages.page_size
+        print("Rows {}-{}:".format(start + 1, start + len(page)))
+        for row in page:
             print(row)
+        last = pages.is_last_page(number)
+        if last:
+            see_more = input(
+                "Enter 'back' to see the previous results or enter anything "
+                "else to finish.\n").lower()
+        else:
+            see_more = input(
+                "Enter 'more' to see 5 more results, 'back' to see the "
+                "previous results, or enter anything else to finish.\n"
+            ).lower()
+        if see_more == "more" and not last:
+            number += 1
+        elif see_more == "back":
+            number = max(number - 1, 0)
+        else:
+            break
@@ -15,7 +15,22 @@ option to see more. The member should be able to select a ride and message
 the member posting the ride that h/she wants to book seats on that ride.
 """
 
-from mini_project_1.common import ShellArgumentParser
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from mini_project_1.archive import with_archive
+from mini_project_1.common import ShellArgumentParser, date, \
+    greater_than_zero_number, MINI_PROJECT_DATE_FMT
+
+# minimum keyword length that can be resolved by the trigram location index
+TRIGRAM_LENGTH = 3
+
+# number of rides fetched by each keyset paginated search
+SEARCH_PAGE_SIZE = 5
+
+# search order of the rides, see :func:`ride_key`
+SEARCH_ORDER = ("r.rdate", "r.price", "r.rno")
 
 
 def get_search_for_ride_parser() -> ShellArgumentParser:
@@ -32,4 +47,197 @@ def get_search_for_ride_parser() -> ShellArgumentParser:
                         help="Location search term to use to look rides")
     parser.add_argument("term3", nargs='?', default=None,
                         help="Location search term to use to look rides")
+    parser.add_argument("--from", dest="date_from", type=date, default=None,
+                        help="Only show rides on or after this date "
+                             "(eg: 2018-12-01)")
+    parser.add_argument("--to", dest="date_to", type=date, default=None,
+                        help="Only show rides on or before this date "
+                             "(eg: 2018-12-31)")
+    parser.add_argument("--min-seats", type=greater_than_zero_number,
+                        default=None,
+                        help="Only show rides with at least this many seats "
+                             "not booked")
+    parser.add_argument("--include-archive", action="store_true",
+                        help="Also search the archived past rides")
     return parser
+
+
+def location_match_query(keyword: str) -> Tuple[str, tuple]:
+    """Get a query (and its parameters) selecting the lcode of every
+    location that matches the given keyword
+
+    A location matches a keyword if the keyword is the location code or a
+    substring of the city, province, or address of the location.
+    Substrings are resolved through the ``location_search`` trigram index.
+    """
+    if len(keyword) < TRIGRAM_LENGTH:
+        # too short for the trigram index, fallback to scanning locations
+        kw = "%" + keyword + "%"
+        return (
+            "SELECT lcode FROM locations "
+            "WHERE lcode LIKE ? OR city LIKE ? OR prov LIKE ? "
+            "OR address LIKE ?",
+            (keyword, kw, kw, kw)
+        )
+    return (
+        "SELECT lcode FROM locations WHERE lcode LIKE ? "
+        "UNION "
+        "SELECT lcode FROM location_search WHERE location_search MATCH ?",
+        (keyword, '{city prov address} : "%s"' % keyword.replace('"', '""'))
+    )
+
+
+def search_rides_query(
+        keywords: List[Optional[str]], after: Optional[tuple] = None,
+        limit: Optional[int] = None, date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        min_seats: Optional[int] = None,
+        include_archive: bool = False) -> Optional[Tuple[str, tuple]]:
+    """Get a query (and its parameters) selecting all the rides that match
+    all the given location keywords, ``None`` if no keywords are given
+
+    Each keyword is first resolved into a set of location codes, the
+    candidate rides are then found by indexed lookups of those location
+    codes on the ride's source, destination, and enroute locations. The
+    date range (narrowed to the dates past ``after``) bounds these lookups
+    on the ``(src, rdate)`` and ``(dst, rdate)`` indexes, a range bounded
+    on both ends looks up the enroute locations of the rides within it
+    rather than every ride through the location. Only the
+    candidates past ``after`` are sorted in ``(rdate, price, rno)`` order
+    (see :func:`after_condition`). Each ride is selected once.
+
+    :param after: the :func:`ride_key` of the last ride of the previous
+    page, only the rides past it are selected
+    :param limit: maximum number of rides to select
+    :param date_from: only select rides on or after this date
+    :param date_to: only select rides on or before this date
+    :param min_seats: only select rides with at least this many seats not
+    booked (see the ``seats_booked`` column maintained by triggers)
+    :param include_archive: also select the rides of the attached archive
+    database (see :mod:`.archive`)
+    """
+    rides, enroute = "rides", "enroute"
+    if include_archive:
+        rides, enroute = with_archive("rides"), with_archive("enroute")
+    # the rides past ``after`` are dated on or after its date (rides
+    # without a date come first)
+    if after is not None and after[0] is not None and \
+            (date_from is None or after[0] > date_from):
+        date_from = after[0]
+    window = ""
+    window_params = ()
+    if date_from is not None:
+        window += " AND rdate >= ?"
+        window_params = window_params + (date_from,)
+    if date_to is not None:
+        # rides offered from the shell are dated with a time of day, they
+        # are within the day up to the start of the next day
+        window += " AND rdate < ?"
+        window_params = window_params + ((datetime.strptime(
+            date_to, MINI_PROJECT_DATE_FMT) + timedelta(days=1)).strftime(
+                MINI_PROJECT_DATE_FMT),)
+    # enroute holds no dates, within a bounded range the rides are scanned
+    # on the rdate index (CROSS JOIN keeps them the outer loop) and their
+    # enroute locations looked up by rno (the unary + keeps the lcode out
+    # of the lookup, as probing every matched location costs more)
+    enroute_branch = "SELECT e.rno FROM {enroute} e, {rides} er " \
+                     "WHERE e.lcode IN l{index} AND er.rno = e.rno{window}"
+    if date_from is not None and date_to is not None:
+        enroute_branch = "SELECT e.rno FROM {rides} er CROSS JOIN " \
+                         "{enroute} e WHERE +e.lcode IN l{index} " \
+                         "AND er.rno = e.rno{window}"
+    ctes = []
+    conditions = []
+    params = ()
+    for index, keyword in enumerate(kw for kw in keywords if kw):
+        match_query, match_params = location_match_query(keyword)
+        ctes.append((
+            "l{index}(lcode) AS ({match}), "
+            "m{index}(rno) AS ("
+            "SELECT rno FROM {rides} WHERE src IN l{index}{window} "
+            "UNION SELECT rno FROM {rides} WHERE dst IN l{index}{window} "
+            "UNION " + enroute_branch + ")").format(
+                index=index, match=match_query, rides=rides, enroute=enroute,
+                window=window)
+        )
+        conditions.append("r.rno IN m{}".format(index))
+        params = params + match_params + window_params * 3
+    if not ctes:
+        return None
+    if min_seats is not None:
+        conditions.append("r.seats - r.seats_booked >= ?")
+        params = params + (min_seats,)
+    if after is not None:
+        condition, after_params = after_condition(after)
+        conditions.append(condition)
+        params = params + after_params
+    query = (
+        "WITH " + ", ".join(ctes) + " "
+        "SELECT r.* FROM " + rides + " r "
+        "WHERE " + " AND ".join(conditions) + " "
+        "ORDER BY " + ", ".join(SEARCH_ORDER)
+    )
+    if limit is not None:
+        query += " LIMIT ?"
+        params = params + (limit,)
+    return query, params
+
+
+def after_condition(after: tuple) -> Tuple[str, tuple]:
+    """Get a condition (and its parameters) selecting the rides past a
+    :func:`ride_key` in :data:`SEARCH_ORDER`
+
+    As within ``ORDER BY`` NULLs come first. A row value comparison is not
+    used as a comparison with a NULL is never true, thus rides without a
+    date or price would be lost past the first page.
+    """
+    condition, params = None, ()
+    for column, value in reversed(list(zip(SEARCH_ORDER, after))):
+        greater, greater_params = \
+            ("{} IS NOT NULL".format(column), ()) if value is None else \
+            ("{} > ?".format(column), (value,))
+        if condition is None:
+            condition, params = greater, greater_params
+        else:
+            condition = "({} OR ({} IS ? AND {}))".format(
+                greater, column, condition)
+            params = greater_params + (value,) + params
+    return condition, params
+
+
+def ride_key(ride: tuple) -> tuple:
+    """Get the ``(rdate, price, rno)`` search order key of a ride"""
+    return ride[2], ride[1], ride[0]
+
+
+def iter_search_rides(database: sqlite3.Connection,
+                      keywords: List[Optional[str]],
+                      page_size: int = SEARCH_PAGE_SIZE,
+                      **filters) -> Iterator[tuple]:
+    """Iterate over the rides that match all the given location keywords
+    and filters (see :func:`search_rides_query`)
+
+    Rides are fetched a page at a time by keyset pagination: each page
+    selects the candidate rides past the last ride of the previous page,
+    thus only the pages iterated over are ever sorted and fetched.
+    """
+    after = None
+    while True:
+        query = search_rides_query(keywords, after, page_size, **filters)
+        if query is None:
+            return
+        rides = database.execute(*query).fetchall()
+        yield from rides
+        if len(rides) < page_size:
+            return
+        after = ride_key(rides[-1])
+
+
+def search_rides(database: sqlite3.Connection,
+                 keywords: List[Optional[str]], **filters) -> List[tuple]:
+    """Get all the rides that match all the given location keywords and
+    filters (see :func:`search_rides_query`)"""
+    query = search_rides_query(keywords, **filters)
+    if query is None:
+        return []
+    return database.execute(*query).fetchall()
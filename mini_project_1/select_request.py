@@ -16,5 +16,8 @@ def get_select_request_parser() -> ShellArgumentParser:
 
     parser.add_argument("rid", type=int,
                         help="The ID of the ride request")
+    parser.add_argument("--message", nargs="+", default=None,
+                        help="Message to send to the poster of the ride "
+                             "request, if not given you will be prompted")
 
     return parser
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Allocation of unique ids for rides, bookings, and requests
+
+Ids are allocated from the ``id_sequences`` table which stores the last
+allocated id for each of the ``rides``, ``bookings``, and ``requests``
+tables. Bumping a sequence takes the database's write lock, thus
+concurrent writers allocating from the same sequence are serialized and
+can never be handed the same id.
+"""
+
+import sqlite3
+
+RIDES = "rides"
+BOOKINGS = "bookings"
+REQUESTS = "requests"
+
+
+def allocate_ids(database: sqlite3.Connection, sequence: str,
+                 count: int = 1) -> range:
+    """Reserve a block of ``count`` consecutive ids from a sequence
+
+    This opens (or joins) a write transaction on the database. The rows
+    using the allocated ids should be inserted within the same
+    transaction, a rollback releases the reserved ids.
+
+    :param sequence: name of the sequence to allocate from
+    (:data:`RIDES`, :data:`BOOKINGS`, or :data:`REQUESTS`)
+    :param count: number of ids to reserve (e.g. for bulk inserts), at
+    least one
+    :return: :class:`range` of the reserved ids
+    """
+    if count < 1:
+        raise ValueError("id count must be at least 1: {}".format(count))
+    cursor = database.execute(
+        "UPDATE id_sequences "
+        "SET last_id = last_id + ? "
+        "WHERE name = ?",
+        (count, sequence)
+    )
+    if cursor.rowcount != 1:
+        raise ValueError("unknown id sequence: {}".format(sequence))
+    last_id = database.execute(
+        "SELECT last_id "
+        "FROM id_sequences "
+        "WHERE name = ?",
+        (sequence,)
+    ).fetchone()[0]
+    return range(last_id - count + 1, last_id + 1)
+
+
+def next_id(database: sqlite3.Connection, sequence: str) -> int:
+    """Allocate a single id from a sequence
+
+    See :func:`allocate_ids`.
+    """
+    return allocate_ids(database, sequence)[0]
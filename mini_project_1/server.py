@@ -0,0 +1,299 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Multi-session network server for the mini-project-1 shell
+
+An asyncio TCP server that runs one :class:`.shell.MiniProjectShell` per
+connected client over the client's own stream. As the shell is blocking,
+each session runs within a bounded thread pool and uses its worker thread's
+pooled connection from a :class:`.connection.ConnectionPool`.
+
+A session holds its worker thread while waiting on its client, thus a
+session idle (not sending input, or not reading its output) for longer
+than the server's ``idle_timeout`` is ended to free the worker for the
+clients waiting on a session.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import Optional
+
+from mini_project_1.connection import ConnectionPool, \
+    DEFAULT_PRAGMA_PROFILE, DEFAULT_BUSY_TIMEOUT
+from mini_project_1.shell import MiniProjectShell
+from mini_project_1.slow_query import SlowQueryLog, DEFAULT_LARGE_TABLE_ROWS
+
+__log__ = getLogger(__name__)
+
+#: seconds a session may wait on its client before it is ended
+DEFAULT_IDLE_TIMEOUT = 600.0
+
+
+class SessionStream:
+    """Blocking file-like text stream over a client's asyncio streams
+
+    Used by a session's worker thread, all the stream operations are
+    handed to the event loop running the server.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter,
+                 loop: asyncio.AbstractEventLoop,
+                 idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT):
+        """Initialize a session stream
+
+        :param idle_timeout: seconds to wait for a line from the client, or
+        for the client to read the output written, ``None`` to wait forever
+        """
+        self.reader = reader
+        self.writer = writer
+        self.loop = loop
+        self.idle_timeout = idle_timeout
+
+    def readline(self) -> str:
+        """Read a line from the client, an empty string notes that the
+        client disconnected or was idle for longer than the idle timeout"""
+        try:
+            line = asyncio.run_coroutine_threadsafe(
+                asyncio.wait_for(self.reader.readline(), self.idle_timeout),
+                self.loop).result()
+        except asyncio.TimeoutError:
+            __log__.info("ending session idle for {}s".format(
+                self.idle_timeout))
+            self.write("\nSession idle for {}s, disconnecting\n".format(
+                self.idle_timeout))
+            return ""
+        return line.decode("utf-8", "replace").replace("\r\n", "\n")
+
+    async def _write(self, data: bytes):
+        self.writer.write(data)
+        await asyncio.wait_for(self.writer.drain(), self.idle_timeout)
+
+    def write(self, text: str) -> int:
+        """Write text to the client, waiting for the client to read it
+        once the transport's write buffer is full
+
+        :raise asyncio.TimeoutError: if the client does not read its output
+        within the idle timeout
+        """
+        asyncio.run_coroutine_threadsafe(
+            self._write(text.replace("\n", "\r\n").encode("utf-8")),
+            self.loop).result()
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class ThreadLocalStream:
+    """Proxy for :data:`sys.stdin` or :data:`sys.stdout` that routes to the
+    current thread's :class:`SessionStream` if it has one
+
+    This lets the shell's ``print`` and ``input`` calls reach the client of
+    the session running on the current thread.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    def set_stream(self, stream):
+        self._local.stream = stream
+
+    def _stream(self):
+        return getattr(self._local, "stream", None) or self.default
+
+    def readline(self, *args):
+        return self._stream().readline(*args)
+
+    def write(self, text):
+        return self._stream().write(text)
+
+    def flush(self):
+        return self._stream().flush()
+
+    def __getattr__(self, item):
+        if getattr(self._local, "stream", None) is not None:
+            raise AttributeError(item)
+        return getattr(self.default, item)
+
+
+class SessionLogHandler(logging.Handler):
+    """Logging handler sending the log records emitted by a session's
+    thread to the session's client"""
+
+    def __init__(self, stream: SessionStream, level=logging.WARNING):
+        super().__init__(level)
+        self.stream = stream
+        self.thread_id = threading.get_ident()
+        self.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+
+    def filter(self, record):
+        return record.thread == self.thread_id
+
+    def emit(self, record):
+        self.stream.write(self.format(record) + "\n")
+
+
+class SessionShell(MiniProjectShell):
+    """:class:`.shell.MiniProjectShell` for a networked client session"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # do not setup readline completion on the server's terminal
+        self.completekey = None
+
+    @staticmethod
+    def read_password(prompt: str) -> str:
+        # the client's terminal echo cannot be disabled from here
+        return input(prompt)
+
+    def onecmd(self, line):
+        try:
+            return super().onecmd(line)
+        except Exception:  # pylint: disable=broad-except
+            __log__.exception("unhandled error in command: {}".format(line))
+            if self.database.in_transaction:
+                self.database.rollback()
+            return False
+
+    def do_exit(self, arg):
+        """Logout (if needed) and end the mini-project-1 session"""
+        if self.login_session:
+            self.logout()
+        __log__.info("exiting mini-project-1 session")
+        return True
+
+    def do_EOF(self, arg):
+        """End the mini-project-1 session when the client disconnects"""
+        return self.do_exit(arg)
+
+
+class ShellServer:
+    """asyncio TCP server running a :class:`SessionShell` per client"""
+
+    def __init__(self, database_path: str, max_sessions: int = 32,
+                 profile: str = DEFAULT_PRAGMA_PROFILE,
+                 busy_timeout: int = DEFAULT_BUSY_TIMEOUT,
+                 slow_query_threshold: Optional[float] = None,
+                 large_table_rows: int = DEFAULT_LARGE_TABLE_ROWS,
+                 idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT):
+        """Initialize a shell server
+
+        :param slow_query_threshold: if set, log the statements of the
+        sessions taking longer than this many seconds, see
+        :class:`.slow_query.SlowQueryLog`
+        :param idle_timeout: seconds a session may wait on its client
+        before it is ended, see :class:`SessionStream`
+        """
+        self.pool = ConnectionPool(database_path, profile, busy_timeout)
+        self.max_sessions = max_sessions
+        self.slow_query_threshold = slow_query_threshold
+        self.large_table_rows = large_table_rows
+        self.idle_timeout = idle_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_sessions)
+        self.stdin = ThreadLocalStream(sys.stdin)
+        self.stdout = ThreadLocalStream(sys.stdout)
+        self._clients = {}
+
+    def run_session(self, stream: SessionStream):
+        """Run a shell session for a client on the current worker thread"""
+        self.stdin.set_stream(stream)
+        self.stdout.set_stream(stream)
+        log_handler = SessionLogHandler(stream)
+        getLogger().addHandler(log_handler)
+        database = self.pool.connection()
+        shell = SessionShell(database)
+        if self.slow_query_threshold is not None:
+            shell.stats.statement_listeners.append(SlowQueryLog(
+                database, self.slow_query_threshold, self.large_table_rows))
+        try:
+            shell.cmdloop()
+        except EOFError:
+            pass
+        finally:
+            getLogger().removeHandler(log_handler)
+            if database.in_transaction:
+                database.rollback()
+            self.stdin.set_stream(None)
+            self.stdout.set_stream(None)
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter):
+        """Run a session for a newly connected client"""
+        peer = writer.get_extra_info("peername")
+        __log__.info("client connected: {}".format(peer))
+        loop = asyncio.get_event_loop()
+        session = loop.run_in_executor(
+            self.executor, self.run_session,
+            SessionStream(reader, writer, loop, self.idle_timeout))
+        self._clients[writer] = session
+        try:
+            await session
+        except Exception:  # pylint: disable=broad-except
+            __log__.exception("session failed for client: {}".format(peer))
+        finally:
+            del self._clients[writer]
+            writer.close()
+            __log__.info("client disconnected: {}".format(peer))
+
+    async def close_sessions(self):
+        """Disconnect all the clients and wait for their sessions to end"""
+        sessions = list(self._clients.values())
+        for writer in list(self._clients):
+            writer.close()
+        if sessions:
+            await asyncio.wait(sessions)
+
+    def start(self, loop: asyncio.AbstractEventLoop, host: str, port: int):
+        """Start listening for clients on the given event loop
+
+        :return: the started :class:`asyncio.AbstractServer`
+        """
+        sys.stdin = self.stdin
+        sys.stdout = self.stdout
+        server = loop.run_until_complete(
+            asyncio.start_server(self.handle_client, host, port))
+        __log__.info("mini-project-1 shell server listening on: {}".format(
+            ", ".join(str(sock.getsockname()) for sock in server.sockets)))
+        return server
+
+    def close(self):
+        """Release the pooled connections
+
+        Should be called after :meth:`close_sessions`.
+        """
+        self.executor.shutdown()
+        self.pool.close()
+        sys.stdin = self.stdin.default
+        sys.stdout = self.stdout.default
+
+
+def serve(database_path: str, host: str, port: int,
+          max_sessions: int = 32, profile: str = DEFAULT_PRAGMA_PROFILE,
+          busy_timeout: int = DEFAULT_BUSY_TIMEOUT,
+          slow_query_threshold: Optional[float] = None,
+          large_table_rows: int = DEFAULT_LARGE_TABLE_ROWS,
+          idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT) -> int:
+    """Run a mini-project-1 shell server until interrupted"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    shell_server = ShellServer(database_path, max_sessions, profile,
+                               busy_timeout, slow_query_threshold,
+                               large_table_rows, idle_timeout)
+    server = shell_server.start(loop, host, port)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        __log__.info("stopping mini-project-1 shell server")
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.run_until_complete(shell_server.close_sessions())
+        shell_server.close()
+        loop.close()
+    return 0
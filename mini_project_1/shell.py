@@ -1,37 +1,30 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-"""command shell for mini-project-1"""
+"""command shell for mini-project-1
+
+The modules implementing the commands are only imported the first time
+their command is used, thus starting the shell stays fast.
+"""
 
 import cmd
 import sqlite3
+from contextlib import ExitStack, contextmanager
 from getpass import getpass
 from logging import getLogger
+from typing import Iterable, List
 
-import pendulum
-
-from mini_project_1.book_member import get_book_member_parser, book_member
-from mini_project_1.cancel_booking import get_cancel_booking_parser
+from mini_project_1.archive import attach_existing_archive
 from mini_project_1.common import ShellArgumentException, \
     MINI_PROJECT_DATE_FMT, get_location_id, ValueNotFoundException, \
-    get_selection, send_message, check_valid_email, check_valid_lcode
-from mini_project_1.delete_request import get_delete_request_parser
-from mini_project_1.list_bookings import get_list_bookings_parser
-from mini_project_1.list_requests import get_list_ride_requests_parser
+    get_selection, send_message, check_valid_email, check_valid_lcode, \
+    Paginator
+from mini_project_1.locations import LocationIndex
 from mini_project_1.loginsession import LoginSession
-from mini_project_1.logout import get_logout_parser
-from mini_project_1.register import valid_password, \
-    register_member, valid_name, valid_phone, valid_email
-from mini_project_1.offer_ride import get_offer_ride_parser, \
-    check_valid_cno, offer_ride
-from mini_project_1.post_request import get_post_request_parser, \
-    valid_location_code
-from mini_project_1.search_requests import \
-    get_search_requests_city_parser, \
-    get_search_requests_lcode_parser, print_5_and_prompt
-from mini_project_1.search_rides import get_search_for_ride_parser
-from mini_project_1.select_request import get_select_request_parser
-from mini_project_1.show_inbox import get_show_inbox_parser
+from mini_project_1.metrics import command_metrics, count_rows
+from mini_project_1.outbox import MessageOutbox
+from mini_project_1.parsers import get_parser
+from mini_project_1.stats import ShellStats
 
 __log__ = getLogger(__name__)
 
@@ -43,7 +36,7 @@ def logged_in(f):
         if args[0].login_session:
             return f(*args)
         else:
-            __log__.error("you must be logged in to use this function")
+            args[0].command_error("you must be logged in to use this function")
     return wrapper
 
 
@@ -64,6 +57,53 @@ class MiniProjectShell(cmd.Cmd):
         super().__init__()
         self.database = database
         self.register_start = register_start
+        self.stats = ShellStats()
+        self.database = self.stats.attach(self)
+        #: messages sent by the commands, delivered at the latest once the
+        #: command is done (see :meth:`deliver_messages`)
+        self.outbox = MessageOutbox(self.database)
+        #: :class:`.profiler.CommandProfiler` of the shell's commands
+        self.profiler = None
+        #: context managers (given the command's name) to run each command
+        #: within, e.g. :meth:`.profiler.CommandProfiler.command`
+        self.command_hooks = [self.stats.command, command_metrics,
+                              self.deliver_messages]
+        self.stats.statement_listeners.append(count_rows)
+        self.locations = LocationIndex(self.database)
+        #: whether the last command failed, see :meth:`command_error`
+        self.command_failed = False
+        self.command_errors: List[str] = []
+        # attached up front, as ATTACH is not allowed within the
+        # transactions batches run their commands in
+        attach_existing_archive(self.database)
+
+    def command_error(self, message: str, exc_info: bool = False):
+        """Report that the current command failed
+
+        The failure is recorded on the shell (see ``command_failed``), thus
+        it is known regardless of the logging configuration.
+        """
+        self.command_failed = True
+        self.command_errors.append(message)
+        __log__.error(message, exc_info=exc_info)
+
+    @contextmanager
+    def deliver_messages(self, name: str):
+        """Command hook flushing the outbox at the end of a command, the
+        messages that could not be delivered fail the command"""
+        try:
+            yield
+        finally:
+            try:
+                failed = self.outbox.flush()
+            except sqlite3.Error as e:
+                self.command_error(
+                    "could not deliver {} messages yet, they stay queued: "
+                    "{}".format(len(self.outbox), e))
+            else:
+                for message in failed:
+                    self.command_error(
+                        "could not deliver message to {}".format(message[0]))
 
     def cmdloop(self, intro=None):
         # start a login command at start.
@@ -73,6 +113,17 @@ class MiniProjectShell(cmd.Cmd):
         self.do_show_inbox(None)
         super().cmdloop()
 
+    def onecmd(self, line):
+        self.command_failed = False
+        self.command_errors = []
+        name = self.parseline(line)[0]
+        if not (name and hasattr(self, "do_" + name)):
+            return super().onecmd(line)
+        with ExitStack() as stack:
+            for hook in self.command_hooks:
+                stack.enter_context(hook(name))
+            return super().onecmd(line)
+
     # ===============================
     # Shell command definitions
     # ===============================
@@ -80,11 +131,11 @@ class MiniProjectShell(cmd.Cmd):
     def do_login(self, arg):
         """Login to the mini-project-1 database"""
         if self.login_session:
-            __log__.error("already logged in")
+            self.command_error("already logged in")
         else:
             print("Login to mini-project-1 database:")
-            username = str(input("username: "))
-            password = getpass("password: ")
+            username = str(self.ask("username: "))
+            password = self.read_password("password: ")
             self.login(username, password)
             if not self.login_session:
                 self.do_login(None)
@@ -92,17 +143,17 @@ class MiniProjectShell(cmd.Cmd):
     @logged_in
     def do_logout(self, arg):
         """Logout from the mini-project-1 database"""
-        parser = get_logout_parser()
+        parser = get_parser("logout")
         try:
             parser.parse_args(arg.split())
             self.logout()
         except ShellArgumentException:
-            __log__.exception("invalid logout arguement")
+            self.command_error("invalid logout arguement", exc_info=True)
 
     @staticmethod
     def help_logout():
         """Print the argparser help message for logout"""
-        get_logout_parser().print_help()
+        get_parser("logout").print_help()
 
     def do_exit(self, arg):
         """Logout (if needed) and exit out of the mini-project-1 shell"""
@@ -114,58 +165,43 @@ class MiniProjectShell(cmd.Cmd):
 
     @logged_in
     def do_show_inbox(self, arg):
-        """View all unseen (seen="n") inbox messages related to the
+        """View the unseen (seen="n") inbox messages related to the
         currently logged in email
 
-        Set all viewed messages as seen="y"
+        Set the viewed messages as seen="y"
         """
-        parser = get_show_inbox_parser()
+        from mini_project_1.show_inbox import show_inbox
+        parser = get_parser("show_inbox")
         try:
-            # view all messages within your inbox
-            inbox_items = self.database.execute(
-                "SELECT DISTINCT email, msgTimestamp, sender, content, rno, seen "
-                "FROM inbox "
-                "WHERE inbox.email = ? AND inbox.seen = 'n'",
-                (self.login_session.get_email(),)
-            ).fetchall()
-
-            if inbox_items:
-                print("Your inbox:")
-                for inbox_item in inbox_items:
-                    print(inbox_item)
-
-                # set all messages within your inbox as seen="y"
-                self.database.execute(
-                    "UPDATE inbox "
-                    "SET seen='y' " 
-                    "WHERE inbox.email = ?",
-                    (self.login_session.get_email(),)
-                )
-                self.database.commit()
-            else:
+            args = parser.parse_args((arg or "").split())
+            if not show_inbox(self.database, self.login_session.get_email(),
+                              args.limit):
                 print("No new messages")
         except ShellArgumentException:
-            __log__.exception("invalid show_inbox argument")
+            self.command_error("invalid show_inbox argument", exc_info=True)
 
     @staticmethod
     def help_show_inbox():
         """Print the argparser help message for show_inbox"""
-        get_show_inbox_parser().print_help()
+        get_parser("show_inbox").print_help()
 
     @logged_in
     def do_offer_ride(self, arg):
         """Offer a ride"""
+        from mini_project_1.offer_ride import check_valid_cno, offer_ride
         dbcursor = self.database.cursor()
-        parser = get_offer_ride_parser()
+        parser = get_parser("offer_ride")
         try:
             args = parser.parse_args(arg.split())
             try:
                 source = \
                     get_location_id(dbcursor, args.src,
-                                    "Choose a source: ")
+                                    "Choose a source: ", self.select,
+                                    self.locations)
                 destination = \
                     get_location_id(dbcursor, args.dst,
-                                    "Choose a destination: ")
+                                    "Choose a destination: ", self.select,
+                                    self.locations)
             except ValueNotFoundException as e:
                 print(e)
                 raise ShellArgumentException
@@ -173,7 +209,8 @@ class MiniProjectShell(cmd.Cmd):
             enroute = set()
             for place in args.enroute:
                 try:
-                    enroute.add(get_location_id(dbcursor, place, "Which place did you want to add? "))
+                    enroute.add(get_location_id(dbcursor, place, "Which place did you want to add? ",
+                                                self.select, self.locations))
                 except ValueNotFoundException as e:
                     print(e)
 
@@ -186,57 +223,36 @@ class MiniProjectShell(cmd.Cmd):
             else:
                 print("Could not add ride")
         except ShellArgumentException:
-            __log__.error("invalid offer_ride argument")
+            self.command_error("invalid offer_ride argument")
 
     @staticmethod
     def help_offer_ride():
         """Print the argparser help message for offer_ride"""
-        get_offer_ride_parser().print_help()
+        get_parser("offer_ride").print_help()
 
     @logged_in
     def do_search_rides(self, arg):
         """Search for ride"""
-        dbcursor = self.database.cursor()
-        parser = get_search_for_ride_parser()
+        from mini_project_1.search_rides import iter_search_rides
+        parser = get_parser("search_rides")
         try:
             args = parser.parse_args(arg.split())
-            search_conditions = "(l1.lcode LIKE ? OR l1.city LIKE ? OR l1.prov LIKE ? OR l1.address LIKE ? OR " + \
-                "l2.lcode LIKE ? OR l2.city LIKE ? OR l2.prov LIKE ? OR l2.address LIKE ? OR " + \
-                "l3.lcode LIKE ? OR l3.city LIKE ? OR l3.prov LIKE ? OR l3.address LIKE ?)"
-
-            # setup query conditions for one term
-            search_string = search_conditions
-            search_vars = (args.term1, '%'+args.term1+'%', '%'+args.term1+'%', '%'+args.term1+'%',
-                           args.term1, '%'+args.term1+'%', '%'+args.term1+'%', '%'+args.term1+'%',
-                           args.term1, '%'+args.term1+'%', '%'+args.term1+'%', '%'+args.term1+'%')
-            # add query conditions for the second term if supplied
-            if args.term2:
-                search_string = search_string + " AND " + search_conditions
-                more_search_vars = (args.term2, '%'+args.term2+'%', '%'+args.term2+'%', '%'+args.term2+'%',
-                                    args.term2, '%'+args.term2+'%', '%'+args.term2+'%', '%'+args.term2+'%',
-                                    args.term2, '%'+args.term2+'%', '%'+args.term2+'%', '%'+args.term2+'%')
-                search_vars = search_vars + more_search_vars
-
-            # add query conditions for the third term if supplied
-            if args.term3:
-                search_string = search_string + " AND " + search_conditions
-                more_search_vars = (args.term3, '%'+args.term3+'%', '%'+args.term3+'%', '%'+args.term3+'%',
-                                    args.term3, '%'+args.term3+'%', '%'+args.term3+'%', '%'+args.term3+'%',
-                                    args.term3, '%'+args.term3+'%', '%'+args.term3+'%', '%'+args.term3+'%')
-                search_vars = search_vars + more_search_vars
-
-            query = "SELECT r.* " + \
-                    "FROM locations l1, locations l2, rides r " + \
-                    "LEFT JOIN enroute en on en.rno = r.rno " + \
-                    "LEFT JOIN locations l3 on en.lcode = l3.lcode " + \
-                    "WHERE l1.lcode = r.src AND l2.lcode = r.dst AND "+search_string+";"
-
-            dbcursor.execute(query, search_vars)
-            results = dbcursor.fetchall()
+            include_archive = self.include_archive(args)
+            results = Paginator(iter_search_rides(
+                self.database, [args.term1, args.term2, args.term3],
+                date_from=args.date_from and
+                args.date_from.strftime(MINI_PROJECT_DATE_FMT),
+                date_to=args.date_to and
+                args.date_to.strftime(MINI_PROJECT_DATE_FMT),
+                min_seats=args.min_seats,
+                include_archive=include_archive))
 
             # display matching
-            if len(results):
-                selection = get_selection(results)
+            if results and include_archive:
+                # archived rides can no longer be booked, only list them
+                self.page(results)
+            elif results:
+                selection = self.select(results)
                 # message the posting ride member
                 if selection:
                     send_message(
@@ -244,111 +260,131 @@ class MiniProjectShell(cmd.Cmd):
                         selection[7],
                         self.login_session.get_email(),
                         "I want to book seats on this ride",
-                        selection[0]
+                        selection[0],
+                        outbox=self.outbox, wait=False
                     )
-                    print("Message sent to driver")
+                    print("Message to driver queued")
             else:
                 print("No results")
         except ShellArgumentException:
-            __log__.error("invalid search_rides argument")
+            self.command_error("invalid search_rides argument")
 
     @staticmethod
     def help_search_rides():
         """Print the argparser help message for search_rides"""
-        get_search_for_ride_parser().print_help()
+        get_parser("search_rides").print_help()
 
     @logged_in
     def do_list_bookings(self, arg):
         """List all the bookings that the user offers"""
-        parser = get_list_bookings_parser()
+        from mini_project_1.archive import with_archive
+        parser = get_parser("list_bookings")
         try:
-            parser.parse_args(arg.split())
+            args = parser.parse_args(arg.split())
+            bookings, rides = "bookings", "rides"
+            if self.include_archive(args):
+                bookings, rides = with_archive("bookings"), \
+                    with_archive("rides")
             cur = self.database.cursor()
             cur.execute(
                 'SELECT DISTINCT bookings.* '
-                'FROM bookings, rides '
+                'FROM {} bookings, {} rides '
                 'WHERE rides.driver = ? '
-                'AND rides.rno = bookings.rno;',
+                'AND rides.rno = bookings.rno;'.format(bookings, rides),
                 (self.login_session.get_email(),)
             )
             rows = cur.fetchall()
             for row in rows:
                 print(row)
         except ShellArgumentException:
-            __log__.exception("invalid list_bookings argument")
+            self.command_error("invalid list_bookings argument", exc_info=True)
 
     @staticmethod
     def help_list_bookings():
         """Print the argparser help message for list_bookings"""
-        get_list_bookings_parser().print_help()
+        get_parser("list_bookings").print_help()
 
     @logged_in
     def do_book_member(self, arg):
         """Book other members on a ride"""
-        parser = get_book_member_parser()
+        from mini_project_1.book_member import book_member, \
+            OverbookingException
+        parser = get_parser("book_member")
 
         try:
             args = parser.parse_args(arg.split())
             # ensure valid inputs
-            if not check_valid_lcode(self.database, args.pickup):
+            if not check_valid_lcode(self.database, args.pickup,
+                                     self.locations):
                 print("Pickup locde not valid")
                 raise ShellArgumentException
-            if not check_valid_lcode(self.database, args.dropoff):
+            if not check_valid_lcode(self.database, args.dropoff,
+                                     self.locations):
                 print("Dropoff locde not valid")
                 raise ShellArgumentException
             if not check_valid_email(self.database, args.email):
                 print("Email not valid")
                 raise ShellArgumentException
 
-            # list my rides
             cur = self.database.cursor()
-            cur.execute(
-                'SELECT * '
-                'FROM rides '
-                'WHERE rides.driver = ?;',
-                (self.login_session.get_email(),)
-            )
-            rows = cur.fetchall()
-            ride = get_selection(rows, "Enter the row number for the ride: ")
-            rno = ride[0]
-            seats_available = ride[3]
-
-            # check how many seats booked
-            cur.execute(
-                'SELECT sum(seats) '
-                'FROM bookings '
-                'WHERE bookings.rno = ?;',
-                (rno,)
-            )
-            seats_taken = cur.fetchone()
-            if not seats_taken:
-                seats_taken = 0
+            if args.rno is not None:
+                # the ride to book on was given
+                cur.execute(
+                    'SELECT * '
+                    'FROM rides '
+                    'WHERE rides.rno = ? AND rides.driver = ?;',
+                    (args.rno, self.login_session.get_email())
+                )
+                ride = cur.fetchone()
+                if not ride:
+                    print("You don't offer a ride where rno={}".format(
+                        args.rno))
+                    raise ShellArgumentException
             else:
-                seats_taken = seats_taken[0]
+                # list my rides
+                cur.execute(
+                    'SELECT * '
+                    'FROM rides '
+                    'WHERE rides.driver = ?;',
+                    (self.login_session.get_email(),)
+                )
+                ride = self.select(cur, "Enter the row number for the ride: ")
+                if not ride:
+                    return
+            rno = ride[0]
 
             # book seats if available or user accepts overbooking
-            if seats_available < seats_taken + args.seats:
-                if str(input("Warning: ride will be overbooked. Continue: [y] or [n]") == 'y'):
-                    book_member(self.database, rno, args.email, args.seats, args.price, args.pickup, args.dropoff)
-                    send_message(self.database, args.email, self.login_session.get_email(),
-                                 "I have booked you on a ride", rno)
+            try:
+                booked = book_member(
+                    self.database, rno, args.email, args.seats, args.price,
+                    args.pickup, args.dropoff, overbook=args.overbook)
+            except OverbookingException:
+                booked = False
+                if self.confirm("Warning: ride will be overbooked. "
+                                "Continue: [y] or [n]"):
+                    booked = book_member(
+                        self.database, rno, args.email, args.seats,
+                        args.price, args.pickup, args.dropoff)
+            if booked:
+                send_message(self.database, args.email,
+                             self.login_session.get_email(),
+                             "I have booked you on a ride", rno,
+                             outbox=self.outbox, wait=False)
             else:
-                book_member(self.database, rno, args.email, args.seats, args.price, args.pickup, args.dropoff)
-                send_message(self.database, args.email, self.login_session.get_email(),
-                             "I have booked you on a ride", rno)
+                print("Could not add booking")
         except ShellArgumentException:
-            __log__.error("invalid book_member argument")
+            self.command_error("invalid book_member argument")
 
     @staticmethod
     def help_book_member():
         """Print the argparser help message for book_member"""
-        get_search_for_ride_parser().print_help()
+        get_parser("book_member").print_help()
 
     @logged_in
     def do_cancel_booking(self, arg):
         """Cancel a booking"""
         cur = self.database.cursor()
-        parser = get_cancel_booking_parser()
+        parser = get_parser("cancel_booking")
         try:
             args = parser.parse_args(arg.split())
             cur.execute(
@@ -381,47 +417,41 @@ class MiniProjectShell(cmd.Cmd):
 
             self.database.commit()
             print("Successfully deleted:\n{}".format(to_delete))
-            cur.execute(
-                "INSERT INTO inbox VALUES (?, ?, ?, ?, ?, ?);",
-                (to_delete[1], pendulum.now().to_datetime_string(),
-                 self.login_session.get_email(),
-                 "Your booking has been cancelled.",
-                 to_delete[2], "n")
-            )
-            self.database.commit()
-            print("Successfully sent cancellation message to {}."
+            send_message(self.database, to_delete[1],
+                         self.login_session.get_email(),
+                         "Your booking has been cancelled.", to_delete[2],
+                         outbox=self.outbox, wait=False)
+            print("Cancellation message to {} queued."
                   .format(to_delete[1]))
         except ShellArgumentException:
-            __log__.exception("invalid cancel_booking argument")
+            self.command_error("invalid cancel_booking argument", exc_info=True)
 
     @staticmethod
     def help_cancel_booking():
         """Print the argparser help message for cancel_booking"""
-        get_cancel_booking_parser().print_help()
+        get_parser("cancel_booking").print_help()
 
     @logged_in
     def do_post_request(self, arg):
         """Post a ride request"""
-        parser = get_post_request_parser()
+        from mini_project_1.post_request import valid_location_code
+        from mini_project_1.sequences import next_id, REQUESTS
+        parser = get_parser("post_request")
         try:
             args = parser.parse_args(arg.split())
 
-            # generate a new rid
-            max_rid = self.database.execute(
-                "select max(r.rid) from requests r").fetchone()[0]
-            if not max_rid:
-                max_rid = 0
-            rid = 1 + int(max_rid)
-
             # validate the given location codes
-            if not valid_location_code(self.database, args.pickup):
+            if not valid_location_code(self.database, args.pickup,
+                                       self.locations):
                 raise ShellArgumentException(
                     "invalid location code: {}".format(args.pickup))
-            if not valid_location_code(self.database, args.dropoff):
+            if not valid_location_code(self.database, args.dropoff,
+                                       self.locations):
                 raise ShellArgumentException(
                     "invalid location code: {}".format(args.dropoff))
 
-            # create and insert the new ride request
+            # create and insert the new ride request with a new rid
+            rid = next_id(self.database, REQUESTS)
             self.database.execute(
                 "INSERT INTO requests VALUES (?, ?, ?, ?, ?, ?)",
                 (rid, self.login_session.get_email(),
@@ -430,7 +460,7 @@ class MiniProjectShell(cmd.Cmd):
             )
             self.database.commit()
         except ShellArgumentException:
-            __log__.exception("invalid post_ride_request argument")
+            self.command_error("invalid post_ride_request argument", exc_info=True)
         else:
             __log__.info(
                 "successfully posted ride request: "
@@ -445,12 +475,12 @@ class MiniProjectShell(cmd.Cmd):
     @staticmethod
     def help_post_request():
         """Print the argparser help message for post_request"""
-        get_post_request_parser().print_help()
+        get_parser("post_request").print_help()
 
     @logged_in
     def do_list_requests(self, arg):
         """List all the user's ride requests"""
-        parser = get_list_ride_requests_parser()
+        parser = get_parser("list_requests")
         try:
             parser.parse_args(arg.split())
             cur = self.database.cursor()
@@ -464,18 +494,18 @@ class MiniProjectShell(cmd.Cmd):
             for row in rows:
                 print(row)
         except ShellArgumentException:
-            __log__.exception("invalid list_requests argument")
+            self.command_error("invalid list_requests argument", exc_info=True)
 
     @staticmethod
     def help_list_requests():
         """Print the argparser help message for list_requests"""
-        get_list_ride_requests_parser().print_help()
+        get_parser("list_requests").print_help()
 
     @logged_in
     def do_search_requests_lcode(self, arg):
         """Search for a ride request by location number"""
         cur = self.database.cursor()
-        parser = get_search_requests_lcode_parser()
+        parser = get_parser("search_requests_lcode")
         try:
             args = parser.parse_args(arg.split())
             cur.execute(
@@ -484,22 +514,21 @@ class MiniProjectShell(cmd.Cmd):
                 'WHERE pickup like ?',
                 (args.lcode,)
             )
-            rows = cur.fetchall()
-            print_5_and_prompt(rows)
+            self.page(cur)
         except ShellArgumentException:
-            __log__.exception("invalid argument")
+            self.command_error("invalid argument", exc_info=True)
 
     @staticmethod
     def help_search_requests_lcode():
         """Print the argparser help message for searching ride requests by
         location code"""
-        get_search_requests_lcode_parser().print_help()
+        get_parser("search_requests_lcode").print_help()
 
     @logged_in
     def do_search_requests_city(self, arg):
         """Search for a ride quest by city name"""
         cur = self.database.cursor()
-        parser = get_search_requests_city_parser()
+        parser = get_parser("search_requests_city")
         try:
             args = parser.parse_args(arg.split())
             cur.execute(
@@ -509,22 +538,21 @@ class MiniProjectShell(cmd.Cmd):
                 'AND locations.city LIKE ?',
                 (args.city.lower(),)
             )
-            rows = cur.fetchall()
-            print_5_and_prompt(rows)
+            self.page(cur)
         except ShellArgumentException:
-            __log__.exception("invalid argument")
+            self.command_error("invalid argument", exc_info=True)
 
     @staticmethod
     def help_search_requests_city():
         """Print the argparser help message for searching ride requests
         by city name"""
-        get_search_requests_city_parser().print_help()
+        get_parser("search_requests_city").print_help()
 
     @logged_in
     def do_delete_request(self, arg):
         """Delete a ride request"""
         cur = self.database.cursor()
-        parser = get_delete_request_parser()
+        parser = get_parser("delete_request")
         try:
             args = parser.parse_args(arg.split())
             cur.execute(
@@ -552,18 +580,18 @@ class MiniProjectShell(cmd.Cmd):
 
             print("Successfully deleted:\n{}".format(to_delete))
         except ShellArgumentException:
-            __log__.exception("invalid argument")
+            self.command_error("invalid argument", exc_info=True)
 
     @staticmethod
     def help_delete_request():
         """Print the argparser help message for deleting a ride request"""
-        get_delete_request_parser().print_help()
+        get_parser("delete_request").print_help()
 
     @logged_in
-    def do_select_request(self, arg):  # TODO make testable
+    def do_select_request(self, arg):
         """Select a ride request and perform actions"""
         cur = self.database.cursor()
-        parser = get_select_request_parser()
+        parser = get_parser("select_request")
         try:
             args = parser.parse_args(arg.split())
             cur.execute(
@@ -579,70 +607,106 @@ class MiniProjectShell(cmd.Cmd):
                 return
 
             print("You have selected: {}".format(selected))
-            while True:
-                response = \
-                    input("Would you like to message the poster? [y|n]\n")
-                if response == "y":
-                    message = input("Your message: ")
-                    cur.execute(
-                        "SELECT email "
-                        "FROM requests "
-                        "WHERE rid = ?",
-                        (args.rid,)
-                    )
-                    poster = cur.fetchone()[0]
+            if args.message:
+                message = " ".join(args.message)
+            elif self.confirm(
+                    "Would you like to message the poster? [y|n]\n"):
+                message = self.ask("Your message: ")
+            else:
+                return
 
-                    cur.execute(
-                        "INSERT INTO inbox VALUES (?, ?, ?, ?, ?, ?);",
-                        (poster,
-                         pendulum.now().to_datetime_string(),
-                         self.login_session.get_email(),
-                         message,
-                         None,
-                         "n")
-                    )
-                    self.database.commit()
-                    print("Successfully sent message to {}".format(poster))
-                    break
-                elif response == "n":
-                    break
+            cur.execute(
+                "SELECT email "
+                "FROM requests "
+                "WHERE rid = ?",
+                (args.rid,)
+            )
+            poster = cur.fetchone()[0]
+
+            send_message(self.database, poster,
+                         self.login_session.get_email(), message, None,
+                         outbox=self.outbox, wait=False)
+            print("Message to {} queued".format(poster))
         except ShellArgumentException:
-            __log__.error("invalid argument")
+            self.command_error("invalid argument")
 
     @staticmethod
     def help_select_request():
         """Print the argparser help message for selecting a ride request"""
-        get_select_request_parser().print_help()
+        get_parser("select_request").print_help()
+
+    def do_stats(self, arg):
+        """Show the statistics of the commands run within this session"""
+        parser = get_parser("stats")
+        try:
+            args = parser.parse_args(arg.split())
+            self.stats.print_stats()
+            if args.reset:
+                self.stats.reset()
+        except ShellArgumentException:
+            self.command_error("invalid stats argument")
+
+    @staticmethod
+    def help_stats():
+        """Print the argparser help message for stats"""
+        get_parser("stats").print_help()
+
+    def do_profile(self, arg):
+        """Show the top hotspots of the commands profiled within this
+        session"""
+        parser = get_parser("profile")
+        try:
+            args = parser.parse_args(arg.split())
+            if self.profiler is None:
+                print("Profiling is not enabled, start mini-project-1 with "
+                      "--profile DIR to profile the commands")
+                return
+            self.profiler.print_hotspots(args.command, args.limit, args.sort)
+        except ShellArgumentException:
+            self.command_error("invalid profile argument")
+
+    @staticmethod
+    def help_profile():
+        """Print the argparser help message for profile"""
+        get_parser("profile").print_help()
+
+    def enable_profiler(self, profiler):
+        """Profile every command run from now on with the given
+        :class:`.profiler.CommandProfiler`"""
+        self.profiler = profiler
+        self.command_hooks.append(profiler.command)
 
     def do_register(self, arg):
         """Register a new member to the mini-project-1 database"""
+        from mini_project_1.register import valid_password, \
+            register_member, valid_name, valid_phone, valid_email
         # get a valid email
         print("Starting member registration wizard:")
         while True:
-            email_str = input("email: ")
+            email_str = self.ask("email: ")
             if valid_email(self.database, email_str):
                 email_str = valid_email(self.database, email_str)
                 break
 
         # get valid name
         while True:
-            name_str = input("name: ")
+            name_str = self.ask("name: ")
             if valid_name(name_str):
                 break
 
         # get valid phone
         while True:
-            phone_str = input("phone: ")
+            phone_str = self.ask("phone: ")
             if valid_phone(phone_str):
                 phone_str = valid_phone(phone_str)
                 break
 
         # get valid password
         while True:
-            password1 = getpass("password: ")
+            password1 = self.read_password("password: ")
             if not valid_password(password1):
                 continue
-            password2 = getpass("validate password: ")
+            password2 = self.read_password("validate password: ")
             if password1 != password2:
                 print("passwords do not match")
                 continue
@@ -657,6 +721,47 @@ class MiniProjectShell(cmd.Cmd):
     # Shell functionality definitions
     # ===============================
 
+    @staticmethod
+    def read_password(prompt: str) -> str:
+        """Prompt for a password without echoing it"""
+        return getpass(prompt)
+
+    @staticmethod
+    def ask(prompt: str) -> str:
+        """Prompt the user for a line of text"""
+        return input(prompt)
+
+    @staticmethod
+    def confirm(prompt: str) -> bool:
+        """Prompt the user until they answer yes ([y]) or no ([n])"""
+        while True:
+            response = input(prompt)
+            if response in ("y", "n"):
+                return response == "y"
+
+    @staticmethod
+    def select(items: Iterable, prompt: str = "Enter selection number: "):
+        """Have the user select one of the items, see
+        :func:`.common.get_selection`"""
+        return get_selection(items, prompt)
+
+    def include_archive(self, args) -> bool:
+        """Whether a command given ``--include-archive`` can read the
+        archive database, attaching it if needed"""
+        if not args.include_archive:
+            return False
+        if attach_existing_archive(self.database):
+            return True
+        print("No archive database, showing live data only")
+        return False
+
+    @staticmethod
+    def page(rows: Iterable):
+        """Show rows to the user a page at a time, see
+        :func:`.search_requests.print_5_and_prompt`"""
+        from mini_project_1.search_requests import print_5_and_prompt
+        print_5_and_prompt(rows)
+
     @logged_in
     def logout(self):
         """Logout method
@@ -677,7 +782,7 @@ class MiniProjectShell(cmd.Cmd):
         to the newly created :class:`.loginsession.LoginSession`.
         """
         if self.login_session:
-            __log__.error("already logged in as user: {}".format(
+            self.command_error("already logged in as user: {}".format(
                 self.login_session.get_email()))
         else:
             user_hit = self.database.execute(
@@ -6,9 +6,20 @@
 After a login, all unseen messages of the member will be displayed, and the
 status of the messages will be set to seen (i.e, the seen column is set
 to 'y').
+
+Unseen messages are read a page at a time in timestamp order from the
+partial ``inbox_unseen_idx`` index, and only the messages printed are
+marked as seen.
 """
 
-from mini_project_1.common import ShellArgumentParser
+import sqlite3
+from typing import Optional
+
+from mini_project_1.common import ShellArgumentParser, \
+    greater_than_zero_number
+
+#: number of unseen messages read and marked as seen at a time
+INBOX_PAGE_SIZE = 100
 
 
 def get_show_inbox_parser() -> ShellArgumentParser:
@@ -17,5 +28,53 @@ def get_show_inbox_parser() -> ShellArgumentParser:
     parser = ShellArgumentParser(
         prog="show_inbox",
         description="List all the unseen messages in your inbox")
+    parser.add_argument("--limit", type=greater_than_zero_number,
+                        default=None,
+                        help="Only show this many of the oldest unseen "
+                             "messages, the others stay unseen")
 
     return parser
+
+
+def show_inbox(database: sqlite3.Connection, email: str,
+               limit: Optional[int] = None,
+               page_size: int = INBOX_PAGE_SIZE) -> int:
+    """Print the unseen messages of a member in timestamp order and mark
+    them as seen
+
+    :param limit: maximum number of messages to show
+    :return: the number of messages shown
+    """
+    shown = 0
+    after = ""
+    while limit is None or shown < limit:
+        count = page_size if limit is None else min(page_size, limit - shown)
+        messages = database.execute(
+            "SELECT email, msgTimestamp, sender, content, rno, seen "
+            "FROM inbox "
+            "WHERE email = ? AND seen = 'n' AND msgTimestamp > ? "
+            "ORDER BY msgTimestamp "
+            "LIMIT ?",
+            (email, after, count)
+        ).fetchall()
+        if not messages:
+            break
+        if not shown:
+            print("Your inbox:")
+        for message in messages:
+            print(message)
+        # mark only the messages printed as seen
+        timestamps = [message[1] for message in messages]
+        database.execute(
+            "UPDATE inbox "
+            "SET seen = 'y' "
+            "WHERE email = ? AND msgTimestamp IN ({})".format(
+                ", ".join("?" * len(timestamps))),
+            [email] + timestamps
+        )
+        database.commit()
+        shown += len(messages)
+        after = timestamps[-1]
+        if len(messages) < count:
+            break
+    return shown
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Slow query log
+
+Statements taking longer than a threshold are logged, with their bound
+parameters, elapsed time, and ``EXPLAIN QUERY PLAN`` output, to the
+``mini_project_1.slow_query`` logger. Plans containing a full ``SCAN`` of a
+large table are flagged.
+
+A :class:`SlowQueryLog` is a statement listener of a shell's
+:class:`.stats.ShellStats`.
+"""
+
+import re
+import sqlite3
+from logging import getLogger
+from typing import List, Optional, Tuple
+
+__log__ = getLogger(__name__)
+
+#: tables with at least this many rows are large
+DEFAULT_LARGE_TABLE_ROWS = 10000
+
+#: full scans of a table (or an alias of it) within a query plan, scans of
+#: a virtual table (e.g. a full text search) are looked up by its index
+SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?! VIRTUAL TABLE)")
+
+
+class SlowQueryLog:
+    """Statement listener logging statements slower than a threshold"""
+
+    def __init__(self, database: sqlite3.Connection, threshold: float,
+                 large_table_rows: int = DEFAULT_LARGE_TABLE_ROWS):
+        """Initialize a slow query log
+
+        :param database: connection to explain the slow statements with
+        :param threshold: time in seconds a statement must take to be logged
+        :param large_table_rows: number of rows a table must have for its
+        full scans to be flagged
+        """
+        self.database = database
+        self.threshold = threshold
+        self.large_table_rows = large_table_rows
+        self._tables = None
+
+    def __call__(self, statement: str, parameters, elapsed: float,
+                 rows: int):
+        if elapsed < self.threshold:
+            return
+        plan = self.explain(statement, parameters)
+        lines = ["slow query ({:.1f} ms, {} rows): {} parameters: {}".format(
+            elapsed * 1000, rows, " ".join(statement.split()), parameters)]
+        lines.extend("  plan: {}".format(detail) for detail in plan)
+        lines.extend(
+            "  FULL SCAN of large table {} ({} rows)".format(table, rows)
+            for table, rows in self.large_scans(statement, plan))
+        __log__.info("\n".join(lines))
+
+    def explain(self, statement: str, parameters) -> List[str]:
+        """Get the details of a statement's query plan"""
+        if parameters is None:
+            return []
+        try:
+            return [row[3] for row in self.database.execute(
+                "EXPLAIN QUERY PLAN " + statement, parameters)]
+        except sqlite3.Error:
+            # e.g. transaction control statements
+            return []
+
+    def resolve_table(self, statement: str, name: str) -> Optional[str]:
+        """Get the table named, or aliased, by a query plan's scan"""
+        if self._tables is None:
+            self._tables = {row[0].lower() for row in self.database.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if name.lower() in self._tables:
+            return name
+        for m in re.finditer(r"\b(\w+)\s+(?:AS\s+)?{}\b".format(name),
+                             statement, re.IGNORECASE):
+            if m.group(1).lower() in self._tables:
+                return m.group(1)
+        # e.g. a common table expression
+        return None
+
+    def table_rows(self, table: str) -> int:
+        """Estimate the number of rows of a table from its largest rowid"""
+        return self.database.execute(
+            "SELECT MAX(rowid) FROM \"{}\"".format(table)).fetchone()[0] or 0
+
+    def large_scans(self, statement: str,
+                    plan: List[str]) -> List[Tuple[str, int]]:
+        """Get the ``(table, rows)`` of the large tables fully scanned
+        within a statement's query plan"""
+        scans = []
+        for detail in plan:
+            m = SCAN_RE.match(detail)
+            table = m and self.resolve_table(statement, m.group(1))
+            if table:
+                rows = self.table_rows(table)
+                if rows >= self.large_table_rows:
+                    scans.append((table, rows))
+        return scans
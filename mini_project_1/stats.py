@@ -0,0 +1,345 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Command statistics
+
+Every command run within the shell is measured: its wall time is split
+between the time spent within the database and the time spent waiting on
+the user at a prompt, and the number of SQL statements it executed is
+counted (through :meth:`sqlite3.Connection.set_trace_callback`).
+
+The ``stats`` command shows the statistics of the current session.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from logging import getLogger
+from typing import Dict, Optional
+
+from mini_project_1.common import ShellArgumentParser
+
+__log__ = getLogger(__name__)
+
+#: shell hooks that wait on the user
+PROMPT_HOOKS = ("read_password", "ask", "confirm", "select", "page")
+
+
+def get_stats_parser() -> ShellArgumentParser:
+    """Argparser for the :class:`.shell.MiniProjectShell`
+    ``stats`` command"""
+    parser = ShellArgumentParser(
+        prog="stats",
+        description="Show the latency and number of statements of the "
+                    "commands run within this session")
+    parser.add_argument("--reset", action="store_true",
+                        help="Clear the statistics after showing them")
+    return parser
+
+
+class Timer:
+    """Accumulator of the time spent within its context"""
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self._depth = 0
+        self._start = 0.0
+
+    def __enter__(self):
+        # nested contexts (e.g. a cursor's execute within a prompt) are
+        # only counted once
+        if not self._depth:
+            self._start = time.perf_counter()
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if not self._depth:
+            self.elapsed += time.perf_counter() - self._start
+
+
+class TimedCursor:
+    """Proxy of a :class:`sqlite3.Cursor` timing its database calls
+
+    Once a statement is done (all its rows were fetched, another statement
+    is executed, or the cursor is discarded) the ``listener`` is called with
+    the statement, its parameters, the time spent executing it and fetching
+    its rows, and the number of rows fetched.
+    """
+
+    def __init__(self, cursor, timer: Timer, listener=None):
+        self._cursor = cursor
+        self._timer = timer
+        self._listener = listener
+        self._statement = None
+        self._parameters = None
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def __getattr__(self, item):
+        return getattr(self._cursor, item)
+
+    def __iter__(self):
+        return self
+
+    def __del__(self):
+        self._finish()
+
+    def _call(self, method, *args):
+        start = time.perf_counter()
+        try:
+            with self._timer:
+                return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def _start(self, statement: str, parameters):
+        self._finish()
+        self._statement = statement
+        self._parameters = parameters
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        if self._statement is not None and self._listener is not None:
+            self._listener(self._statement, self._parameters, self._elapsed,
+                           self._rows)
+        self._statement = None
+
+    def __next__(self):
+        try:
+            row = self._call(next, self._cursor)
+        except StopIteration:
+            self._finish()
+            raise
+        self._rows += 1
+        return row
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        self._call(self._cursor.execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        self._call(self._cursor.executemany, sql, seq_of_parameters)
+        self._finish()
+        return self
+
+    def executescript(self, sql_script):
+        self._start(sql_script, None)
+        self._call(self._cursor.executescript, sql_script)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._call(self._cursor.fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._call(self._cursor.fetchmany, *args)
+        self._rows += len(rows)
+        if len(rows) < (args[0] if args else self._cursor.arraysize):
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._call(self._cursor.fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+
+class TimedConnection:
+    """Proxy of a :class:`sqlite3.Connection` timing its database calls
+
+    A proxy is used rather than a connection factory so that any
+    connection (e.g. a :class:`.batch.BatchConnection`) can be timed.
+    """
+
+    def __init__(self, connection, timer: Timer, listener=None):
+        object.__setattr__(self, "_connection", connection)
+        object.__setattr__(self, "_timer", timer)
+        object.__setattr__(self, "_listener", listener)
+
+    def __getattr__(self, item):
+        return getattr(self._connection, item)
+
+    def __setattr__(self, key, value):
+        setattr(self._connection, key, value)
+
+    def cursor(self, *args):
+        return TimedCursor(self._connection.cursor(*args), self._timer,
+                           self._listener)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+    def commit(self):
+        with self._timer:
+            self._connection.commit()
+
+    def rollback(self):
+        with self._timer:
+            self._connection.rollback()
+
+    def __enter__(self):
+        self._connection.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._timer:
+            return self._connection.__exit__(*exc_info)
+
+
+class CommandStats:
+    """Accumulated statistics of a shell command"""
+
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0
+        self.max_wall = 0.0
+        self.database = 0.0
+        self.prompt = 0.0
+        self.statements = 0
+
+    def add(self, wall: float, database: float, prompt: float,
+            statements: int):
+        self.count += 1
+        self.wall += wall
+        self.max_wall = max(self.max_wall, wall)
+        self.database += database
+        self.prompt += prompt
+        self.statements += statements
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "wall": self.wall,
+            "mean_wall": self.wall / self.count if self.count else 0.0,
+            "max_wall": self.max_wall,
+            "database": self.database,
+            "prompt": self.prompt,
+            "statements": self.statements,
+        }
+
+
+class ShellStats:
+    """Statistics of the commands run within a shell
+
+    :meth:`attach` instruments a shell, afterwards each command should run
+    within :meth:`command`.
+    """
+
+    def __init__(self):
+        self.commands: Dict[str, CommandStats] = {}
+        self.database_timer = Timer()
+        self.prompt_timer = Timer()
+        self.statements = 0
+        self._counting = True
+        #: functions called with every statement's SQL, parameters, elapsed
+        #: time, and rows fetched, see :class:`TimedCursor`
+        self.statement_listeners = []
+        #: ``(wall, database, prompt, statements)`` of the last command
+        self.last = None
+        self.stats_file: Optional[str] = None
+        self.interval = 60.0
+        self._last_write = time.monotonic()
+
+    def attach(self, shell):
+        """Instrument a shell's database connection and prompt hooks
+
+        :return: the timed connection the shell should use
+        """
+        shell.database.set_trace_callback(self._count_statement)
+        for hook in PROMPT_HOOKS:
+            setattr(shell, hook, self._timed_prompt(getattr(shell, hook)))
+        return TimedConnection(shell.database, self.database_timer,
+                               self._on_statement)
+
+    def _count_statement(self, statement: str):
+        # statements run by triggers are reported as comments
+        if self._counting and not statement.startswith("--"):
+            self.statements += 1
+
+    def _on_statement(self, statement: str, parameters, elapsed: float,
+                      rows: int):
+        # statements run by the listeners are not the command's
+        self._counting = False
+        try:
+            for listener in self.statement_listeners:
+                listener(statement, parameters, elapsed, rows)
+        finally:
+            self._counting = True
+
+    def _timed_prompt(self, hook):
+        def timed(*args, **kwargs):
+            # rows fetched lazily while paging are database time
+            database_start = self.database_timer.elapsed
+            try:
+                with self.prompt_timer:
+                    return hook(*args, **kwargs)
+            finally:
+                self.prompt_timer.elapsed -= \
+                    self.database_timer.elapsed - database_start
+        return timed
+
+    @contextmanager
+    def command(self, name: str):
+        """Context manager recording the statistics of a command"""
+        database_start = self.database_timer.elapsed
+        prompt_start = self.prompt_timer.elapsed
+        statements_start = self.statements
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.last = (time.perf_counter() - start,
+                         self.database_timer.elapsed - database_start,
+                         self.prompt_timer.elapsed - prompt_start,
+                         self.statements - statements_start)
+            self.commands.setdefault(name, CommandStats()).add(*self.last)
+            if self.stats_file and \
+                    time.monotonic() - self._last_write >= self.interval:
+                self.write()
+
+    def to_dict(self) -> dict:
+        return {name: stats.to_dict()
+                for name, stats in sorted(self.commands.items())}
+
+    def write(self):
+        """Write the statistics to the ``stats_file`` as JSON"""
+        self._last_write = time.monotonic()
+        try:
+            with open(self.stats_file, "w") as stats_file:
+                json.dump({"time": time.time(), "commands": self.to_dict()},
+                          stats_file, indent=2)
+        except OSError:
+            __log__.exception("failed to write command statistics to: {}"
+                              "".format(self.stats_file))
+
+    def reset(self):
+        self.commands = {}
+
+    def print_stats(self):
+        print("{:<24} {:>6} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+            "command", "count", "mean (ms)", "max (ms)", "db (ms)",
+            "prompt (ms)", "statements"))
+        for name, stats in sorted(self.commands.items()):
+            print("{:<24} {:>6} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} "
+                  "{:>10}".format(name, stats.count,
+                                  1000 * stats.wall / stats.count,
+                                  1000 * stats.max_wall,
+                                  1000 * stats.database,
+                                  1000 * stats.prompt, stats.statements))
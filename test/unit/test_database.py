@@ -3,18 +3,33 @@
 
 """pytests interacting with databases for mini-project-1"""
 
+import json
+import logging
 import os
 import sqlite3
 import pytest
 from mock import mock
 
 import mini_project_1
-from mini_project_1.book_member import book_member
-from mini_project_1.common import send_message
+from mini_project_1.book_member import book_member, OverbookingException
+from mini_project_1.common import send_message, get_selection, Paginator, \
+    timestamp, immediate_transaction
+from mini_project_1.connection import connect, PRAGMA_PROFILES
+from mini_project_1.locations import LocationIndex
 from mini_project_1.loginsession import LoginSession
+from mini_project_1.migrations import migrate, get_migrations, \
+    get_schema_version, MigrationException
 from mini_project_1.offer_ride import offer_ride
+from mini_project_1.outbox import MessageOutbox
 from mini_project_1.post_request import valid_location_code
+from mini_project_1.search_requests import print_5_and_prompt
+from mini_project_1.search_rides import search_rides, iter_search_rides, \
+    ride_key, get_search_for_ride_parser
+from mini_project_1.sequences import allocate_ids, next_id, RIDES, \
+    BOOKINGS, REQUESTS
 from mini_project_1.shell import MiniProjectShell
+from mini_project_1.show_inbox import show_inbox
+from mini_project_1.slow_query import SlowQueryLog
 from mini_project_1.register import valid_email, valid_password, valid_name, \
     valid_phone, register_member
 from unittest import TestCase
@@ -30,7 +45,7 @@ DATABASE_DATA_CREATE = os.path.join(DATABASE_DIR, "create_data.sql")
 
 def create_test_db(filename: str):
     """Create a test database"""
-    database = sqlite3.connect(filename)
+    database = connect(filename)
     cursor = database.cursor()
     # Create the tables
     cursor.executescript(open(DATABASE_TABLE_CREATE, "r").read())
@@ -38,6 +53,8 @@ def create_test_db(filename: str):
     cursor.executescript(open(DATABASE_DATA_CREATE, "r").read())
     # Save (commit) the changes
     database.commit()
+    # Apply the schema migrations
+    migrate(database)
 
 
 @pytest.fixture(scope="session")
@@ -48,9 +65,58 @@ def mock_db(tmpdir_factory):
     return filename
 
 
+def test_migrate(tmpdir):
+    """Test upgrading a database created without migrations in place"""
+    filename = str(tmpdir.join("unmigrated.db"))
+    database = connect(filename)
+    database.executescript(open(DATABASE_TABLE_CREATE, "r").read())
+    database.executescript(open(DATABASE_DATA_CREATE, "r").read())
+    database.commit()
+    assert get_schema_version(database) == 0
+
+    migrate(database)
+    latest = get_migrations()[-1][0]
+    assert get_schema_version(database) == latest
+    indexes = {row[0] for row in database.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"rides_driver_idx", "bookings_rno_idx", "requests_email_idx",
+            "requests_pickup_idx", "inbox_unseen_idx"} <= indexes
+    assert "inbox_email_seen_idx" not in indexes
+
+    # migrating an up to date database is a no-op
+    migrate(database)
+    assert get_schema_version(database) == latest
+
+
+def test_migrate_newer_database(tmpdir):
+    database = connect(str(tmpdir.join("newer.db")))
+    database.execute("PRAGMA user_version = 9999")
+    with pytest.raises(MigrationException):
+        migrate(database)
+
+
+def test_migrate_without_trigram(tmpdir, monkeypatch):
+    monkeypatch.setattr("mini_project_1.migrations.trigram_supported",
+                        lambda: False)
+    database = connect(str(tmpdir.join("old.db")))
+    with pytest.raises(MigrationException):
+        migrate(database)
+    assert get_schema_version(database) == 0
+
+
+@pytest.mark.parametrize("profile", sorted(PRAGMA_PROFILES))
+def test_connect(tmpdir, profile):
+    database = connect(str(tmpdir.join("profile.db")), profile,
+                       busy_timeout=1234)
+    assert database.execute("PRAGMA journal_mode").fetchone()[0] == \
+        PRAGMA_PROFILES[profile]["journal_mode"].lower()
+    assert database.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    assert database.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+
 def test_example(mock_db):
     """Test example for interacting with data mocks"""
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     print(database.execute("""SELECT name FROM members""").fetchall())
 
 ###############################
@@ -59,7 +125,7 @@ def test_example(mock_db):
 
 
 def test_login(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
     assert not shell.login_session
     shell.login("bob@123.ca", "foo")
@@ -70,7 +136,7 @@ def test_login(mock_db):
 
 
 def test_logout(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
     assert not shell.login_session
     shell.login("bob@123.ca", "foo")
@@ -81,7 +147,7 @@ def test_logout(mock_db):
 
 def test_register(mock_db):
     """"""
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     dbcursor = database.cursor()
     shell = MiniProjectShell(database)
     testcases = list()
@@ -103,7 +169,7 @@ def test_register(mock_db):
 
 def test_delete_request(mock_db):
     """Tests delete request"""
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
     shell.login("bob@123.ca", "foo")
 
@@ -124,13 +190,13 @@ def test_delete_request(mock_db):
 
 
 # def test_list_requests(mock_db):
-#     database = sqlite3.connect(mock_db)
+#     database = connect(mock_db)
 #     shell = MiniProjectShell(database)
 #     shell.login("bob@123.ca", "foo")
 
 
 def test_post_request(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
     shell.login("bob@123.ca", "foo")
     assert not database.cursor().execute("SELECT DISTINCT * FROM requests "
@@ -141,7 +207,7 @@ def test_post_request(mock_db):
 
 
 def test_cancel_booking(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
     shell.login("bob@123.ca", "foo")
     assert database.cursor().execute("SELECT DISTINCT * FROM bookings "
@@ -152,7 +218,7 @@ def test_cancel_booking(mock_db):
 
 
 def test_book_member(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
     shell.login("bob@123.ca", "foo")
     assert not database.cursor().execute("SELECT DISTINCT * FROM bookings "
@@ -164,20 +230,241 @@ def test_book_member(mock_db):
                                      "WHERE email like 'jane_doe@abc.ca'").fetchone()
 
 
+def test_book_member_seats_booked(mock_db):
+    """Test that a ride's seats_booked follows its bookings and that
+    booking without overbooking is refused for full rides"""
+    database = connect(mock_db)
+
+    def seats_booked(rno):
+        return database.execute("SELECT seats_booked FROM rides "
+                                "WHERE rno = ?", (rno,)).fetchone()[0]
+
+    # ride 41 has 2 seats with 1 booked
+    assert seats_booked(41) == 1
+    assert book_member(database, 41, 'kd@lang.ca', 1, 10, 'cntr1', 'sk1',
+                       overbook=False)
+    assert seats_booked(41) == 2
+    bookings = database.execute("SELECT COUNT(*) FROM bookings").fetchone()
+    with pytest.raises(OverbookingException):
+        book_member(database, 41, 'kd@lang.ca', 1, 10, 'cntr1', 'sk1',
+                    overbook=False)
+    assert bookings == \
+        database.execute("SELECT COUNT(*) FROM bookings").fetchone()
+    assert not database.in_transaction
+    assert not book_member(database, 9999, 'kd@lang.ca', 1, 10,
+                           'cntr1', 'sk1')
+
+    database.execute("DELETE FROM bookings WHERE rno = 41 AND "
+                     "email = 'kd@lang.ca'")
+    database.commit()
+    assert seats_booked(41) == 1
+    # bookings of unknown members violate the bookings' foreign key
+    assert not book_member(database, 41, 'nobody@nowhere.ca', 1, 10,
+                           'cntr1', 'sk1')
+    assert not database.in_transaction
+
+
+def test_immediate_transaction_joined(tmpdir):
+    filename = str(tmpdir.join("immediate.db"))
+    create_test_db(filename)
+    database = connect(filename)
+    other = connect(filename, busy_timeout=10)
+    database.execute("BEGIN")
+    database.execute("UPDATE rides SET price = 1 WHERE rno = 41")
+    with pytest.raises(KeyError):
+        with immediate_transaction(database):
+            database.execute("UPDATE rides SET price = 2 WHERE rno = 42")
+            raise KeyError
+    # only the block's changes are rolled back
+    assert database.execute("SELECT price FROM rides "
+                            "WHERE rno = 41").fetchone() == (1,)
+    assert database.execute("SELECT price FROM rides "
+                            "WHERE rno = 42").fetchone() != (2,)
+    database.rollback()
+
+    # the joined transaction takes the write lock
+    database.execute("BEGIN")
+    database.execute("SELECT * FROM rides").fetchall()
+    with immediate_transaction(database):
+        with pytest.raises(sqlite3.OperationalError):
+            other.execute("BEGIN IMMEDIATE")
+    database.rollback()
+
+
 # def test_list_bookings(mock_db): TODO
-#     database = sqlite3.connect(mock_db)
+#     database = connect(mock_db)
 #     shell = MiniProjectShell(database)
 #     shell.login("bob@123.ca", "foo")
 
 
-# def test_search_rides(mock_db): TODO
-#     database = sqlite3.connect(mock_db)
-#     shell = MiniProjectShell(database)
-#     shell.login("bob@123.ca", "foo")
+def test_search_rides(mock_db):
+    database = connect(mock_db)
+    # match by source, destination, and enroute location
+    rnos = {ride[0] for ride in search_rides(database, ["Regina"])}
+    assert {12, 16, 41} <= rnos
+    # match by location code
+    rnos = {ride[0] for ride in search_rides(database, ["sk1"])}
+    assert {12, 16, 41} <= rnos
+    # all keywords must match
+    rnos = {ride[0] for ride in search_rides(database, ["sk1", "van", None])}
+    assert rnos == {12}
+    # short keywords fallback to a substring scan
+    rnos = {ride[0] for ride in search_rides(database, ["sk"])}
+    assert {12, 13, 16, 17, 41} <= rnos
+    assert not search_rides(database, ["nowhere"])
+
+
+def test_search_rides_order(mock_db):
+    database = connect(mock_db)
+    rides = search_rides(database, ["sk"])
+    # each ride once, ordered by date and price
+    assert len({ride[0] for ride in rides}) == len(rides)
+    assert rides == sorted(rides, key=ride_key)
+    # the keyset paginated pages make up the same rides
+    assert list(iter_search_rides(database, ["sk"], page_size=2)) == rides
+    assert not list(iter_search_rides(database, ["nowhere"]))
+    # rides without a date or price are not lost past the first page
+    database.executemany(
+        "UPDATE rides SET price = NULL, rdate = ? WHERE rno = ?",
+        [(rides[1][2], ride[0]) for ride in rides[1:4]] +
+        [(None, ride[0]) for ride in rides[4:6]])
+    rides = search_rides(database, ["sk"])
+    assert rides[0][2] is None and any(ride[1] is None for ride in rides)
+    assert list(iter_search_rides(database, ["sk"], page_size=2)) == rides
+    database.rollback()
+
+
+def test_search_rides_filters(mock_db):
+    database = connect(mock_db)
+    rides = search_rides(database, ["sk"])
+    dates = sorted(ride[2] for ride in rides)
+    date_from, date_to = dates[1], dates[-2]
+    assert search_rides(database, ["sk"], date_from=date_from,
+                        date_to=date_to) == \
+        [ride for ride in rides if date_from <= ride[2] <= date_to]
+    assert list(iter_search_rides(database, ["sk"], page_size=2,
+                                  date_from=date_from)) == \
+        [ride for ride in rides if date_from <= ride[2]]
+    assert search_rides(database, ["sk"], min_seats=3) == \
+        [ride for ride in rides if ride[3] - ride[9] >= 3]
+    args = get_search_for_ride_parser().parse_args(
+        ["sk", "--from", "2018-01-01", "--min-seats", "2"])
+    assert args.date_from.year == 2018
+    assert args.date_to is None
+    assert args.min_seats == 2
+
+
+def test_search_rides_date_range_offered_ride(mock_db):
+    """Test that rides offered from the shell, dated with a time of day,
+    are within a date range ending on their day"""
+    database = connect(mock_db)
+    shell = MiniProjectShell(database)
+    shell.login("don@mayor.yeg", "foo1")
+    shell.do_offer_ride("2099-05-01 3 3000 none west1 ab1")
+    ride = database.execute("SELECT * FROM rides "
+                            "WHERE rdate LIKE '2099-05-01%'").fetchone()
+    assert ride[2] == "2099-05-01 00:00:00"
+    assert search_rides(database, ["west1"], date_from="2099-05-01",
+                        date_to="2099-05-01") == [ride]
+    assert not search_rides(database, ["west1"], date_from="2099-05-02")
+    assert not search_rides(database, ["west1"], date_to="2099-04-30",
+                            date_from="2099-04-01")
+
+
+def test_search_rides_new_location(mock_db):
+    """Test that the location search index follows the locations table"""
+    database = connect(mock_db)
+    database.execute(
+        "INSERT INTO locations VALUES "
+        "('van3', 'Abbotsford', 'British Columbia', 'Abbotsford Airport')")
+    database.execute("INSERT INTO enroute VALUES (13, 'van3')")
+    database.commit()
+    assert [ride[0] for ride in search_rides(database, ["abbots"])] == [13]
+    database.execute("UPDATE locations SET city = 'Mission' "
+                     "WHERE lcode = 'van3'")
+    database.execute("DELETE FROM enroute WHERE lcode = 'van3'")
+    database.execute("DELETE FROM locations WHERE lcode = 'van3'")
+    database.commit()
+    assert not search_rides(database, ["abbots"])
+
+
+def test_paginator(mock_db):
+    database = connect(mock_db)
+    cursor = database.execute("SELECT rno FROM rides ORDER BY rno")
+    pages = Paginator(cursor)
+    assert [row[0] for row in pages.page(0)] == [1, 2, 3, 4, 5]
+    assert not pages.is_last_page(0)
+    # only the rows of the first page and the next page are fetched
+    assert len(pages.rows) == 10
+    assert pages[11] == (12,)
+    assert [row[0] for row in pages] == [row[0] for row in database.execute(
+        "SELECT rno FROM rides ORDER BY rno")]
+    assert not Paginator(iter(())).page(0)
+
+
+def test_get_selection_back(capsys):
+    items = ("item{}".format(index) for index in range(12))
+    with mock.patch("builtins.input", side_effect=["", "back", "", "", "11"]):
+        assert get_selection(items) == "item11"
+    out = capsys.readouterr().out
+    assert out.count("0: item0") == 2
+    assert out.count("5: item5") == 2
+    assert "Press Enter to return to the start of the list" in out
+
+
+def test_print_5_and_prompt(capsys):
+    with mock.patch("builtins.input", side_effect=["more", "back", "stop"]):
+        print_5_and_prompt(iter(range(7)))
+    out = capsys.readouterr().out
+    assert out.count("Rows 1-5:") == 2
+    assert "Rows 6-7:" in out
+
+
+@pytest.mark.parametrize("keyword", ["cntr1", "CNTR1", "ed", "edmonton",
+                                     "Alberta", "jasper ave", "e%n", "zzz"])
+def test_location_index(mock_db, keyword):
+    database = connect(mock_db)
+    location_index = LocationIndex(database)
+    kw = "%" + keyword + "%"
+    assert location_index.get(keyword) == database.execute(
+        "SELECT * FROM locations WHERE lcode LIKE ?", (keyword,)).fetchone()
+    assert location_index.search(keyword) == database.execute(
+        "SELECT * FROM locations "
+        "WHERE city LIKE ? OR prov LIKE ? OR address LIKE ?",
+        (kw, kw, kw)).fetchall()
+
+
+def test_location_index_invalidation(tmpdir):
+    filename = str(tmpdir.join("locations.db"))
+    create_test_db(filename)
+    database = connect(filename)
+    other = connect(filename)
+    location_index = LocationIndex(database)
+    assert not location_index.search("Whitehorse")
+
+    # changes committed by another connection
+    other.execute("INSERT INTO locations VALUES "
+                  "('yt1', 'Whitehorse', 'Yukon', 'Main St')")
+    other.commit()
+    assert location_index.get("yt1")
+    assert location_index.search("whiteh")
+
+    # changes made by the index's own connection
+    database.execute("DELETE FROM locations WHERE lcode = 'yt1'")
+    assert not location_index.get("yt1")
+    database.rollback()
+    assert location_index.get("yt1")
+
+    # changes to the other tables do not reload the locations
+    rows = location_index.rows
+    other.execute("UPDATE rides SET price = price + 1")
+    other.commit()
+    database.execute("DELETE FROM inbox")
+    assert location_index.get("yt1") and location_index.rows is rows
 
 
 def test_offer_ride(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
     user = LoginSession("jane_doe@abc.ca", "")
     shell.login("jane_doe@abc.ca", "")
@@ -188,8 +475,49 @@ def test_offer_ride(mock_db):
                                      "WHERE rno > 43 AND driver LIKE 'jane_doe@abc.ca'").fetchone()
 
 
+def test_allocate_ids(mock_db):
+    database = connect(mock_db)
+    max_rno = database.execute("SELECT MAX(rno) FROM rides").fetchone()[0]
+    ids = allocate_ids(database, RIDES, 100)
+    database.commit()
+    assert ids == range(max_rno + 1, max_rno + 101)
+    assert next_id(database, RIDES) == max_rno + 101
+    # a rollback releases the allocated id
+    database.rollback()
+    assert next_id(database, RIDES) == max_rno + 101
+    database.rollback()
+    with pytest.raises(ValueError):
+        allocate_ids(database, "foobar")
+    database.rollback()
+    # a non-positive count would hand out ids already allocated
+    for count in (0, -5):
+        with pytest.raises(ValueError):
+            allocate_ids(database, RIDES, count)
+    assert not database.in_transaction
+
+
+def test_allocate_ids_explicit_insert(mock_db):
+    """Test that the sequences stay ahead of rows inserted with explicit
+    ids"""
+    database = connect(mock_db)
+    database.execute("INSERT INTO requests VALUES "
+                     "(1000, 'bob@123.ca', '2018-10-11', 'nrth2', 'sth3', 1)")
+    database.commit()
+    assert next_id(database, REQUESTS) == 1001
+    database.commit()
+
+
+def test_allocate_ids_empty_table(tmpdir):
+    database = connect(str(tmpdir.join("empty.db")))
+    database.executescript(open(DATABASE_TABLE_CREATE, "r").read())
+    migrate(database)
+    assert next_id(database, BOOKINGS) == 1
+    assert next_id(database, BOOKINGS) == 2
+    database.commit()
+
+
 def test_send_message(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
 
     assert not database.cursor().execute("SELECT * FROM inbox "
@@ -200,8 +528,106 @@ def test_send_message(mock_db):
                                      "WHERE email LIKE 'jane_doe@abc.ca'").fetchall()
 
 
+def test_message_outbox(tmpdir):
+    filename = str(tmpdir.join("outbox.db"))
+    create_test_db(filename)
+    database = connect(filename)
+    other = connect(filename)
+    outbox = MessageOutbox(database, max_messages=3, max_delay=60)
+
+    def delivered():
+        return other.execute("SELECT email, content FROM inbox "
+                             "WHERE sender = 'bob@123.ca' "
+                             "ORDER BY content").fetchall()
+
+    send_message(database, "jane_doe@abc.ca", "bob@123.ca", "a", None,
+                 outbox=outbox, wait=False)
+    send_message(database, "kd@lang.ca", "bob@123.ca", "b", None,
+                 outbox=outbox, wait=False)
+    assert len(outbox) == 2 and not delivered()
+    # the size threshold flushes the outbox
+    send_message(database, "don@mayor.yeg", "bob@123.ca", "c", None,
+                 outbox=outbox, wait=False)
+    assert not outbox and len(delivered()) == 3
+    # waiting for the message flushes the outbox
+    send_message(database, "maria@xyz.org", "bob@123.ca", "d", None,
+                 outbox=outbox)
+    assert len(delivered()) == 4
+    # colliding timestamps are delivered with the next free timestamp
+    outbox.max_messages = 10
+    outbox.queue("jane_doe@abc.ca", "2018-01-01 00:00:00.000000",
+                 "bob@123.ca", "e", None)
+    outbox.queue("jane_doe@abc.ca", "2018-01-01 00:00:00.000000",
+                 "bob@123.ca", "f", None)
+    # messages violating a constraint do not prevent the others' delivery
+    outbox.queue("nobody@nowhere.ca", "2018-01-01 00:00:00.000000",
+                 "bob@123.ca", "x", None)
+    outbox.queue("kd@lang.ca", "2018-01-01 00:00:00.000000", "bob@123.ca",
+                 "g", None)
+    assert [message[3] for message in outbox.flush()] == ["x"]
+    assert [row[1] for row in delivered()] == ["a", "b", "c", "d", "e", "f",
+                                               "g"]
+    assert other.execute(
+        "SELECT msgTimestamp FROM inbox WHERE content = 'f'").fetchone() == \
+        ("2018-01-01 00:00:00.000001",)
+    # the outbox is flushed at the end of each shell command
+    shell = MiniProjectShell(database)
+    shell.outbox.queue("the99@oil.com", "2018-01-01 00:00:00.000000",
+                       "bob@123.ca", "h", None)
+    shell.onecmd("stats")
+    assert [row[1] for row in delivered()][-1] == "h"
+    assert not shell.command_failed
+    # the messages that could not be delivered fail the command
+    shell.outbox.queue("nobody@nowhere.ca", "2018-01-01 00:00:00.000000",
+                       "bob@123.ca", "y", None)
+    shell.onecmd("stats")
+    assert shell.command_errors == \
+        ["could not deliver message to nobody@nowhere.ca"]
+
+
+def test_message_outbox_locked(tmpdir):
+    filename = str(tmpdir.join("outbox.db"))
+    create_test_db(filename)
+    database = connect(filename, busy_timeout=10)
+    other = connect(filename)
+    outbox = MessageOutbox(database, max_delay=60)
+    outbox.queue("jane_doe@abc.ca", "2018-01-01 00:00:00.000000",
+                 "bob@123.ca", "a", None)
+    outbox.queue("kd@lang.ca", "2018-01-01 00:00:00.000000",
+                 "bob@123.ca", "b", None)
+    other.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError):
+        outbox.flush()
+    # the messages stay queued until the database is unlocked
+    assert len(outbox) == 2 and not database.in_transaction
+    other.rollback()
+    assert not outbox.flush()
+    assert other.execute("SELECT content FROM inbox "
+                         "WHERE sender = 'bob@123.ca' "
+                         "ORDER BY content").fetchall() == [("a",), ("b",)]
+
+
+def test_send_message_burst(tmpdir):
+    filename = str(tmpdir.join("burst.db"))
+    create_test_db(filename)
+    database = connect(filename)
+    timestamps = [timestamp() for _ in range(1000)]
+    assert timestamps == sorted(set(timestamps))
+    for number in range(200):
+        send_message(database, "jane_doe@abc.ca", "bob@123.ca",
+                     "burst {}".format(number), None)
+    assert database.execute("SELECT COUNT(*) FROM inbox "
+                            "WHERE content LIKE 'burst %'").fetchone() == \
+        (200,)
+    # old second resolution timestamps are normalized by the migration
+    assert database.execute(
+        "SELECT msgTimestamp FROM inbox WHERE email = 'bob@123.ca' "
+        "AND sender = 'don@mayor.yeg'").fetchone() == \
+        ("2018-08-23 21:12:50.000000",)
+
+
 def test_show_inbox(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
     shell.login("bob@123.ca", "foo")
     unread_mail = database.cursor().execute("SELECT DISTINCT * "
@@ -219,13 +645,84 @@ def test_show_inbox(mock_db):
                 "WHERE inbox.email = 'bob@123.ca' AND inbox.seen = 'n'").fetchall()
 
 
+def test_show_inbox_pages(tmpdir, capsys):
+    filename = str(tmpdir.join("inbox.db"))
+    create_test_db(filename)
+    database = connect(filename)
+    database.executemany(
+        "INSERT INTO inbox VALUES ('maria@xyz.org', ?, 'bob@123.ca', ?, "
+        "NULL, ?)",
+        [("2018-01-01 00:00:0{}.000000".format(number),
+          "message {}".format(number), "y" if number == 0 else "n")
+         for number in range(8)])
+    database.commit()
+    assert show_inbox(database, "maria@xyz.org", limit=5, page_size=3) == 5
+    out = capsys.readouterr().out
+    assert [line.split(", ")[3] for line in out.splitlines()
+            if "message" in line] == \
+        ["'message {}'".format(number) for number in range(1, 6)]
+    # only the messages shown are marked as seen
+    assert database.execute(
+        "SELECT content FROM inbox WHERE email = 'maria@xyz.org' "
+        "AND seen = 'n' ORDER BY msgTimestamp").fetchall() == \
+        [("message 6",), ("message 7",)]
+    assert show_inbox(database, "maria@xyz.org", page_size=3) == 2
+    assert show_inbox(database, "maria@xyz.org") == 0
+
+
+def test_shell_stats(mock_db, tmpdir, capsys):
+    database = connect(mock_db)
+    shell = MiniProjectShell(database)
+    shell.login("bob@123.ca", "foo")
+    shell.stats.stats_file = str(tmpdir.join("stats.json"))
+    shell.stats.interval = 0
+    shell.onecmd("list_requests")
+    shell.onecmd("list_requests")
+    with mock.patch("builtins.input", return_value="n"):
+        shell.onecmd("select_request 2")
+    shell.onecmd("not_a_command")
+
+    stats = shell.stats.to_dict()
+    assert set(stats) == {"list_requests", "select_request"}
+    assert stats["list_requests"]["count"] == 2
+    assert stats["list_requests"]["statements"] == 2
+    assert 0 < stats["list_requests"]["database"] <= \
+        stats["list_requests"]["wall"]
+    assert stats["select_request"]["prompt"] > 0
+    with open(shell.stats.stats_file) as stats_file:
+        assert "select_request" in json.load(stats_file)["commands"]
+
+    capsys.readouterr()
+    shell.onecmd("stats --reset")
+    assert "list_requests" in capsys.readouterr().out
+    assert set(shell.stats.to_dict()) == {"stats"}
+
+
+def test_slow_query_log(mock_db, caplog):
+    database = connect(mock_db)
+    shell = MiniProjectShell(database)
+    shell.login("bob@123.ca", "foo")
+    shell.stats.statement_listeners.append(
+        SlowQueryLog(database, threshold=0, large_table_rows=1))
+    with caplog.at_level(logging.INFO, logger="mini_project_1.slow_query"), \
+            mock.patch("builtins.input", return_value=""):
+        shell.onecmd("search_requests_city edmonton")
+    messages = [record.getMessage() for record in caplog.records
+                if record.name == "mini_project_1.slow_query"]
+    assert len(messages) == 1
+    assert "parameters: ('edmonton',)" in messages[0]
+    assert "plan: SCAN requests" in messages[0]
+    assert "FULL SCAN of large table requests" in messages[0]
+    # the slow query log's own statements are not counted
+    assert shell.stats.to_dict()["search_requests_city"]["statements"] == 1
+
 
 def test_help_messsages(mock_db):
     """Test all the shell's ``help_<command>`` methods
 
     Ensure that they can be called without raising an exception.
     """
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     shell = MiniProjectShell(database)
 
     shell.help_book_member()
@@ -240,6 +737,8 @@ def test_help_messsages(mock_db):
     shell.help_list_bookings()
     shell.help_list_requests()
     shell.help_logout()
+    shell.help_stats()
+    shell.help_profile()
 
 
 ###############################
@@ -249,14 +748,14 @@ def test_help_messsages(mock_db):
 
 def test_valid_email_valid(mock_db):
     """Test valid_email with valid emails"""
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     # check for a valid new unique email
     assert valid_email(database, "cra@example.com")
 
 
 def test_valid_email_invalid(mock_db):
     """Test valid_email with invalid emails"""
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     # check for a invalid new unique email
     assert not valid_email(database, "")
     assert not valid_email(database, "bob@123.ca")
@@ -306,10 +805,10 @@ def test_valid_phone_invalid():
 
 
 def test_valid_location_code_valid(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     assert valid_location_code(database, "cntr1")
 
 
 def test_valid_location_code_invalid(mock_db):
-    database = sqlite3.connect(mock_db)
+    database = connect(mock_db)
     assert not valid_location_code(database, "INVALID_LOCATION_CODE")
@@ -3,9 +3,27 @@
 
 """pytests for :mod:`.__main__`"""
 
-from mini_project_1.__main__ import get_parser, main
+import json
+import logging
+import subprocess
+import sys
+
+from mini_project_1.__main__ import get_parser, main, init_db
+from mini_project_1.archive import attach_existing_archive
+from mini_project_1.benchmark import STARTUP_BUDGET
+from mini_project_1.connection import connect
+from mini_project_1.metrics import BOOKINGS_CREATED, MESSAGES_SENT
+from mini_project_1.search_rides import search_rides
 
 import mock
+import pytest
+
+
+def main_results(capsys, argv, status=0) -> list:
+    """Run :func:`main`, check its exit status, and parse the JSON lines it
+    wrote (e.g. the results of a batch)"""
+    assert main(argv) == status
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
 
 
 def test_get_parser():
@@ -13,9 +31,326 @@ def test_get_parser():
     assert parser
 
 
+def test_get_parser_group_size():
+    with pytest.raises(SystemExit):
+        get_parser().parse_args(["-d", "batch.db", "--batch", "-",
+                                 "--group-size", "0"])
+
+
+@pytest.mark.parametrize("count", [["--members", "0"], ["--locations", "0"],
+                                   ["--days", "0"], ["--inbox", "-1"],
+                                   ["--max-enroute", "-1"]])
+def test_get_parser_gen_counts(count):
+    with pytest.raises(SystemExit):
+        get_parser().parse_args(["-d", "gen.db", "gen"] + count)
+
+
+def test_get_parser_bench_iterations():
+    with pytest.raises(SystemExit):
+        get_parser().parse_args(["-i", "bench.db", "bench",
+                                 "--iterations", "0"])
+
+
 def test_main(tmpdir):
     tmp_file = tmpdir.join("thefile_name.json")
     tmp_file_name = str(tmp_file)
     with mock.patch('builtins.input', return_value='foo'):
         with mock.patch('mini_project_1.shell.MiniProjectShell.cmdloop', return_value='bar'):
             main(["-i", tmp_file_name])
+
+
+def test_main_batch_log_level(tmpdir, capsys):
+    """Test that failing batch commands are reported and rolled back
+    whatever the logging level"""
+    database_file = str(tmpdir.join("batch.db"))
+    batch_file = tmpdir.join("commands.txt")
+    batch_file.write("post_request 2099-01-01 west1 cntr3 77\n"
+                     "post_request 2099-01-01 badcode cntr3 78\n")
+    root_level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.CRITICAL)
+    try:
+        results = main_results(capsys, [
+            "-i", database_file, "--batch", str(batch_file),
+            "-u", "don@mayor.yeg", "-p", "foo1"], status=1)
+    finally:
+        logging.getLogger().setLevel(root_level)
+    assert [result.get("status") for result in results[:-1]] == \
+        ["ok", "error"]
+    assert results[1]["errors"]
+
+
+def test_init_db_existing(tmpdir):
+    """Test re-initializing an existing database"""
+    database_file = str(tmpdir.join("existing.db"))
+    init_db(database_file)
+    init_db(database_file)
+    database = connect(database_file)
+    assert database.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert not database.execute("PRAGMA foreign_key_check").fetchall()
+    assert database.execute("SELECT COUNT(*) FROM rides").fetchone()[0]
+
+
+def test_main_batch(tmpdir, capsys):
+    database_file = str(tmpdir.join("batch.db"))
+    batch_file = tmpdir.join("commands.txt")
+    batch_file.write(
+        "# post a request then fail to post one\n"
+        "post_request 2099-01-01 west1 cntr3 77\n"
+        "\n"
+        "post_request 2099-01-01 badcode cntr3 78\n"
+        "book_member kd@lang.ca 1 10 cntr1 sk1 --rno 41\n"
+        "book_member kd@lang.ca 5 10 cntr1 sk1 --rno 41\n"
+        "list_requests\n"
+    )
+    results = main_results(capsys, [
+        "-i", database_file, "--batch", str(batch_file),
+        "-u", "don@mayor.yeg", "-p", "foo1", "--group-size", "2"], status=1)
+    assert [result.get("line") for result in results] == \
+        [2, 4, 5, 6, 7, None]
+    assert [result.get("status") for result in results[:-1]] == \
+        ["ok", "error", "ok", "ok", "ok"]
+    assert results[3]["output"] == ["Could not add booking"]
+    assert any("west1', 'cntr3', 77" in line
+               for line in results[4]["output"])
+    assert results[-1]["summary"]["commands"] == 5
+    assert results[-1]["summary"]["errors"] == 1
+
+    database = connect(database_file)
+    assert database.execute("SELECT COUNT(*) FROM requests "
+                            "WHERE amount IN (77, 78)").fetchone()[0] == 1
+    assert database.execute("SELECT seats_booked FROM rides "
+                            "WHERE rno = 41").fetchone()[0] == 2
+
+
+def test_main_batch_invalid_login(tmpdir, capsys):
+    batch_file = tmpdir.join("commands.txt")
+    batch_file.write("list_requests\n")
+    assert main_results(capsys, [
+        "-i", str(tmpdir.join("batch.db")), "--batch", str(batch_file),
+        "-u", "bob@123.ca", "-p", "bad"], status=1) == \
+        [{"error": "invalid login"}]
+
+
+def test_main_import(tmpdir, capsys):
+    database_file = str(tmpdir.join("import.db"))
+    init_db(database_file)
+    members_file = tmpdir.join("members.csv")
+    members_file.write(
+        "email,name,phone,pwd\n"
+        "new@member.ca,New Member,780-555-1234,secret\n"
+        "bad-email,Bad Email,780-555-1234,secret\n"
+        "other@member.ca,Other Member,780-555-4321,secret\n"
+    )
+    rides_file = tmpdir.join("rides.jsonl")
+    rides_file.write(
+        '{"rno": 9001, "price": 10, "rdate": "20990101", "seats": 3, '
+        '"lugDesc": "", "src": "cntr1", "dst": "west1", '
+        '"driver": "new@member.ca", "cno": 1}\n'
+        '{"rno": 9002, "price": -1, "rdate": "2099-01-01", "seats": 3, '
+        '"src": "cntr1", "dst": "west1", "driver": "new@member.ca"}\n'
+        '{"rno": 9003, "price": 10, "rdate": "2099-01-01", "seats": 3, '
+        '"src": "nowhere", "dst": "west1", "driver": "other@member.ca"}\n'
+    )
+    assert main(["-d", database_file, "import", str(members_file),
+                 str(rides_file), "--chunk-size", "1"]) == 1
+    output = capsys.readouterr().out
+    assert "imported 2 of 3 rows into members" in output
+    assert "imported 2 of 3 rows into rides" in output
+    assert "1 foreign key violations, removed 1 rows" in output
+
+    database = connect(database_file)
+    assert database.execute("SELECT name FROM members "
+                            "WHERE email = 'other@member.ca'").fetchone() == \
+        ("Other Member",)
+    # the ride violating a foreign key is removed, dates are normalized
+    assert database.execute("SELECT rno, rdate, lugDesc FROM rides "
+                            "WHERE rno > 9000").fetchall() == \
+        [(9001, "2099-01-01", None)]
+
+
+def test_main_import_bookings_first(tmpdir, capsys, caplog):
+    database_file = str(tmpdir.join("import.db"))
+    init_db(database_file)
+    bookings_file = tmpdir.join("bookings.csv")
+    bookings_file.write(
+        "bno,email,rno,cost,seats,pickup,dropoff\n"
+        "9001,don@mayor.yeg,9001,10,2,cntr1,west1\n"
+        "9002,kd@lang.ca,9001,10,1,cntr1,west1\n"
+    )
+    rides_file = tmpdir.join("rides.csv")
+    rides_file.write(
+        "rno,price,rdate,seats,lugDesc,src,dst,driver,cno\n"
+        "9001,10,2099-01-01,4,,cntr1,west1,don@mayor.yeg,\n"
+    )
+    members_file = tmpdir.join("members.csv")
+    members_file.write("email,name,phone,pwd\n"
+                       "bad-email,Bad Email,780-555-1234,secret\n")
+    assert main(["-d", database_file, "import", str(bookings_file),
+                 str(rides_file), str(members_file)]) == 1
+    assert "rejected 1 rows: invalid email" in capsys.readouterr().out
+    # the rejected rows are reported, not logged by the validators
+    assert not [record for record in caplog.records
+                if record.name == "mini_project_1.register"]
+
+    database = connect(database_file)
+    # the bookings imported before their ride are counted
+    assert database.execute("SELECT seats_booked FROM rides "
+                            "WHERE rno = 9001").fetchone() == (3,)
+
+
+def test_main_gen(tmpdir):
+    databases = []
+    for name in ("gen1.db", "gen2.db"):
+        database_file = str(tmpdir.join(name))
+        assert main(["-d", database_file, "gen", "--members", "40",
+                     "--rides", "200", "--locations", "30",
+                     "--seed", "7"]) == 0
+        databases.append(connect(database_file))
+
+    database = databases[0]
+    assert database.execute("SELECT COUNT(*) FROM rides").fetchone()[0] == 200
+    assert database.execute("SELECT COUNT(*) FROM requests"
+                            "").fetchone()[0] == 20
+    assert not database.execute("PRAGMA foreign_key_check").fetchall()
+    # bookings never overbook a ride
+    assert not database.execute("SELECT * FROM rides "
+                                "WHERE seats_booked > seats").fetchall()
+    # the same seed generates the same dataset
+    for table in ("members", "rides", "enroute", "bookings", "inbox"):
+        query = "SELECT * FROM {} ORDER BY 1, 2".format(table)
+        assert databases[0].execute(query).fetchall() == \
+            databases[1].execute(query).fetchall()
+
+    # an existing database is only replaced given --force
+    database_file = str(tmpdir.join("gen1.db"))
+    with pytest.raises(SystemExit):
+        main(["-d", database_file, "gen", "--members", "40", "--rides", "10"])
+    assert database.execute("SELECT COUNT(*) FROM rides").fetchone()[0] == 200
+    assert main(["-d", database_file, "gen", "--members", "40",
+                 "--rides", "10", "--force"]) == 0
+    assert database.execute("SELECT COUNT(*) FROM rides").fetchone()[0] == 10
+
+
+def test_main_archive(tmpdir, capsys):
+    database_file = str(tmpdir.join("archive.db"))
+    assert main(["-d", database_file, "gen", "--members", "40",
+                 "--rides", "200", "--inbox", "100", "--seed", "7"]) == 0
+    database = connect(database_file)
+    inbox = database.execute("SELECT * FROM inbox ORDER BY 1, 2").fetchall()
+    seen = [message for message in inbox if message[5] == "y"]
+    database.close()
+    assert main(["-d", database_file, "archive", "--retention-days", "0",
+                 "--batch-size", "100", "--vacuum-pages", "10"]) == 0
+    assert "archived {} inbox messages".format(len(seen)) in \
+        capsys.readouterr().out
+
+    database = connect(database_file)
+    assert database.execute("SELECT * FROM inbox ORDER BY 1, 2").fetchall() \
+        == [message for message in inbox if message[5] == "n"]
+    assert not database.execute("PRAGMA freelist_count").fetchone()[0]
+    archive = connect(database_file + ".archive")
+    assert archive.execute("SELECT * FROM inbox ORDER BY 1, 2").fetchall() \
+        == seen
+
+
+def test_main_archive_rides(tmpdir, capsys):
+    database_file = str(tmpdir.join("archive.db"))
+    assert main(["-d", database_file, "gen", "--members", "40",
+                 "--rides", "200", "--inbox", "1", "--seed", "7"]) == 0
+    database = connect(database_file)
+    rides = database.execute("SELECT * FROM rides ORDER BY rno").fetchall()
+    bookings = database.execute(
+        "SELECT bookings.* FROM bookings, rides "
+        "WHERE bookings.rno = rides.rno AND rides.driver = 'member0@gen.ca' "
+        "ORDER BY bno").fetchall()
+    keyword = rides[0][5]
+    searched = search_rides(database, [keyword])
+    database.close()
+    assert main(["-d", database_file, "archive", "--retention-days", "0",
+                 "--ride-retention-days", "0", "--batch-size", "50"]) == 0
+    assert "rides dated before" in capsys.readouterr().out
+
+    database = connect(database_file)
+    # only the rides referenced by unseen messages are kept live
+    live = database.execute("SELECT * FROM rides ORDER BY rno").fetchall()
+    assert [ride[0] for ride in live] == [row[0] for row in database.execute(
+        "SELECT DISTINCT rno FROM inbox WHERE rno IS NOT NULL ORDER BY rno")]
+    assert not database.execute("PRAGMA foreign_key_check").fetchall()
+    assert not database.execute(
+        "SELECT * FROM bookings WHERE rno NOT IN (SELECT rno FROM rides)"
+    ).fetchall()
+    attach_existing_archive(database)
+    assert sorted(live + database.execute(
+        "SELECT * FROM archive.rides").fetchall()) == rides
+    assert search_rides(database, [keyword]) != searched
+    assert search_rides(database, [keyword], include_archive=True) == \
+        searched
+    messages = database.execute("SELECT count(*) FROM inbox").fetchone()[0]
+    database.close()
+
+    batch_file = tmpdir.join("commands.txt")
+    batch_file.write("list_bookings --include-archive\n"
+                     "search_rides {} --include-archive\n".format(keyword))
+    outputs = [result["output"] for result in main_results(capsys, [
+        "-d", database_file, "--batch", str(batch_file),
+        "-u", "member0@gen.ca", "-p", "pwd0"])[:2]]
+    assert sorted(outputs[0]) == sorted(str(booking) for booking in bookings)
+    # archived rides are only listed, no message is sent about them
+    assert outputs[1] == [str(ride) for ride in searched]
+    database = connect(database_file)
+    assert database.execute(
+        "SELECT count(*) FROM inbox").fetchone()[0] == messages
+    database.close()
+
+
+def test_main_bench(tmpdir):
+    results_file = tmpdir.join("results.json")
+    bookings = BOOKINGS_CREATED.value()
+    messages = MESSAGES_SENT.value()
+    assert main(["-d", str(tmpdir.join("bench.db")), "bench",
+                 "--rides", "200", "400", "--iterations", "3",
+                 "-o", str(results_file)]) == 0
+    results = json.loads(results_file.read())
+    # the benchmarked commands are rolled back, thus not counted
+    assert BOOKINGS_CREATED.value() == bookings
+    assert MESSAGES_SENT.value() == messages
+    assert results["startup"] > 0
+    assert results["startup_budget"] == STARTUP_BUDGET
+    assert [scale["rides"] for scale in results["scales"]] == [200, 400]
+    commands = results["scales"][0]["commands"]
+    assert "search_rides" in commands and "book_member" in commands
+    for stats in commands.values():
+        assert stats["iterations"] == 3
+        assert 0 < stats["p50"] <= stats["p99"]
+        assert stats["queries"] >= 1
+
+
+@pytest.mark.parametrize("module, lazy_modules", [
+    ("mini_project_1.__main__",
+     ["pendulum", "http.server", "asyncio", "subprocess", "email.utils",
+      "logging.handlers", "mini_project_1.shell", "mini_project_1.server"]),
+    ("mini_project_1.shell",
+     ["email.utils", "mini_project_1.register", "mini_project_1.book_member",
+      "mini_project_1.search_rides", "mini_project_1.show_inbox"]),
+])
+def test_startup(module, lazy_modules):
+    # modules only needed by some commands are not imported on startup
+    output = subprocess.run(
+        [sys.executable, "-c", "import sys, {}; "
+                               "print(' '.join(sys.modules))".format(module)],
+        stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    assert not set(lazy_modules) & set(output.split())
+
+
+def test_main_batch_profile(tmpdir, capsys):
+    profile_dir = tmpdir.join("profiles")
+    batch_file = tmpdir.join("commands.txt")
+    batch_file.write("list_requests\nsearch_rides edmonton\n"
+                     "profile search_rides --limit 5\n")
+    results = main_results(capsys, [
+        "-i", str(tmpdir.join("batch.db")), "--batch", str(batch_file),
+        "-u", "don@mayor.yeg", "-p", "foo1", "--profile", str(profile_dir)])
+    assert sorted(path.basename for path in profile_dir.listdir()) == [
+        "00001_list_requests.pstats", "00002_search_rides.pstats",
+        "00003_profile.pstats"]
+    assert any("search_rides" in line for line in results[2]["output"])
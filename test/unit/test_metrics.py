@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""pytests for :mod:`.metrics`"""
+
+import urllib.request
+
+from mini_project_1.__main__ import main
+from mini_project_1.metrics import Registry, start_http_server, \
+    BOOKINGS_CREATED, MESSAGES_SENT
+
+
+def test_registry_render():
+    registry = Registry()
+    counter = registry.counter("test_total", "A test counter", ("command",))
+    histogram = registry.histogram("test_seconds", "A test histogram",
+                                   buckets=(0.1, 1.0))
+    counter.inc(1, "say \"hi\"")
+    counter.inc(2, "say \"hi\"")
+    histogram.observe(0.5)
+    histogram.observe(2)
+    assert registry.render() == (
+        "# HELP test_total A test counter\n"
+        "# TYPE test_total counter\n"
+        "test_total{command=\"say \\\"hi\\\"\"} 3\n"
+        "# HELP test_seconds A test histogram\n"
+        "# TYPE test_seconds histogram\n"
+        "test_seconds_bucket{le=\"0.1\"} 0\n"
+        "test_seconds_bucket{le=\"1.0\"} 1\n"
+        "test_seconds_bucket{le=\"+Inf\"} 2\n"
+        "test_seconds_sum 2.5\n"
+        "test_seconds_count 2\n"
+    )
+
+
+def test_start_http_server():
+    registry = Registry()
+    registry.counter("test_total", "A test counter").inc()
+    server = start_http_server(0, registry=registry)
+    try:
+        with urllib.request.urlopen("http://127.0.0.1:{}/metrics".format(
+                server.server_address[1])) as response:
+            assert "test_total 1" in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_main_metrics_textfile(tmpdir, capsys):
+    textfile = tmpdir.join("mini_project_1.prom")
+    batch_file = tmpdir.join("commands.txt")
+    batch_file.write("list_requests\n"
+                     "book_member kd@lang.ca 1 10 cntr1 sk1 --rno 41\n")
+    bookings = BOOKINGS_CREATED.value()
+    messages = MESSAGES_SENT.value()
+    assert main(["-i", str(tmpdir.join("metrics.db")), "--batch",
+                 str(batch_file), "-u", "don@mayor.yeg", "-p", "foo1",
+                 "--metrics-textfile", str(textfile)]) == 0
+    assert BOOKINGS_CREATED.value() == bookings + 1
+    assert MESSAGES_SENT.value() == messages + 1
+    metrics = textfile.read()
+    assert "mini_project_1_commands_total{command=\"list_requests\"}" in \
+        metrics
+    assert "mini_project_1_command_duration_seconds_bucket{" \
+           "command=\"book_member\",le=\"+Inf\"}" in metrics
+    assert "mini_project_1_rows_total" in metrics
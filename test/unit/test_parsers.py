@@ -0,0 +1,29 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""pytests for :mod:`.parsers`"""
+
+import pytest
+
+from mini_project_1.common import ShellArgumentParser
+from mini_project_1.parsers import PARSERS, get_parser, register_parser
+from mini_project_1.shell import MiniProjectShell
+
+
+@pytest.mark.parametrize("command", sorted(PARSERS))
+def test_get_parser(command):
+    parser = get_parser(command)
+    assert isinstance(parser, ShellArgumentParser)
+    assert parser.prog == command
+    # built once and reused
+    assert get_parser(command) is parser
+    assert hasattr(MiniProjectShell, "do_" + command)
+
+
+def test_register_parser():
+    register_parser("test_logout", "mini_project_1.logout:get_logout_parser")
+    try:
+        assert get_parser("test_logout") is get_parser("test_logout")
+        assert get_parser("test_logout") is not get_parser("logout")
+    finally:
+        PARSERS.pop("test_logout")
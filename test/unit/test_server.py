@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""pytests for :mod:`.server` and :mod:`.connection`"""
+
+import asyncio
+import socket
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from mini_project_1.__main__ import init_db
+from mini_project_1.connection import ConnectionPool, connect, \
+    is_write_statement
+from mini_project_1.server import ShellServer
+
+
+@pytest.fixture
+def server_db(tmpdir):
+    filename = str(tmpdir.join("server.db"))
+    init_db(filename)
+    return filename
+
+
+@contextmanager
+def running_server(database_path: str, max_sessions: int = 4, **kwargs):
+    """Context manager running a :class:`.server.ShellServer` on an event
+    loop within a background thread
+
+    The server replaces :data:`sys.stdout`, thus it must be started within
+    the test itself to not conflict with pytest's output capturing.
+    """
+    loop = asyncio.new_event_loop()
+    shell_server = ShellServer(database_path, max_sessions, **kwargs)
+    server = shell_server.start(loop, "127.0.0.1", 0)
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        yield server.sockets[0].getsockname()[1]
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.run_until_complete(shell_server.close_sessions())
+        shell_server.close()
+        loop.close()
+
+
+def run_client(port: int, lines) -> str:
+    """Send lines to the shell server and return its output"""
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall("".join(line + "\n" for line in lines).encode())
+        sock.shutdown(socket.SHUT_WR)
+        output = b""
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            output += data
+    return output.decode()
+
+
+def test_is_write_statement():
+    assert is_write_statement("INSERT INTO inbox VALUES (?)")
+    assert is_write_statement(" BEGIN IMMEDIATE")
+    assert not is_write_statement("SELECT * FROM rides")
+    assert not is_write_statement("pragma user_version")
+
+
+def test_connection_pool(server_db):
+    pool = ConnectionPool(server_db)
+    connections = []
+
+    def get_connection():
+        connections.append(pool.connection())
+        assert pool.connection() is connections[-1]
+
+    threads = [threading.Thread(target=get_connection) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert connections[0] is not connections[1]
+
+    # only a single pooled connection can have a write transaction open
+    connection = connections[0]
+    connection.execute("UPDATE members SET name = 'Bob' "
+                       "WHERE email = 'bob@123.ca'")
+    assert pool.writer_lock.locked()
+    connection.execute("SELECT * FROM members").fetchall()
+    assert pool.writer_lock.locked()
+    connection.commit()
+    assert not pool.writer_lock.locked()
+    connection.execute("SELECT * FROM members").fetchall()
+    assert not pool.writer_lock.locked()
+    pool.close()
+
+
+def test_shell_server(server_db):
+    with running_server(server_db) as port:
+        output = run_client(port, [
+            "bob@123.ca", "foo",
+            "post_request 2099-12-31 west1 cntr3 1000",
+            "list_requests",
+            "exit",
+        ])
+    assert "Your inbox:" in output
+    assert "'west1', 'cntr3', 1000" in output
+    database = connect(server_db)
+    assert database.execute("SELECT * FROM requests WHERE "
+                            "email = 'bob@123.ca' AND amount = 1000"
+                            "").fetchone()
+
+
+def test_shell_server_idle_session(server_db):
+    with running_server(server_db, max_sessions=1, idle_timeout=0.5) as port:
+        # the idle session is ended, freeing the only worker for the next
+        with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+            output = b""
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                output += data
+        assert b"Session idle for 0.5s" in output
+        assert "Your inbox:" in run_client(port, ["bob@123.ca", "foo"])
+
+
+def test_shell_server_concurrent_sessions(server_db):
+    outputs = []
+
+    def client(index):
+        outputs.append(run_client(port, [
+            "bad@login.ca", "bad",
+            "bob@123.ca", "foo",
+            "post_request 2099-12-{:02d} west1 cntr3 5".format(index + 1),
+        ]))
+
+    with running_server(server_db) as port:
+        threads = [threading.Thread(target=client, args=(index,))
+                   for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(outputs) == 8
+    assert all("invalid login" in output for output in outputs)
+    database = connect(server_db)
+    assert database.execute("SELECT COUNT(*) FROM requests WHERE "
+                            "amount = 5").fetchone()[0] == 8